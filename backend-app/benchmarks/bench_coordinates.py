@@ -0,0 +1,86 @@
+"""
+Benchmark for coordinate cleaning in the store loader.
+
+Builds a synthetic sheet (default 1M rows) whose coordinate columns mix
+clean floats, '105.820.730'-style values, garbage and blanks, then times
+the old per-value `apply(clean_coordinate)` against the vectorized
+`validate_stores_data` pipeline.
+
+    python benchmarks/bench_coordinates.py --rows 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from services.sheet_service import clean_coordinate, clean_coordinates, validate_stores_data
+
+
+def synthetic_coordinates(values: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Render floats as sheet strings: mostly clean, some multi-dot, a few broken."""
+    text = np.char.mod("%.6f", values).astype(object)
+    kind = rng.random(len(values))
+    multi_dot = kind < 0.10
+    text[multi_dot] = [s[:-3] + "." + s[-3:] for s in text[multi_dot]]
+    text[(kind >= 0.10) & (kind < 0.11)] = "n/a"
+    text[(kind >= 0.11) & (kind < 0.12)] = None
+    return text
+
+
+# Products per category, so filters and the intent classifier see a realistic mix
+SYNTHETIC_PRODUCTS = {
+    "Công nghệ": ["iPhone 16 Pro", "iPhone 15", "Laptop Dell", "Điện thoại Samsung"],
+    "Thời trang": ["Giày chạy bộ", "Giày da", "Áo thun", "Túi xách"],
+    "Ẩm thực": ["Phở bò", "Bánh mì", "Cà phê sữa", "Trà sữa"],
+}
+
+
+def synthetic_sheet(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    categories = np.array(list(SYNTHETIC_PRODUCTS), dtype=object)
+    products = np.array(list(SYNTHETIC_PRODUCTS.values()), dtype=object)
+    category_ids = rng.integers(0, len(categories), rows)
+    return pd.DataFrame({
+        "store_id": np.arange(rows).astype(str),
+        "store_name": "Cửa hàng",
+        "address": "Hà Nội",
+        "category": categories[category_ids],
+        "product_info": products[category_ids, rng.integers(0, products.shape[1], rows)],
+        "promotion": "Giảm 10%",
+        "latitude": synthetic_coordinates(rng.uniform(8.5, 23.0, rows), rng),
+        "longitude": synthetic_coordinates(rng.uniform(102.5, 109.5, rows), rng),
+    })
+
+
+def main(args):
+    df = synthetic_sheet(args.rows)
+    print(f"{args.rows} rows")
+
+    start = time.perf_counter()
+    df["latitude"].apply(clean_coordinate)
+    df["longitude"].apply(clean_coordinate)
+    before = time.perf_counter() - start
+    print(f"  before (apply clean_coordinate):       {before:7.3f} s")
+
+    start = time.perf_counter()
+    clean_coordinates(df["latitude"])
+    clean_coordinates(df["longitude"])
+    vectorized = time.perf_counter() - start
+    print(f"  after  (clean_coordinates):            {vectorized:7.3f} s  ({before / vectorized:.1f}x)")
+
+    start = time.perf_counter()
+    stores, rejected = validate_stores_data(df)
+    after = time.perf_counter() - start
+    print(f"  after  (vectorized + schema + bounds): {after:7.3f} s  ({before / after:.1f}x)")
+    print(f"  kept {len(stores)}, rejected {len(rejected)}: {rejected['reject_reason'].value_counts().to_dict()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    main(parser.parse_args())
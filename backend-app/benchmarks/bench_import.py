@@ -0,0 +1,85 @@
+"""
+Import-time budget for the API module.
+
+Imports `main` in fresh interpreters (a cold start as an autoscaler sees it)
+and reports the median import time, the slowest modules from
+`python -X importtime`, and whether any module that should load lazily was
+imported. Exits with status 1 when the median exceeds --budget-ms or a
+deferred module was imported eagerly.
+
+    python benchmarks/bench_import.py --runs 5 --budget-ms 1500 --output import.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.bench_suite import compare_results, summarize, write_results
+
+# Only needed once a request reaches the code using them
+DEFERRED_MODULES = ("google.generativeai", "geopy")
+
+CHILD = f"""
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {DEFERRED_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def import_once(env: dict) -> dict:
+    result = subprocess.run([sys.executable, "-c", CHILD], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_modules(env: dict, top: int) -> list[tuple[str, float]]:
+    """(module, self ms) of the slowest imports, from one `-X importtime` run."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(self_us) / 1000))
+    return sorted(modules, key=lambda item: item[1], reverse=True)[:top]
+
+
+def main(args):
+    env = dict(os.environ, LOG_LEVEL="WARNING", PYTHONWARNINGS="ignore")
+    runs = [import_once(env) for _ in range(args.runs)]
+    loaded = sorted({module for run in runs for module in run["loaded"]})
+    result = {"name": "import_main", "size": None, **summarize([run["seconds"] for run in runs]), "deferred_loaded": loaded}
+
+    print(f"import main: p50 {result['p50_ms']:.0f} ms, max {np.max([run['seconds'] for run in runs]) * 1000:.0f} ms over {args.runs} cold starts (budget {args.budget_ms:.0f} ms)")
+    print("  slowest modules (self time):")
+    for name, ms in slowest_modules(env, args.top):
+        print(f"    {ms:8.1f} ms  {name}")
+    if loaded:
+        print(f"  imported eagerly but should be deferred: {', '.join(loaded)}")
+
+    if args.output:
+        write_results(args.output, [result], {"runs": args.runs, "budget_ms": args.budget_ms})
+    failed = result["p50_ms"] > args.budget_ms or bool(loaded)
+    if args.compare and compare_results(args.compare, [result], args.threshold):
+        failed = True
+    if failed:
+        print("Import-time budget exceeded.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1500.0)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="earlier JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=1.2, help="slowdown ratio reported as a regression")
+    main(parser.parse_args())
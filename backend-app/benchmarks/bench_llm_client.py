@@ -0,0 +1,70 @@
+"""
+Load benchmark for the LLM client layer against the local stub server.
+
+Fires N concurrent async "requests" from one event loop, the way uvicorn
+handles /chat, and compares:
+
+  before: the previous blocking `requests.post` call made inside a coroutine
+  after:  the pooled async OllamaBackend from services.llm_client
+
+    python benchmarks/bench_llm_client.py --requests 200 --concurrency 50 --latency-ms 100
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from benchmarks.stub_llm_server import StubServer
+from services.llm_client import OllamaBackend
+
+
+async def blocking_call(url: str, prompt: str) -> str:
+    # Mirrors the old call_custom_api: a synchronous POST inside `async def`
+    payload = {"model": "stub", "prompt": prompt, "stream": False, "format": None}
+    response = requests.post(url, json=payload)
+    response.raise_for_status()
+    return response.json().get("response", "")
+
+
+async def run_load(call, total: int, concurrency: int) -> float:
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with gate:
+            await call(f"prompt {i}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return total / (time.perf_counter() - start)
+
+
+async def main(args):
+    with StubServer(port=args.port, latency_ms=args.latency_ms) as stub:
+        url = OllamaBackend.resolve_url(stub.base_url)
+
+        before = await run_load(lambda p: blocking_call(url, p), args.requests, args.concurrency)
+
+        backend = OllamaBackend(stub.base_url, "stub", max_concurrency=args.concurrency, timeout=30, max_retries=0)
+        try:
+            after = await run_load(backend.generate, args.requests, args.concurrency)
+        finally:
+            await backend.aclose()
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, stub latency {args.latency_ms:.0f} ms")
+    print(f"  before (blocking requests.post): {before:8.1f} req/s")
+    print(f"  after  (async pooled httpx):     {after:8.1f} req/s")
+    print(f"  speedup: {after / before:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=100.0)
+    parser.add_argument("--port", type=int, default=11500)
+    asyncio.run(main(parser.parse_args()))
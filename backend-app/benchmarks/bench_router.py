@@ -0,0 +1,125 @@
+"""
+LLM router benchmark against two local stub servers.
+
+  tail    the primary stub answers in --latency-ms but --slow-rate of its
+          calls take --slow-ms; a steady secondary answers in
+          --secondary-latency-ms. Compares the primary alone with the router,
+          which hedges slow primary calls on the secondary.
+  outage  the primary fails every call; the router falls back to the
+          secondary and its circuit breaker soon stops trying the primary.
+
+Reports p50/p95/p99 per scenario, how many calls each stub served (the
+cost of hedging), hedges won and the router's per-backend stats.
+
+    python benchmarks/bench_router.py --requests 400 --concurrency 16 --output router.json
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from benchmarks.bench_suite import compare_results, summarize, write_results
+from benchmarks.stub_llm_server import StubServer
+from services.llm_client import OllamaBackend
+from services.llm_router import LLMRouter
+from services.metrics_service import LLM_HEDGES
+
+
+async def run_load(backend, total: int, concurrency: int) -> tuple[list[float], int]:
+    gate = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i: int):
+        nonlocal errors
+        async with gate:
+            start = time.perf_counter()
+            try:
+                await backend.generate(f"prompt {i}")
+            except Exception:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return latencies, errors
+
+
+def backend_for(server: StubServer, name: str, args) -> OllamaBackend:
+    # The router falls back to the other backend instead of retrying
+    return OllamaBackend(server.base_url, "stub", name=name, max_concurrency=args.concurrency, timeout=args.timeout, max_retries=0)
+
+
+async def scenario(name: str, servers: list[StubServer], use_router: bool, args) -> dict:
+    backends = [backend_for(server, label, args) for server, label in zip(servers, ("primary", "secondary"))]
+    backend = LLMRouter(backends, hedge_percentile=args.hedge_percentile, hedge_min_samples=args.min_samples, hedge_delay_ms=args.hedge_delay_ms,
+                        failure_threshold=args.circuit_failures, reset_timeout=args.circuit_reset) if use_router else backends[0]
+    served_before = [server.app.state.requests for server in servers]
+    hedges_before = LLM_HEDGES.value(backend="secondary", result="won")
+    try:
+        latencies, errors = await run_load(backend, args.requests, args.concurrency)
+    finally:
+        await backend.aclose()
+
+    result = {
+        "name": name,
+        "size": None,
+        "errors": errors,
+        "served": {label: server.app.state.requests - before for label, server, before in zip(("primary", "secondary"), servers, served_before)},
+        **(summarize(latencies) if latencies else {}),
+    }
+    if use_router:
+        result["hedges_won"] = int(LLM_HEDGES.value(backend="secondary", result="won") - hedges_before)
+        result["router"] = backend.stats()
+    served = ", ".join(f"{label} {count}" for label, count in result["served"].items())
+    latency = f"p50 {result['p50_ms']:8.1f} ms  p95 {result['p95_ms']:8.1f} ms  p99 {result['p99_ms']:8.1f} ms" if latencies else "no successful calls"
+    print(f"  {name:<16} {latency}  errors {errors}  calls served: {served}" + (f"  hedges won {result['hedges_won']}" if use_router else ""))
+    return result
+
+
+async def run(args) -> list[dict]:
+    results = []
+    faults = {"slow_rate": args.slow_rate, "slow_ms": args.slow_ms}
+    print(f"tail: primary {args.latency_ms:.0f} ms with {args.slow_rate:.0%} at {args.slow_ms:.0f} ms, secondary {args.secondary_latency_ms:.0f} ms")
+    with StubServer(args.port, args.latency_ms, **faults) as primary, StubServer(args.port + 1, args.secondary_latency_ms) as secondary:
+        results.append(await scenario("tail_single", [primary, secondary], False, args))
+        results.append(await scenario("tail_router", [primary, secondary], True, args))
+
+    print("outage: primary answers every call with HTTP 503")
+    with StubServer(args.port, args.latency_ms, error_rate=1.0) as primary, StubServer(args.port + 1, args.secondary_latency_ms) as secondary:
+        results.append(await scenario("outage_single", [primary, secondary], False, args))
+        results.append(await scenario("outage_router", [primary, secondary], True, args))
+    return results
+
+
+def main(args):
+    results = asyncio.run(run(args))
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "compare")}
+    if args.output:
+        write_results(args.output, results, config)
+    if args.compare and compare_results(args.compare, results, args.threshold, metric="p99_ms"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="primary stub latency")
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="share of slow primary calls")
+    parser.add_argument("--slow-ms", type=float, default=1000.0)
+    parser.add_argument("--secondary-latency-ms", type=float, default=100.0)
+    parser.add_argument("--hedge-percentile", type=float, default=90.0)
+    parser.add_argument("--min-samples", type=int, default=20)
+    parser.add_argument("--hedge-delay-ms", type=float, default=500.0)
+    parser.add_argument("--circuit-failures", type=int, default=5)
+    parser.add_argument("--circuit-reset", type=float, default=30.0)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--port", type=int, default=11560, help="primary stub port; the secondary uses the next one")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="earlier JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=1.2, help="slowdown ratio reported as a regression")
+    main(parser.parse_args())
@@ -0,0 +1,173 @@
+"""
+Micro-benchmarks for the store pipeline at several catalog sizes.
+
+For every size (default 1k, 100k and 1M synthetic stores) times:
+
+  clean_coordinates   coordinate cleaning of the raw sheet columns
+  parse_stores_csv    CSV body -> validated stores (load_stores_data minus the download)
+  build_snapshot      geo + search indexes and the intent classifier
+  filter_stores       the /chat category/product filter chain
+  nearest_all         find_nearest_stores over the whole catalog
+  nearest_filtered    nearest-store page over one category's row positions (the /chat path)
+  reply_prompt        reply prompt for the 3 nearest stores from precompiled fragments
+
+Each case runs until --min-time seconds and --min-runs calls have passed and
+reports p50/p95/p99 per call. Results can be written as JSON and compared
+against an earlier run; regressions beyond --threshold exit with status 1.
+
+    python benchmarks/bench_suite.py --sizes 1000,100000,1000000 --output bench.json
+    python benchmarks/bench_suite.py --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Rejected-row warnings on every parse would drown the report
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+
+from benchmarks.bench_coordinates import synthetic_sheet
+from main import filter_stores
+from services.geo_service import find_nearest_stores, nearest_stores_page
+from services.prompt_service import build_reply_prompt
+from services.sheet_service import clean_coordinates, parse_stores_csv
+from services.snapshot_service import build_snapshot
+
+INTENTS = {
+    # Product found within its category
+    "product": {"product": "iPhone 15", "generic_term": "iPhone", "category": "Công nghệ", "is_location_request": False},
+    # Product missing: falls back to the generic term, then the category
+    "fallback": {"product": "iPad Air", "generic_term": "iPad", "category": "Công nghệ", "is_location_request": False},
+}
+
+
+def summarize(samples: list[float]) -> dict:
+    """Percentiles (ms) and throughput of per-call durations in seconds."""
+    ms = np.asarray(samples) * 1000
+    return {
+        "runs": len(ms),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+        "mean_ms": round(float(ms.mean()), 4),
+        "ops_per_s": round(float(1000 / ms.mean()), 2) if ms.mean() else None,
+    }
+
+
+def run_meta() -> dict:
+    """Where and on what a result was measured."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+    }
+
+
+def write_results(path: str, results: list[dict], config: dict):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"meta": run_meta(), "config": config, "results": results}, f, ensure_ascii=False, indent=2)
+    print(f"Results written to {path}")
+
+
+def compare_results(baseline_path: str, results: list[dict], threshold: float, metric: str = "p50_ms") -> list[str]:
+    """Print current vs baseline per case; returns the cases slower than threshold x baseline."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["name"], r.get("size")): r for r in json.load(f)["results"]}
+    regressions = []
+    print(f"\nCompared with {baseline_path} ({metric}):")
+    for result in results:
+        key = (result["name"], result.get("size"))
+        before = baseline.get(key)
+        if not before or not before.get(metric) or result.get(metric) is None:
+            continue
+        ratio = result[metric] / before[metric]
+        flag = "REGRESSION" if ratio > threshold else ""
+        print(f"  {result['name']:<18} {str(result.get('size') or ''):>8} {before[metric]:10.3f} -> {result[metric]:10.3f} ms  {ratio:5.2f}x {flag}")
+        if flag:
+            regressions.append(f"{result['name']}@{result.get('size')}")
+    return regressions
+
+
+def time_case(fn, min_time: float, min_runs: int, max_runs: int) -> list[float]:
+    """Call fn(run) repeatedly; one duration per call."""
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < max_runs and (len(samples) < min_runs or time.perf_counter() - started < min_time):
+        start = time.perf_counter()
+        fn(len(samples))
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_size(size: int, args) -> list[dict]:
+    sheet = synthetic_sheet(size, seed=args.seed)
+    csv_body = sheet.to_csv(index=False).encode("utf-8")
+    stores, _ = parse_stores_csv(csv_body)
+    snapshot = build_snapshot(stores)
+
+    rng = np.random.default_rng(args.seed)
+    users = np.column_stack([rng.uniform(8.5, 23.0, args.max_runs), rng.uniform(102.5, 109.5, args.max_runs)])
+    category_positions = snapshot.search_index.match_category("Công nghệ")
+
+    def timed(name, fn, **extra):
+        # Heavy cases (parsing 1M rows takes seconds) stop at min_runs
+        samples = time_case(fn, args.min_time, args.min_runs, args.max_runs)
+        result = {"name": name, "size": size, **extra, **summarize(samples)}
+        print(f"  {name:<18} p50 {result['p50_ms']:10.3f} ms  p95 {result['p95_ms']:10.3f} ms  p99 {result['p99_ms']:10.3f} ms  ({result['runs']} runs)")
+        return result
+
+    print(f"{size} stores ({len(stores)} valid)")
+    results = [
+        timed("clean_coordinates", lambda run: (clean_coordinates(sheet["latitude"]), clean_coordinates(sheet["longitude"]))),
+        timed("parse_stores_csv", lambda run: parse_stores_csv(csv_body)),
+        timed("build_snapshot", lambda run: build_snapshot(stores)),
+    ]
+    for label, intent in INTENTS.items():
+        results.append(timed(f"filter_{label}", lambda run, intent=intent: filter_stores(intent, snapshot)))
+    results.append(timed("nearest_all", lambda run: find_nearest_stores(*users[run], stores, limit=3, index=snapshot.store_index)))
+    results.append(timed("nearest_filtered", lambda run: nearest_stores_page(*users[run], stores, limit=3, index=snapshot.store_index, positions=category_positions), candidates=len(category_positions)))
+    nearest = find_nearest_stores(*users[0], stores, limit=3, index=snapshot.store_index, positions=category_positions)
+    results.append(timed("reply_prompt", lambda run: build_reply_prompt("mua iPhone 15", nearest, INTENTS["product"], "product", snapshot.prompt_fragments)))
+    return results
+
+
+def main(args):
+    sizes = [int(size) for size in args.sizes.split(",")]
+    results = []
+    for size in sizes:
+        results.extend(bench_size(size, args))
+
+    config = {"sizes": sizes, "min_time": args.min_time, "min_runs": args.min_runs, "max_runs": args.max_runs, "seed": args.seed}
+    if args.output:
+        write_results(args.output, results, config)
+    if args.compare and compare_results(args.compare, results, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,100000,1000000", help="comma-separated catalog sizes")
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds per case")
+    parser.add_argument("--min-runs", type=int, default=3)
+    parser.add_argument("--max-runs", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="earlier JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=1.2, help="slowdown ratio reported as a regression")
+    main(parser.parse_args())
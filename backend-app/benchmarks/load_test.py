@@ -0,0 +1,224 @@
+"""
+End-to-end load test of POST /chat against the local stub LLM.
+
+Starts three things on localhost: a sheet server with a synthetic catalog,
+the stub LLM server (Ollama protocol, fixed --latency-ms) and the API itself
+under uvicorn in a separate process. It then fires --requests chat messages
+at --concurrency and reports p50/p95/p99 latency, requests per second, the
+per-stage breakdown from the Server-Timing headers and how many LLM calls
+the server made.
+
+    python benchmarks/load_test.py --stores 100000 --requests 500 --concurrency 32 --latency-ms 200
+    python benchmarks/load_test.py --no-cache --output load.json
+    python benchmarks/load_test.py --compare load.json
+"""
+import argparse
+import asyncio
+import functools
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import numpy as np
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.bench_coordinates import synthetic_sheet
+from benchmarks.bench_suite import compare_results, summarize, write_results
+
+MESSAGES = [
+    "mua iPhone 15",
+    "tìm giày chạy bộ gần đây",
+    "quán phở ở đâu",
+    "có bán laptop dell không",
+    "mình muốn uống trà sữa",
+    "cửa hàng đồ công nghệ gần nhất",
+    "tôi đang ở đâu",
+    "xin chào",
+]
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def serve_directory(directory: str) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def server_env(args, sheet_url: str) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "AI_API_BASE": f"http://localhost:{args.stub_port}",
+        "AI_MODEL_NAME": "stub",
+        "STORE_DATA_URL": sheet_url,
+        # Measure the fresh-download path, with no refresh during the run
+        "STORE_SNAPSHOT_DIR": "",
+        "STORE_REFRESH_INTERVAL": "86400",
+        "LOG_LEVEL": "WARNING",
+        "INTENT_RULES": "1" if args.intent_rules else "0",
+        "INTENT_CACHE_PATH": "",
+        "REPLY_CACHE_PATH": "",
+    })
+    if args.no_cache:
+        for prefix in ("INTENT_CACHE", "REPLY_CACHE", "LOCATION_CACHE"):
+            env[f"{prefix}_SIZE"] = "0"
+    return env
+
+
+def wait_until_ready(url: str, process: subprocess.Popen, timeout: float = 120.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server not ready after {timeout:.0f} s")
+
+
+def parse_server_timing(header: str | None) -> dict[str, float]:
+    stages = {}
+    for part in (header or "").split(","):
+        name, _, duration = part.strip().partition(";dur=")
+        if name and duration:
+            stages[name] = float(duration)
+    return stages
+
+
+def llm_calls(metrics_text: str) -> int:
+    """Total LLM calls counted by the server's llm_call_seconds histogram."""
+    return int(sum(float(line.rsplit(" ", 1)[1]) for line in metrics_text.splitlines() if line.startswith("llm_call_seconds_count")))
+
+
+async def run_load(base_url: str, args) -> dict:
+    rng = np.random.default_rng(args.seed)
+    total = args.warmup + args.requests
+    users = np.column_stack([rng.uniform(8.5, 23.0, total), rng.uniform(102.5, 109.5, total)])
+    gate = asyncio.Semaphore(args.concurrency)
+    latencies, statuses, stages = [], {}, {}
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        async def one(i: int, record: bool):
+            payload = {"message": MESSAGES[i % len(MESSAGES)], "latitude": float(users[i][0]), "longitude": float(users[i][1])}
+            async with gate:
+                start = time.perf_counter()
+                try:
+                    response = await client.post("/chat", json=payload)
+                    status, timing = response.status_code, response.headers.get("server-timing")
+                except httpx.HTTPError as e:
+                    status, timing = type(e).__name__, None
+                elapsed = time.perf_counter() - start
+            if record:
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == 200:
+                    latencies.append(elapsed)
+                    for stage, ms in parse_server_timing(timing).items():
+                        stages.setdefault(stage, []).append(ms / 1000)
+
+        await asyncio.gather(*(one(i, record=False) for i in range(args.warmup)))
+        calls_before = llm_calls((await client.get("/metrics")).text)
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i, record=True) for i in range(args.warmup, total)))
+        duration = time.perf_counter() - started
+        calls = llm_calls((await client.get("/metrics")).text) - calls_before
+
+    result = {
+        "name": "chat_e2e",
+        "size": args.stores,
+        "concurrency": args.concurrency,
+        "llm_latency_ms": args.latency_ms,
+        "requests": args.requests,
+        "errors": args.requests - statuses.get(200, 0),
+        "statuses": {str(k): v for k, v in statuses.items()},
+        "rps": round(args.requests / duration, 2),
+        "llm_calls": calls,
+        **(summarize(latencies) if latencies else {}),
+        "stages": {stage: summarize(samples) for stage, samples in stages.items()},
+    }
+    return result
+
+
+def print_result(result: dict):
+    print(f"{result['requests']} requests, concurrency {result['concurrency']}, {result['size']} stores, stub latency {result['llm_latency_ms']:.0f} ms")
+    print(f"  throughput {result['rps']:8.1f} req/s, errors {result['errors']} {result['statuses']}, LLM calls {result['llm_calls']}")
+    if "p50_ms" in result:
+        print(f"  latency    p50 {result['p50_ms']:9.1f} ms  p95 {result['p95_ms']:9.1f} ms  p99 {result['p99_ms']:9.1f} ms")
+    for stage, stats in result["stages"].items():
+        print(f"  {stage:<12} p50 {stats['p50_ms']:9.1f} ms  p95 {stats['p95_ms']:9.1f} ms  p99 {stats['p99_ms']:9.1f} ms")
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as workdir:
+        synthetic_sheet(args.stores, seed=args.seed).to_csv(os.path.join(workdir, "stores.csv"), index=False)
+        sheet_server = serve_directory(workdir)
+        sheet_url = f"http://127.0.0.1:{sheet_server.server_address[1]}/stores.csv"
+        log_path = os.path.join(workdir, "server.log")
+
+        processes = []
+        try:
+            with open(log_path, "w") as log:
+                stub = subprocess.Popen(
+                    [sys.executable, os.path.join(BACKEND_DIR, "benchmarks", "stub_llm_server.py"), "--port", str(args.stub_port), "--latency-ms", str(args.latency_ms)],
+                    stdout=log, stderr=subprocess.STDOUT,
+                )
+                processes.append(stub)
+                api = subprocess.Popen(
+                    [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.port), "--log-level", "warning"],
+                    cwd=BACKEND_DIR, env=server_env(args, sheet_url), stdout=log, stderr=subprocess.STDOUT,
+                )
+                processes.append(api)
+
+                base_url = f"http://127.0.0.1:{args.port}"
+                try:
+                    wait_until_ready(f"{base_url}/ready", api)
+                except RuntimeError:
+                    with open(log_path) as f:
+                        print(f.read()[-4000:], file=sys.stderr)
+                    raise
+                result = asyncio.run(run_load(base_url, args))
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait()
+            sheet_server.shutdown()
+
+    print_result(result)
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "compare")}
+    if args.output:
+        write_results(args.output, [result], config)
+    if args.compare and compare_results(args.compare, [result], args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stores", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="simulated LLM latency")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--no-cache", action="store_true", help="disable the intent, reply and location caches")
+    parser.add_argument("--no-intent-rules", dest="intent_rules", action="store_false", help="send every intent to the LLM")
+    parser.add_argument("--port", type=int, default=8130)
+    parser.add_argument("--stub-port", type=int, default=11530)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="earlier JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=1.2, help="slowdown ratio reported as a regression")
+    main(parser.parse_args())
@@ -0,0 +1,108 @@
+"""
+Stand-in LLM server for benchmarks.
+
+Speaks the Ollama `/api/generate` protocol (including `"stream": true`)
+and answers after a fixed simulated latency, so client-side throughput can
+be measured without a GPU. --slow-rate of the calls take --slow-ms instead
+(a latency tail) and --error-rate of them fail with HTTP 503.
+
+    python benchmarks/stub_llm_server.py --port 11500 --latency-ms 200
+    python benchmarks/stub_llm_server.py --port 11501 --latency-ms 100 --slow-rate 0.05 --slow-ms 2000
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+INTENT_REPLY = {"product": "iPhone 16", "generic_term": "iPhone", "category": "Công nghệ", "is_location_request": False}
+TEXT_REPLY = "Mình tìm thấy cửa hàng phù hợp gần bạn, mời bạn ghé qua nhé!"
+# Batched intent prompts end with this marker and a JSON list of messages
+BATCH_MARKER = "User Messages (JSON): "
+
+
+def create_app(latency_ms: float = 200.0, slow_rate: float = 0.0, slow_ms: float = 2000.0, error_rate: float = 0.0) -> FastAPI:
+    app = FastAPI()
+    app.state.latency_ms = latency_ms
+    app.state.slow_rate = slow_rate
+    app.state.slow_ms = slow_ms
+    app.state.error_rate = error_rate
+    app.state.requests = 0
+
+    def call_latency_ms():
+        return app.state.slow_ms if random.random() < app.state.slow_rate else app.state.latency_ms
+
+    def json_reply(prompt):
+        if BATCH_MARKER in prompt:
+            messages = json.loads(prompt.rsplit(BATCH_MARKER, 1)[1])
+            return {"results": [{"id": m["id"], **INTENT_REPLY} for m in messages]}
+        return INTENT_REPLY
+
+    def usage(prompt):
+        # Whitespace word counts stand in for real token counts
+        return {"prompt_eval_count": len(prompt.split()), "eval_count": len(TEXT_REPLY.split())}
+
+    async def stream_reply(model, prompt):
+        # Spread the simulated latency over one line per word
+        words = TEXT_REPLY.split(" ")
+        latency_ms = call_latency_ms()
+        for i, word in enumerate(words):
+            await asyncio.sleep(latency_ms / 1000.0 / len(words))
+            text = word if i == 0 else " " + word
+            yield json.dumps({"model": model, "response": text, "done": False}, ensure_ascii=False) + "\n"
+        yield json.dumps({"model": model, "response": "", "done": True, **usage(prompt)}) + "\n"
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        payload = await request.json()
+        app.state.requests += 1
+        if random.random() < app.state.error_rate:
+            return JSONResponse({"error": "stub failure"}, status_code=503)
+        if payload.get("stream"):
+            return StreamingResponse(stream_reply(payload.get("model"), payload.get("prompt", "")), media_type="application/x-ndjson")
+        await asyncio.sleep(call_latency_ms() / 1000.0)
+        text = json.dumps(json_reply(payload.get("prompt", "")), ensure_ascii=False) if payload.get("format") == "json" else TEXT_REPLY
+        return {"model": payload.get("model"), "response": text, "done": True, **usage(payload.get("prompt", ""))}
+
+    return app
+
+
+class StubServer:
+    """Runs the stub app with uvicorn in a background thread."""
+
+    def __init__(self, port: int = 11500, latency_ms: float = 200.0, **faults):
+        self.port = port
+        self.app = create_app(latency_ms, **faults)
+        self.server = uvicorn.Server(uvicorn.Config(self.app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://localhost:{self.port}"
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="share of calls taking --slow-ms")
+    parser.add_argument("--slow-ms", type=float, default=2000.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls answered with HTTP 503")
+    args = parser.parse_args()
+    app = create_app(args.latency_ms, slow_rate=args.slow_rate, slow_ms=args.slow_ms, error_rate=args.error_rate)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
@@ -1,21 +1,36 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.routing import APIRoute
 from dotenv import load_dotenv
 import os
-import pandas as pd
+import json
+import asyncio
+import logging
+import time
+import numpy as np
 
 # Force load .env from the project root BEFORE importing services
 current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.join(current_dir, "..")
 env_path = os.path.join(project_root, ".env")
 
-print(f"Loading .env from: {env_path}")
 load_dotenv(env_path, override=True)
 
-from models import ChatRequest, ChatResponse, StoreInfo
-from services.sheet_service import load_stores_data
-from services.geo_service import find_nearest_stores
-from services.ai_service import get_ai_response, extract_search_intent, configure_genai
+from services.log_service import configure_logging
+configure_logging()
+logger = logging.getLogger("main")
+logger.info("Loaded .env from: %s", env_path)
+
+from models import BatchChatRequest, BatchChatResponse, ChatRequest, ChatResponse, StoreInfo
+from services.geo_service import decode_cursor, encode_cursor, nearest_stores_page
+from services.snapshot_service import StoreSnapshot, empty_snapshot, get_snapshot_dir
+from services.refresh_service import SnapshotFollower, StoreDataRefresher, get_refresh_config, run_loader
+from services.ai_service import get_ai_response, stream_ai_response, extract_search_intent, configure_genai, close_llm_backend, invalidate_reply_cache, preload_llm_sdk
+from services.metrics_service import INTENT_SOURCE, REQUEST_SECONDS, render_metrics, span, start_trace
+from services.cache_service import MISSING
+from services.location_cache_service import invalidate_location_cache, location_cache, location_cache_key, neighborhood
+from services.session_service import follow_up_kind, history_of, load_session, record_turn, save_session
 
 from fastapi.staticfiles import StaticFiles
 
@@ -30,121 +45,333 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
-# Global variable to store loaded store data
-stores_dataframe: pd.DataFrame = pd.DataFrame()
-unique_categories: list[str] = []
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Time every API request and report its pipeline stages in a Server-Timing header."""
+    trace = start_trace()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    # Static files are not worth a histogram series per path
+    if isinstance(route, APIRoute):
+        elapsed = trace.elapsed()
+        REQUEST_SECONDS.observe(elapsed, endpoint=route.path, method=request.method, status=response.status_code)
+        if trace.spans:
+            response.headers["Server-Timing"] = trace.server_timing()
+            logger.debug("%s %s %d in %.1fms (%s)", request.method, route.path, response.status_code, elapsed * 1000, trace.summary())
+    return response
+
+# Current store data snapshot, swapped atomically by the background refresher
+store_snapshot: StoreSnapshot = empty_snapshot()
+store_refresher: StoreDataRefresher | SnapshotFollower | None = None
+# Background startup task, and until when chat requests wait for its first load
+store_loader: asyncio.Task | None = None
+store_wait_deadline = 0.0
+
+# "worker" when started by the multi-worker launcher below: follow the loader's
+# shared snapshot instead of downloading the sheet in every process
+STORE_ROLE = os.environ.get("STORE_ROLE", "standalone")
+
+def publish_snapshot(snapshot: StoreSnapshot):
+    global store_snapshot
+    previous = store_snapshot
+    store_snapshot = snapshot
+    # Cached replies quote store data and cached neighborhoods hold row positions;
+    # the first load keeps persisted caches
+    if not previous.empty and previous.source_hash != snapshot.source_hash:
+        invalidate_reply_cache()
+        invalidate_location_cache()
+    logger.info("Loaded %d stores.", len(snapshot.stores_dataframe))
+    logger.info("Unique Categories found: %s", snapshot.unique_categories)
+
+async def load_store_data(restore: bool):
+    """Startup work that runs after the server already accepts traffic."""
+    # Serve the local snapshot right away; the refresher replaces it if the sheet changed
+    if restore and await store_refresher.restore():
+        store_refresher.first_load.set()
+    store_refresher.start()
+
+    # Import the LLM SDK off the event loop so /health stays responsive
+    await asyncio.to_thread(preload_llm_sdk)
+    logger.info("Configuring Gemini API...")
+    configure_genai()
+
+    await store_refresher.first_load.wait()
+    if store_snapshot.empty:
+        logger.warning("No categories found in data.")
 
 @app.on_event("startup")
 async def startup_event():
-    global stores_dataframe, unique_categories
-    print("Loading store data on startup...")
-    stores_dataframe = load_stores_data()
-    
-    if not stores_dataframe.empty and 'category' in stores_dataframe.columns:
-        unique_categories = stores_dataframe['category'].dropna().unique().tolist()
-        print(f"Loaded {len(stores_dataframe)} stores.")
-        print(f"Unique Categories found: {unique_categories}")
+    global store_refresher, store_loader, store_wait_deadline
+    logger.info("Loading store data in the background...")
+    refresh_config = get_refresh_config()
+    snapshot_dir = get_snapshot_dir()
+    follower = STORE_ROLE == "worker" and snapshot_dir
+    if follower:
+        store_refresher = SnapshotFollower(publish_snapshot, snapshot_dir, interval=refresh_config["follow_interval"])
     else:
-        print("Warning: No categories found in data.")
+        store_refresher = StoreDataRefresher(publish_snapshot, interval=refresh_config["interval"], timeout=refresh_config["timeout"], snapshot_dir=snapshot_dir)
 
-    print("Configuring Gemini API...")
-    configure_genai()
+    # Startup returns at once so /health answers immediately; /ready reports
+    # when the data is in, and chat requests wait for it up to STORE_STARTUP_WAIT
+    store_wait_deadline = time.monotonic() + refresh_config["startup_wait"]
+    store_loader = asyncio.create_task(load_store_data(restore=not follower))
 
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat_with_ai(request: ChatRequest):
+@app.on_event("shutdown")
+async def shutdown_event():
+    if store_loader and not store_loader.done():
+        store_loader.cancel()
+    if store_refresher:
+        await store_refresher.stop()
+    await close_llm_backend()
+
+
+async def loaded_snapshot() -> StoreSnapshot:
+    """The current store snapshot, waiting for the first load if it is still running."""
+    loading = store_refresher is not None and not store_refresher.first_load.is_set()
+    remaining = store_wait_deadline - time.monotonic()
+    if store_snapshot.empty and loading and remaining > 0:
+        try:
+            await asyncio.wait_for(store_refresher.first_load.wait(), timeout=remaining)
+        except asyncio.TimeoutError:
+            pass
+
+    snapshot = store_snapshot
+    if snapshot.empty:
+        if store_refresher is not None and not store_refresher.first_load.is_set():
+            raise HTTPException(status_code=503, detail="Store data is still loading.", headers={"Retry-After": "5"})
+        raise HTTPException(status_code=500, detail="Store data not loaded.")
+    return snapshot
+
+
+def filter_stores(search_intent: dict, snapshot: StoreSnapshot):
+    """Row positions of the stores matching an intent, and the match type ('product', 'category' or None)."""
+    match_type = None
+
+    # Step 1: Filter by Category (Strict Filter)
+    # If intent has a category, we ONLY look at stores in that category.
+    if search_intent.get('category'):
+        category_term = search_intent['category']
+        candidates = snapshot.search_index.match_category(category_term)
+        logger.debug("Filtered down to %d stores in CATEGORY '%s'", len(candidates), category_term)
+    else:
+        # If no category in intent, start with all stores
+        candidates = snapshot.search_index.all_stores()
+
+    # Step 2: Filter by Product Name (within the category-filtered list)
+    if search_intent.get('product') and len(candidates):
+        product_term = search_intent['product']
+        product_candidates = snapshot.search_index.match_product(product_term, within=candidates)
+
+        if len(product_candidates):
+            candidates = product_candidates
+            match_type = 'product'
+            logger.debug("Found %d stores matching PRODUCT '%s'", len(candidates), product_term)
+        else:
+            # Fallback Step 2.5: Try filtering by 'generic_term' if available
+            # This helps distinguish "Phone" vs "Laptop" within "Tech" category
+            generic_term = search_intent.get('generic_term')
+            if generic_term:
+                logger.debug("Product '%s' not found. Trying generic term '%s'...", product_term, generic_term)
+                generic_candidates = snapshot.search_index.match_product(generic_term, within=candidates)
+
+                if len(generic_candidates):
+                    candidates = generic_candidates
+                    match_type = 'category' # Treat as category match for AI tone
+                    logger.debug("Found %d stores matching GENERIC TERM '%s'", len(candidates), generic_term)
+                else:
+                    match_type = 'category'
+                    logger.debug("Generic term '%s' also not found. Falling back to full CATEGORY '%s'", generic_term, search_intent.get('category'))
+            else:
+                match_type = 'category'
+                logger.debug("Product '%s' not found. Falling back to %d stores in CATEGORY '%s'", product_term, len(candidates), search_intent.get('category'))
+
+    elif len(candidates):
+         # Only Category matched (no product in intent)
+         match_type = 'category'
+
+    return candidates, match_type
+
+
+def resume_search(kind: str, refined: dict | None, session: dict, snapshot: StoreSnapshot):
+    """
+    (search_intent, match_type, candidates, shown) of a follow-up turn, from
+    the session's last search instead of intent extraction and filtering.
+    `shown` are the stores already shown that a 'more' follow-up leaves out.
+    None when a refinement matches no store.
+    """
+    if kind == "refine":
+        # The new product is looked up in the whole category, not only among
+        # the stores of the last product
+        candidates, match_type = filter_stores(refined, snapshot)
+        if not len(candidates):
+            return None
+        return refined, match_type, candidates, []
+
+    candidates = session.get("candidates")
+    shown = session.get("shown") or []
+    if session.get("version") != snapshot.source_hash:
+        # Row positions only hold for the snapshot they were computed on
+        candidates, shown = None, []
+    if candidates is None:
+        candidates, _ = filter_stores(session["intent"], snapshot)
+    candidates = np.asarray(candidates, dtype=np.int64)
+    return session["intent"], session.get("match_type"), candidates, shown if kind == "more" else []
+
+
+def read_cursor(token: str, snapshot: StoreSnapshot) -> dict:
+    """
+    The search a `next_cursor` continues: lat, lon, intent, max_distance_km
+    and the `after` key of its last store. 400 for a malformed cursor, 410
+    once the store data it was issued on has been replaced.
+    """
+    try:
+        cursor = decode_cursor(token)
+        version = cursor["version"]
+        parsed = {
+            "lat": float(cursor["lat"]),
+            "lon": float(cursor["lon"]),
+            "after": (float(cursor["distance"]), int(cursor["position"])),
+            "intent": cursor["intent"],
+            "max_distance_km": None if cursor.get("max_distance_km") is None else float(cursor["max_distance_km"]),
+        }
+        if not isinstance(parsed["intent"], dict):
+            raise ValueError("Cursor has no search intent")
+    except (KeyError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {e}. Please search again without a cursor.")
+    if version != snapshot.source_hash:
+        raise HTTPException(status_code=410, detail="Store data changed since this cursor was issued. Please search again without a cursor.")
+    return parsed
+
+
+async def search_stores(request: ChatRequest, snapshot: StoreSnapshot, session: dict | None = None):
+    """
+    Steps 1-3 of the chat pipeline: intent extraction, store filtering and
+    nearest-store lookup against one store snapshot. Follow-ups in a session
+    refine its last search instead. Returns (search_intent, match_type,
+    nearest_stores_data, is_location_request, next_cursor, session_search),
+    where session_search is the search state to keep in the session.
+    """
     user_message = request.message
     user_latitude = request.latitude
     user_longitude = request.longitude
 
-    if stores_dataframe.empty:
-        raise HTTPException(status_code=500, detail="Store data not loaded.")
+    # Later pages continue the first page's search from where its page ended:
+    # same location, intent and distance bound, on the same store data
+    after = None
+    max_distance_km = request.max_distance_km
+    cursor = read_cursor(request.cursor, snapshot) if request.cursor else None
+    if cursor is not None:
+        user_latitude, user_longitude = cursor["lat"], cursor["lon"]
+        after = cursor["after"]
+        max_distance_km = cursor["max_distance_km"]
+
+    # 0. Follow-ups reuse the session's last search
+    resumed = None
+    if session and cursor is None:
+        kind, refined = follow_up_kind(user_message, session, snapshot.intent_classifier)
+        if kind:
+            resumed = resume_search(kind, refined, session, snapshot)
+    if resumed is not None:
+        INTENT_SOURCE.inc(source=f"session_{kind}")
+        logger.debug("Session follow-up (%s) on %d candidate stores", kind, len(resumed[2]))
 
     # 1. Extract Search Intent (passing dynamic categories)
-    search_intent = await extract_search_intent(user_message, unique_categories)
-    print(f"User Intent: {search_intent}")
+    if cursor is not None:
+        search_intent = cursor["intent"]
+    elif resumed is not None:
+        search_intent = resumed[0]
+    else:
+        with span("intent"):
+            search_intent = await extract_search_intent(user_message, snapshot.unique_categories, snapshot.intent_classifier)
+    logger.debug("User Intent: %s", search_intent)
 
-    # 2. Filter Stores (if intent found)
-    filtered_stores = pd.DataFrame()
+    # 2. Filter Stores (if intent found), as row positions in the snapshot
+    candidates = np.empty(0, dtype=np.int64)
     match_type = None
     is_location_request = search_intent.get('is_location_request') if search_intent else False
-    
-    if search_intent and not is_location_request:
-        # Step 1: Filter by Category (Strict Filter)
-        # If intent has a category, we ONLY look at stores in that category.
-        if search_intent.get('category'):
-            category_term = search_intent['category']
-            mask = stores_dataframe['category'].str.contains(category_term, case=False, na=False)
-            filtered_stores = stores_dataframe[mask]
-            print(f"DEBUG: Filtered down to {len(filtered_stores)} stores in CATEGORY '{category_term}'")
-        else:
-            # If no category in intent, start with all stores
-            filtered_stores = stores_dataframe.copy()
-
-        # Step 2: Filter by Product Name (within the category-filtered list)
-        if search_intent.get('product') and not filtered_stores.empty:
-            product_term = search_intent['product']
-            search_terms = product_term.split()
-            mask = pd.Series([True] * len(filtered_stores))
-            # Reset index to align with mask
-            filtered_stores = filtered_stores.reset_index(drop=True)
-            
-            for term in search_terms:
-                term_mask = (
-                    filtered_stores['product_info'].str.contains(term, case=False, na=False) |
-                    filtered_stores['store_name'].str.contains(term, case=False, na=False)
-                )
-                mask = mask & term_mask
-            
-            product_filtered = filtered_stores[mask]
-            
-            if not product_filtered.empty:
-                filtered_stores = product_filtered
-                match_type = 'product'
-                print(f"DEBUG: Found {len(filtered_stores)} stores matching PRODUCT '{product_term}'")
+    session_candidates = None
+    shown = []
+
+    if resumed is not None:
+        _, match_type, session_candidates, shown = resumed
+        candidates = session_candidates
+        if shown:
+            # "Còn cửa hàng nào khác không?": the stores not shown yet, if any are left
+            rest = np.setdiff1d(candidates, shown)
+            if len(rest):
+                candidates = rest
             else:
-                # Fallback Step 2.5: Try filtering by 'generic_term' if available
-                # This helps distinguish "Phone" vs "Laptop" within "Tech" category
-                generic_term = search_intent.get('generic_term')
-                if generic_term:
-                    print(f"DEBUG: Product '{product_term}' not found. Trying generic term '{generic_term}'...")
-                    mask = (
-                        filtered_stores['product_info'].str.contains(generic_term, case=False, na=False) |
-                        filtered_stores['store_name'].str.contains(generic_term, case=False, na=False)
-                    )
-                    generic_filtered = filtered_stores[mask]
-                    
-                    if not generic_filtered.empty:
-                        filtered_stores = generic_filtered
-                        match_type = 'category' # Treat as category match for AI tone
-                        print(f"DEBUG: Found {len(filtered_stores)} stores matching GENERIC TERM '{generic_term}'")
-                    else:
-                        match_type = 'category'
-                        print(f"DEBUG: Generic term '{generic_term}' also not found. Falling back to full CATEGORY '{search_intent.get('category')}'")
-                else:
-                    match_type = 'category'
-                    print(f"DEBUG: Product '{product_term}' not found. Falling back to {len(filtered_stores)} stores in CATEGORY '{search_intent.get('category')}'")
-        
-        elif not filtered_stores.empty:
-             # Only Category matched (no product in intent)
-             match_type = 'category'
-
-        if filtered_stores.empty:
-            print(f"No stores found matching intent '{search_intent}'.")
+                shown = []
+    elif search_intent and not is_location_request:
+        # A recent request from the same geohash cell with the same intent left
+        # its ranked neighborhood behind; re-ranking that is exact for this position
+        cache_key = None
+        if after is None:
+            cache_key = location_cache_key(user_latitude, user_longitude, search_intent, request.limit + 1, snapshot.source_hash)
+        cached = location_cache.get(cache_key) if cache_key else MISSING
+        if cached is not MISSING:
+            match_type, candidates = cached[0], np.asarray(cached[1], dtype=np.int64)
+            logger.debug("Location cache hit: %d neighborhood stores", len(candidates))
+        else:
+            with span("filter"):
+                candidates, match_type = filter_stores(search_intent, snapshot)
+            session_candidates = candidates
+            if cache_key:
+                with span("neighborhood"):
+                    candidates = neighborhood(snapshot.store_index, user_latitude, user_longitude, request.limit + 1, candidates)
+                location_cache.set(cache_key, [match_type, candidates.tolist()])
+
+        if not len(candidates):
+            logger.debug("No stores found matching intent '%s'.", search_intent)
     else:
         if is_location_request:
-            print("User requested location check.")
+            logger.debug("User requested location check.")
         else:
-            print("No search intent detected. Skipping store lookup.")
+            logger.debug("No search intent detected. Skipping store lookup.")
 
     # 3. Find Nearest Stores
-    # If it's a location request, we might NOT want to show stores? 
-    # Or maybe we still show them if filtered_stores is not empty?
-    # If is_location_request is True, filtered_stores is empty (initialized above).
-    nearest_stores_data = find_nearest_stores(user_latitude, user_longitude, filtered_stores)
+    # Location requests and messages without an intent have no candidates.
+    # Only the rows of the returned page are read from the store frame.
+    with span("geo"):
+        nearest_stores_data, next_after = nearest_stores_page(
+            user_latitude, user_longitude, snapshot.stores_dataframe, limit=request.limit, index=snapshot.store_index,
+            max_distance_km=max_distance_km, after=after, positions=candidates
+        )
+
+    next_cursor = None
+    if next_after is not None:
+        next_cursor = encode_cursor({
+            "version": snapshot.source_hash, "lat": user_latitude, "lon": user_longitude,
+            "distance": next_after[0], "position": next_after[1],
+            "intent": search_intent, "max_distance_km": max_distance_km,
+        })
+
+    # What a follow-up in the same session starts from; positions of a
+    # location cache hit are only a neighborhood, so they are recomputed then.
+    # Later pages leave the session as the first page left it.
+    session_search = None
+    if search_intent and not is_location_request and cursor is None:
+        session_search = {
+            "version": snapshot.source_hash,
+            "intent": search_intent,
+            "match_type": match_type,
+            "candidates": None if session_candidates is None else session_candidates.tolist(),
+            "shown": shown + [store["position"] for store in nearest_stores_data],
+        }
+
+    return search_intent, match_type, nearest_stores_data, is_location_request, next_cursor, session_search
 
+
+def remember_turn(request: ChatRequest, session: dict | None, reply: str, session_search: dict | None):
+    if request.session_id and not request.cursor:
+        save_session(request.session_id, record_turn(session, request.message, reply, session_search))
+
+
+def to_store_info(nearest_stores_data: list[dict]) -> list[StoreInfo]:
     nearest_stores_response = []
     if nearest_stores_data:
         for store in nearest_stores_data:
@@ -155,22 +382,146 @@ async def chat_with_ai(request: ChatRequest):
                 lng=store['longitude'],
                 distance_km=store['distance_km']
             ))
+    return nearest_stores_response
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
-    # 4. Generate AI Response
-    ai_reply = await get_ai_response(user_message, nearest_stores_data, search_intent, match_type)
+
+async def answer_chat(request: ChatRequest, snapshot: StoreSnapshot) -> ChatResponse:
+    session = load_session(request.session_id)
+    search_intent, match_type, nearest_stores_data, is_location_request, next_cursor, session_search = await search_stores(request, snapshot, session)
+
+    # 4. Generate AI Response; later pages only list more stores under the first page's reply
+    ai_reply = ""
+    if not request.cursor:
+        with span("reply"):
+            ai_reply = await get_ai_response(request.message, nearest_stores_data, search_intent, match_type, snapshot.source_hash, snapshot.prompt_fragments, history_of(session))
+        remember_turn(request, session, ai_reply, session_search)
 
     return ChatResponse(
         reply=ai_reply, 
-        nearest_stores=nearest_stores_response,
-        trigger_location=is_location_request # Auto-trigger if user asked for location
+        nearest_stores=to_store_info(nearest_stores_data),
+        trigger_location=is_location_request, # Auto-trigger if user asked for location
+        next_cursor=next_cursor
+    )
+
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat_with_ai(request: ChatRequest):
+    snapshot = await loaded_snapshot()
+
+    return await answer_chat(request, snapshot)
+
+
+@app.post("/chat/batch", response_model=BatchChatResponse)
+async def chat_batch(batch: BatchChatRequest):
+    """
+    Answer many chat messages in one call, in order. They run concurrently
+    against one store snapshot, so their LLM intent calls are micro-batched.
+    """
+    snapshot = await loaded_snapshot()
+    max_size = int(os.environ.get("CHAT_BATCH_MAX", "64"))
+    if len(batch.requests) > max_size:
+        raise HTTPException(status_code=400, detail=f"At most {max_size} messages per batch.")
+
+    responses = await asyncio.gather(*(answer_chat(request, snapshot) for request in batch.requests))
+    return BatchChatResponse(responses=list(responses))
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Server-Sent Events version of /chat. Sends a `stores` event (nearest_stores,
+    trigger_location, next_cursor) as soon as the store search is done, then the reply as
+    `token` events while the LLM generates it, then `done`.
+    """
+    snapshot = await loaded_snapshot()
+
+    session = load_session(request.session_id)
+    search_intent, match_type, nearest_stores_data, is_location_request, next_cursor, session_search = await search_stores(request, snapshot, session)
+
+    async def event_stream():
+        yield sse_event("stores", {
+            "nearest_stores": [store.model_dump() for store in to_store_info(nearest_stores_data)],
+            "trigger_location": is_location_request,
+            "next_cursor": next_cursor
+        })
+        # The frontend handles location requests itself and never shows this reply;
+        # later pages only list more stores under the first page's reply
+        if not is_location_request and not request.cursor:
+            chunks = []
+            with span("reply"):
+                async for chunk in stream_ai_response(request.message, nearest_stores_data, search_intent, match_type, snapshot.source_hash, snapshot.prompt_fragments, history_of(session)):
+                    chunks.append(chunk)
+                    yield sse_event("token", {"text": chunk})
+            remember_turn(request, session, "".join(chunks), session_search)
+        yield sse_event("done", {})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
+@app.get("/health")
+async def health():
+    """Liveness: the process is up, whether or not the store data has loaded."""
+    return {"status": "ok"}
+
+@app.get("/ready")
+async def ready():
+    """Readiness: 200 once store data is loaded (route traffic on this), 503 before."""
+    snapshot = store_snapshot
+    body = {
+        "status": "loading" if snapshot.empty else "ready",
+        "stores": len(snapshot.stores_dataframe),
+        "version": snapshot.version,
+        "last_error": getattr(store_refresher, "last_error", None),
+    }
+    return JSONResponse(body, status_code=503 if snapshot.empty else 200)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of this process's request, stage, LLM and cache metrics."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 # Mount static files to serve frontend
 # We serve the parent directory (project root) where index.html is located
 # Place this AFTER all API routes to avoid shadowing
 static_dir = os.path.join(os.path.dirname(__file__), "..")
 app.mount("/", StaticFiles(directory=static_dir, html=True), name="static")
 
-if __name__ == "__main__":
+def serve(host: str = "0.0.0.0", port: int = 8000, workers: int = 1):
+    """
+    Run the API. With several workers, one loader process downloads the sheet
+    and saves the snapshot to STORE_SNAPSHOT_DIR, and every worker maps the
+    same files read-only (see SnapshotFollower).
+    """
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    snapshot_dir = get_snapshot_dir()
+    if workers <= 1 or not snapshot_dir:
+        if workers > 1:
+            logger.warning("Multi-worker mode needs STORE_SNAPSHOT_DIR, starting a single worker.")
+        uvicorn.run(app, host=host, port=port)
+        return
+
+    import multiprocessing
+    os.environ["STORE_ROLE"] = "worker"
+    loader = multiprocessing.Process(target=run_loader, args=(snapshot_dir,), name="store-loader", daemon=True)
+    loader.start()
+    try:
+        uvicorn.run("main:app", app_dir=current_dir, host=host, port=port, workers=workers)
+    finally:
+        loader.terminate()
+        loader.join()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", "1")))
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers)
@@ -1,9 +1,19 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 class ChatRequest(BaseModel):
     message: str
     latitude: float
     longitude: float
+    # Only stores within this distance of the user
+    max_distance_km: float | None = Field(default=None, gt=0)
+    # Stores per page
+    limit: int = Field(default=3, ge=1, le=50)
+    # `next_cursor` of the previous response, to get the next page of stores.
+    # The page continues the first request's search; message, location and
+    # max_distance_km are ignored, and the reply is empty.
+    cursor: str | None = None
+    # Any client-chosen id; later messages with the same id are answered as follow-ups
+    session_id: str | None = Field(default=None, max_length=128)
 
 class StoreInfo(BaseModel):
     name: str
@@ -16,3 +26,11 @@ class ChatResponse(BaseModel):
     reply: str
     nearest_stores: list[StoreInfo] = []
     trigger_location: bool = False
+    # Pass back as `cursor` for the next page; None on the last page
+    next_cursor: str | None = None
+
+class BatchChatRequest(BaseModel):
+    requests: list[ChatRequest]
+
+class BatchChatResponse(BaseModel):
+    responses: list[ChatResponse]
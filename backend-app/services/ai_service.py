@@ -1,23 +1,87 @@
-import google.generativeai as genai
 import os
-import requests
+import asyncio
 import json
+import logging
+import random
+import re
+import unicodedata
 from dotenv import load_dotenv
 
+from services.batch_service import MicroBatcher, get_batch_config
+from services.cache_service import MISSING, cache_from_env, make_key
+from services.llm_client import GeminiBackend, LLMBackend, OllamaBackend, get_client_config
+from services.llm_router import LLMRouter, get_router_config
+from services.intent_service import STOPWORDS, IntentClassifier, get_classifier_config, hard_rule_intent, record_agreement, record_classification
+from services.metrics_service import INTENT_SOURCE
+from services.prompt_service import StoreFragments, build_reply_prompt, record_prompt
+from services.search_service import tokenize
+
 # Load dotenv (still good to have for standalone testing)
 load_dotenv()
 
-# Global variable to hold the model, initialized lazily
+logger = logging.getLogger(__name__)
+
+# Global variables to hold the model and async backend, initialized lazily
 _model = None
+_backend = None
+
+CONFIG_ERROR_REPLY = "Lỗi cấu hình: Gemini chưa được khởi tạo (thiếu API Key?)."
+ERROR_REPLY = "Xin lỗi, tôi đang gặp vấn đề. Vui lòng thử lại sau."
+
+# Memoized LLM intent extractions (INTENT_CACHE_SIZE / _TTL / _PATH)
+intent_cache = cache_from_env("intent", "INTENT_CACHE", default_size=2048, default_ttl=3600)
+
+# Finished replies keyed on their full prompt inputs (REPLY_CACHE_SIZE / _TTL / _PATH)
+reply_cache = cache_from_env("reply", "REPLY_CACHE", default_size=1024, default_ttl=600)
+
+# Gathers concurrent LLM intent calls into one prompt (INTENT_BATCH_WAIT_MS / _MAX)
+_intent_batcher: MicroBatcher | None = None
+
+# Background LLM checks of confident local classifications (INTENT_RULES_AUDIT_RATE)
+_audit_tasks: set[asyncio.Task] = set()
 
 def get_config():
     """Lazy load configuration from environment variables."""
     return {
         "AI_API_KEY": os.environ.get("AI_API_KEY") or os.environ.get("GEMINI_API_KEY"),
         "AI_MODEL_NAME": os.environ.get("AI_MODEL_NAME", "gemini-2.0-flash"),
-        "AI_API_BASE": os.environ.get("AI_API_BASE")
+        "AI_API_BASE": os.environ.get("AI_API_BASE"),
+        # Several backends behind one router, e.g. "ollama@http://localhost:11434,gemini:gemini-2.0-flash"
+        "AI_BACKENDS": os.environ.get("AI_BACKENDS", ""),
     }
 
+def parse_backend_specs(value: str) -> list[tuple[str, str | None, str | None]]:
+    """(kind, model, url) per comma-separated `kind[:model][@url]` entry of AI_BACKENDS."""
+    specs = []
+    for entry in value.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        backend, _, url = entry.partition("@")
+        kind, _, model = backend.partition(":")
+        kind = kind.strip().lower()
+        if kind not in ("ollama", "gemini"):
+            raise ValueError(f"Unknown LLM backend '{kind}' in AI_BACKENDS (expected ollama or gemini)")
+        specs.append((kind, model.strip() or None, url.strip() or None))
+    return specs
+
+def configured_backend_specs() -> list[tuple[str, str | None, str | None]] | None:
+    """Parsed AI_BACKENDS; None (with the error logged) when it is malformed."""
+    try:
+        return parse_backend_specs(get_config()["AI_BACKENDS"])
+    except ValueError as e:
+        logger.error("Invalid AI_BACKENDS, no LLM backend is configured: %s", e)
+        return None
+
+def uses_gemini() -> bool:
+    config = get_config()
+    specs = configured_backend_specs()
+    if specs is None:
+        return False
+    if specs:
+        return any(kind == "gemini" for kind, _, _ in specs)
+    return not config["AI_API_BASE"]
+
 def get_model():
     """Get or initialize the Gemini model."""
     global _model
@@ -29,142 +93,236 @@ def get_model():
         
     if _model:
         return _model
-        
-    api_key = config["AI_API_KEY"]
+
+    _model = create_gemini_model(config["AI_MODEL_NAME"])
+    return _model
+
+def create_gemini_model(model_name: str):
+    api_key = get_config()["AI_API_KEY"]
     if not api_key:
-        print("WARNING: AI_API_KEY not found. Gemini API calls will likely fail.")
+        logger.warning("AI_API_KEY not found. Gemini API calls will likely fail.")
         return None
-        
+
     try:
+        # The SDK takes about half a second to import; only Gemini needs it
+        import google.generativeai as genai
         genai.configure(api_key=api_key)
-        _model = genai.GenerativeModel(config["AI_MODEL_NAME"])
-        print(f"Configured Gemini Provider with model: {config['AI_MODEL_NAME']}")
-        return _model
+        model = genai.GenerativeModel(model_name)
+        logger.info("Configured Gemini Provider with model: %s", model_name)
+        return model
     except Exception as e:
-        print(f"Error configuring Gemini: {e}")
+        logger.error("Error configuring Gemini: %s", e)
         return None
 
+def preload_llm_sdk():
+    """Import the Gemini SDK ahead of the first request (off the event loop); the custom API needs none."""
+    if uses_gemini():
+        import google.generativeai  # noqa: F401
+
 def configure_genai():
-    # Trigger model initialization
-    get_model()
+    # Trigger model and backend initialization
+    get_llm_backend()
 
-# --- Helper: Call Custom API (e.g., Ollama) ---
-def call_custom_api(prompt, system_instruction=None, json_mode=False):
+# --- Helper: Async LLM backend (Ollama, Gemini or a router over several) ---
+def create_backends(specs: list[tuple[str, str | None, str | None]]) -> list[LLMBackend]:
+    """One backend per AI_BACKENDS entry that could be configured; repeated kinds get numbered names."""
     config = get_config()
-    url = config["AI_API_BASE"]
-    model_name = config["AI_MODEL_NAME"]
-    
-    # Simple heuristic for Ollama URL adjustment
-    if "ollama" in str(url).lower() or "localhost" in str(url).lower():
-        if not url.endswith("/api/generate") and not url.endswith("/v1/chat/completions"):
-             url = f"{url.rstrip('/')}/api/generate"
+    client_config = get_client_config()
+    backends = []
+    seen: dict[str, int] = {}
+    for kind, model_name, url in specs:
+        seen[kind] = seen.get(kind, 0) + 1
+        name = kind if seen[kind] == 1 else f"{kind}_{seen[kind]}"
+        model_name = model_name or config["AI_MODEL_NAME"]
+        if kind == "ollama":
+            url = url or config["AI_API_BASE"]
+            if not url:
+                logger.error("AI_BACKENDS entry %s has no URL and AI_API_BASE is not set; skipping it", name)
+                continue
+            backend = OllamaBackend(url, model_name, name=name, **client_config)
+            logger.info("Configured LLM backend %s at %s with model: %s", name, backend.url, model_name)
+        else:
+            model = create_gemini_model(model_name)
+            if not model:
+                continue
+            backend = GeminiBackend(model, model_name, name=name, **client_config)
+        backends.append(backend)
+    return backends
+
+def get_llm_backend():
+    """Get or initialize the async backend for the configured provider."""
+    global _backend
+    if _backend:
+        return _backend
+
+    config = get_config()
+    client_config = get_client_config()
+
+    specs = configured_backend_specs()
+    if specs is None:
+        return None
+    if specs:
+        backends = create_backends(specs)
+        if len(backends) > 1:
+            _backend = LLMRouter(backends, **get_router_config())
+            logger.info("Routing LLM calls across %s", ", ".join(backend.name for backend in backends))
+        elif backends:
+            _backend = backends[0]
+        return _backend
+
+    if config["AI_API_BASE"]:
+        _backend = OllamaBackend(config["AI_API_BASE"], config["AI_MODEL_NAME"], **client_config)
+        logger.info("Configured Custom API Provider at %s with model: %s", _backend.url, config["AI_MODEL_NAME"])
+        return _backend
+
+    model = get_model()
+    if not model:
+        return None
+    _backend = GeminiBackend(model, config["AI_MODEL_NAME"], **client_config)
+    return _backend
+
+async def close_llm_backend():
+    """Release pooled connections; the backend is recreated on next use."""
+    global _backend
+    if _backend:
+        await _backend.aclose()
+        _backend = None
+
+async def call_custom_api(prompt, system_instruction=None, json_mode=False):
+    backend = get_llm_backend()
+    if backend is None:
+        raise RuntimeError("LLM backend is not configured.")
 
     full_prompt = prompt
     if system_instruction:
         full_prompt = f"System: {system_instruction}\n\nUser: {prompt}"
 
-    payload = {
-        "model": model_name,
-        "prompt": full_prompt,
-        "stream": False,
-        "format": "json" if json_mode else None
-    }
-    
     try:
-        # print(f"DEBUG: POSTing to {url} with model {model_name}")
-        response = requests.post(url, json=payload)
-        response.raise_for_status()
-        return response.json().get("response", "")
+        return await backend.generate(full_prompt, json_mode=json_mode)
     except Exception as e:
-        print(f"Error calling Custom API: {e}")
+        logger.error("Error calling %s API: %s", backend.name, e)
         raise e
 
 # --- Main Service Functions ---
 
-async def get_ai_response(user_message: str, stores_info: list[dict] | None, search_intent: dict | None = None, match_type: str | None = None):
-    system_instruction = "Bạn là trợ lý ảo bán hàng. Nhiệm vụ của bạn là trả lời câu hỏi của khách hàng một cách thân thiện và mời họ đến cửa hàng gần nhất nếu có thông tin."
-    
-    prompt = f"{system_instruction}\n\n"
-
-    if stores_info:
-        context = "Thông tin các cửa hàng gần nhất:\n"
-        for i, store in enumerate(stores_info):
-            context += (
-                f"Cửa hàng {i+1}:\n"
-                f"- Tên: {store['store_name']}\n"
-                f"- Khoảng cách: {store['distance_km']:.2f} km\n"
-                f"- Sản phẩm: {store['product_info']}\n"
-                f"- Khuyến mãi: {store['promotion']}\n"
-                f"- Địa chỉ: {store['address']}\n\n"
-            )
-        prompt += f"Context: {context}\n\nUser Query: {user_message}.\n\n"
-        
-        if match_type == 'product':
-            prompt += "Chỉ dẫn:\n1. Người dùng tìm đúng sản phẩm có trong Context. Hãy báo tin vui và mời họ đến.\n2. Tóm tắt khuyến mãi hấp dẫn nhất."
-        elif match_type == 'category':
-            product_name = search_intent.get('product')
-            category_name = search_intent.get('category') if search_intent else 'danh mục này'
-            
-            if product_name:
-                prompt += f"Chỉ dẫn:\n1. Người dùng tìm '{product_name}' nhưng hiện tại KHÔNG có cửa hàng nào gần đây bán chính xác sản phẩm đó.\n2. Hệ thống tìm thấy các cửa hàng thuộc nhóm '{category_name}' để thay thế.\n3. Hãy nói rõ: 'Tiếc là mình không thấy cửa hàng nào có sẵn {product_name} ở gần bạn. Tuy nhiên, mình tìm thấy các cửa hàng {category_name} này có thể phù hợp...'.\n4. Giới thiệu ngắn gọn."
-            else:
-                prompt += f"Chỉ dẫn:\n1. Người dùng đang tìm kiếm chung về '{category_name}' (hoặc các sản phẩm thuộc nhóm này).\n2. Hãy nói: 'Mình tìm thấy các cửa hàng {category_name} này phù hợp với nhu cầu của bạn...'.\n3. Giới thiệu ngắn gọn."
+def get_reply_cache_config():
+    return {
+        # Share cached replies between messages with the same content words
+        "near_duplicates": os.environ.get("REPLY_CACHE_NEAR_DUPLICATES", "0") == "1",
+        # Store distances are rounded to this many km in the key and the prompt; 0 keeps them exact
+        "distance_step": float(os.environ.get("REPLY_CACHE_DISTANCE_STEP", "0.5")),
+    }
+
+def message_signature(user_message: str, near_duplicates: bool = False) -> str:
+    """Cache form of a message; with near_duplicates, its sorted content words."""
+    if not near_duplicates:
+        return normalize_message(user_message)
+    return " ".join(sorted(set(tokenize(user_message)) - STOPWORDS))
 
-    elif search_intent and search_intent.get('is_location_request'):
-        prompt += f"User Query: {user_message}.\n\nChỉ dẫn:\nNgười dùng đang hỏi về vị trí. Hãy trả lời ngắn gọn: '...' (Frontend sẽ tự động xử lý phần còn lại)."
+def with_cache_distances(stores_info: list[dict] | None) -> list[dict] | None:
+    """
+    Stores with distance_km rounded to the cache's distance step. The prompt
+    quotes these distances, so requests sharing a cache key build the same
+    prompt and a cached reply never quotes another user's distance.
+    """
+    step = get_reply_cache_config()["distance_step"]
+    if not stores_info or step <= 0:
+        return stores_info
+    return [{**store, 'distance_km': round(store['distance_km'] / step) * step} for store in stores_info]
 
-    elif search_intent:
-        product_name = search_intent.get('product') or search_intent.get('category')
-        prompt += f"User Query: {user_message}.\n\nChỉ dẫn:\nNgười dùng muốn tìm '{product_name}' nhưng hiện tại không tìm thấy cửa hàng nào phù hợp trong hệ thống. Hãy xin lỗi khách hàng một cách khéo léo và hỏi họ muốn tìm sản phẩm khác không."
-    else:
-        prompt += f"User Query: {user_message}.\n\nChỉ dẫn:\nĐây là hội thoại xã giao hoặc câu hỏi chưa rõ ý định.\n1. Tự xưng là 'Trợ lý ảo'.\n2. Nếu người dùng nói muốn mua đồ chung chung, hãy hỏi thẳng: 'Bạn đang tìm kiếm sản phẩm nào cụ thể ạ? (Ví dụ: Điện thoại, Quần áo, Laptop...)' (KHÔNG cần chào 'Chào bạn' ở đầu).\n3. CHỈ chào hỏi ('Chào bạn!...') NẾU người dùng có lời chào trước (như 'hi', 'xin chào').\n4. TUYỆT ĐỐI KHÔNG dùng các từ trong ngoặc vuông như '[...]'."
+def reply_cache_key(user_message: str, stores_info: list[dict] | None, search_intent: dict | None, match_type: str | None, data_version: str | None = None, history: list[list[str]] | None = None) -> str:
+    """Canonical hash of everything build_reply_prompt uses, plus the store data version."""
+    config = get_reply_cache_config()
+    step = config["distance_step"]
+    stores = [
+        (
+            store.get('store_id'), store['store_name'], store['address'], store['product_info'], store['promotion'],
+            # 2 decimals is what the prompt prints
+            round(store['distance_km'] / step) if step > 0 else round(store['distance_km'], 2),
+        )
+        for store in stores_info or []
+    ]
+    intent = {k: normalize_message(v) if isinstance(v, str) else v for k, v in (search_intent or {}).items()}
+    parts = [message_signature(user_message, config["near_duplicates"]), intent, match_type, stores, data_version]
+    # Turns without history keep the keys they had before sessions existed
+    if history:
+        parts.append(history)
+    return make_key(*parts)
+
+def invalidate_reply_cache():
+    """Drop every cached reply; called when the store data changes."""
+    reply_cache.clear()
+
+async def get_ai_response(user_message: str, stores_info: list[dict] | None, search_intent: dict | None = None, match_type: str | None = None, data_version: str | None = None, fragments: StoreFragments | None = None, history: list[list[str]] | None = None):
+    stores_info = with_cache_distances(stores_info)
+    cache_key = reply_cache_key(user_message, stores_info, search_intent, match_type, data_version, history)
+    cached = reply_cache.get(cache_key)
+    if cached is not MISSING:
+        logger.debug("Reply cache hit")
+        return cached
+
+    prompt = build_reply_prompt(user_message, stores_info, search_intent, match_type, fragments, history)
 
     try:
-        config = get_config()
-        
-        # Case 1: Custom API (e.g. Ollama)
-        if config["AI_API_BASE"]:
-            return call_custom_api(prompt)
-        
-        # Case 2: Standard Gemini
-        model = get_model()
-        if not model:
-            return "Lỗi cấu hình: Gemini chưa được khởi tạo (thiếu API Key?)."
-        
-        print(f"DEBUG: Sending prompt to Gemini ({config['AI_MODEL_NAME']})...")
-        response = model.generate_content(prompt)
-        return response.text
+        backend = get_llm_backend()
+        if not backend:
+            return CONFIG_ERROR_REPLY
+
+        tokens = record_prompt("reply", prompt)
+        logger.debug("Sending %d-token prompt to %s (%s)...", tokens, backend.name, backend.model_name)
+        reply = await call_custom_api(prompt)
+        # Error replies below are never cached
+        reply_cache.set(cache_key, reply)
+        return reply
             
     except Exception as e:
-        print(f"CRITICAL ERROR in get_ai_response: {e}")
-        import traceback
-        traceback.print_exc()
-        return "Xin lỗi, tôi đang gặp vấn đề. Vui lòng thử lại sau."
+        logger.exception("CRITICAL ERROR in get_ai_response: %s", e)
+        return ERROR_REPLY
 
-async def extract_search_intent(user_message: str, valid_categories: list[str] | None = None) -> dict | None:
-    if not valid_categories:
-        valid_categories = ["Công nghệ", "Thời trang", "Ẩm thực"]
+async def stream_ai_response(user_message: str, stores_info: list[dict] | None, search_intent: dict | None = None, match_type: str | None = None, data_version: str | None = None, fragments: StoreFragments | None = None, history: list[list[str]] | None = None):
+    """Same reply as get_ai_response, yielded chunk by chunk as the LLM streams it."""
+    stores_info = with_cache_distances(stores_info)
+    cache_key = reply_cache_key(user_message, stores_info, search_intent, match_type, data_version, history)
+    cached = reply_cache.get(cache_key)
+    if cached is not MISSING:
+        logger.debug("Reply cache hit")
+        yield cached
+        return
 
-    # --- Hard Rules (Regex) ---
-    import re
-    user_msg_lower = user_message.lower()
-    location_keywords = ["vị trí", "tọa độ", "định vị", "ở đâu", "location", "gps"]
-    
-    if len(user_msg_lower.split()) <= 3 and any(k in user_msg_lower for k in location_keywords):
-        print("DEBUG: Detected Location Request via Regex (Short Command)")
-        return {"product": None, "generic_term": None, "category": None, "is_location_request": True}
-        
-    if any(k in user_msg_lower for k in location_keywords) and any(p in user_msg_lower for p in ["tôi", "mình", "user", "hiện tại", "của tớ"]):
-        print("DEBUG: Detected Location Request via Regex (Keyword Combination)")
-        return {"product": None, "generic_term": None, "category": None, "is_location_request": True}
+    prompt = build_reply_prompt(user_message, stores_info, search_intent, match_type, fragments, history)
 
-    generic_keywords = ["mua đồ", "sắm đồ", "mua sắm", "shopping", "mua gì đó"]
-    if any(k in user_msg_lower for k in generic_keywords) and len(user_msg_lower.split()) <= 6:
-        print("DEBUG: Detected Generic Query (Hardcoded Check) -> Force Return None")
-        return None
-    # --------------------------
+    started = False
+    chunks = []
+    try:
+        backend = get_llm_backend()
+        if not backend:
+            yield CONFIG_ERROR_REPLY
+            return
+
+        tokens = record_prompt("reply", prompt)
+        logger.debug("Streaming %d-token prompt to %s (%s)...", tokens, backend.name, backend.model_name)
+        async for chunk in backend.stream(prompt):
+            started = True
+            chunks.append(chunk)
+            yield chunk
+        # Only a reply that streamed to the end is cached
+        reply_cache.set(cache_key, "".join(chunks))
+    except Exception as e:
+        logger.exception("CRITICAL ERROR in stream_ai_response: %s", e)
+        if not started:
+            yield ERROR_REPLY
+
+def normalize_message(user_message: str) -> str:
+    """Canonical form of a user message for cache lookups."""
+    s = unicodedata.normalize("NFC", user_message).lower()
+    s = re.sub(r"\s+", " ", s)
+    return s.strip(" .,!?;:")
 
-    system_instruction = f"""Bạn là công cụ trích xuất ý định.
+def intent_cache_key(user_message: str, valid_categories: list[str]) -> str:
+    return make_key(normalize_message(user_message), sorted(valid_categories))
+
+def intent_instruction(valid_categories: list[str]) -> str:
+    return f"""Bạn là công cụ trích xuất ý định.
 Nhiệm vụ: Trích xuất 'product', 'generic_term', 'category' và 'is_location_request'.
 Output format: JSON ONLY.
 Rules:
@@ -179,35 +337,167 @@ Rules:
 Ví dụ:
 - "Mua iPhone 16" -> {{"product": "iPhone 16", "generic_term": "iPhone", "category": "Công nghệ", "is_location_request": false}}
 """
+
+def build_intent_prompt(user_message: str, valid_categories: list[str]) -> str:
+    system_instruction = intent_instruction(valid_categories)
     
-    prompt = f"{system_instruction}\n\nUser Message: {user_message}"
+    return f"{system_instruction}\n\nUser Message: {user_message}"
+
+def build_batch_intent_prompt(user_messages: list[str], valid_categories: list[str]) -> str:
+    """One prompt for several messages; the reply is {"results": [...]} with one intent per message id."""
+    system_instruction = intent_instruction(valid_categories)
+    batch_instruction = (
+        "Bạn sẽ nhận nhiều tin nhắn cùng lúc, mỗi tin nhắn có một 'id'. Xử lý từng tin nhắn độc lập theo các quy tắc trên.\n"
+        'Trả về JSON object {"results": [...]}, mỗi phần tử gồm "id" của tin nhắn và 4 trường trên, đúng một phần tử cho mỗi tin nhắn.'
+    )
+    messages = json.dumps([{"id": i, "message": message} for i, message in enumerate(user_messages)], ensure_ascii=False)
+    return f"{system_instruction}\n{batch_instruction}\n\nUser Messages (JSON): {messages}"
+
+def clean_intent(data) -> dict | None:
+    """An intent with nothing to search for is no intent."""
+    if not isinstance(data, dict):
+        raise ValueError(f"Intent is not a JSON object: {data!r}")
+    if not data.get('product') and not data.get('category') and not data.get('is_location_request'):
+        return None
+    return data
+
+def parse_batch_intents(content: str, count: int) -> list:
+    """Per-message intents from a batch reply; MISSING where the reply has no usable entry."""
+    data = json.loads(content)
+    if isinstance(data, dict):
+        data = data.get("results")
+    if not isinstance(data, list):
+        raise ValueError("Batch intent reply has no results array")
+
+    results = [MISSING] * count
+    for position, item in enumerate(data):
+        if not isinstance(item, dict):
+            continue
+        index = item.pop("id", position)
+        if isinstance(index, int) and 0 <= index < count and results[index] is MISSING:
+            results[index] = clean_intent(item)
+    return results
+
+async def llm_extract_intent(user_message: str, valid_categories: list[str]) -> dict | None:
+    """Ask the LLM for the intent. Raises on call or JSON errors."""
+    prompt = build_intent_prompt(user_message, valid_categories)
+    record_prompt("intent", prompt)
+    content = await call_custom_api(prompt, json_mode=True)
+
+    logger.debug("Intent JSON: %s", content)
+    return clean_intent(json.loads(content))
+
+async def llm_extract_intents(items: list[tuple[str, tuple[str, ...]]]) -> list:
+    """
+    MicroBatcher handler: one LLM call per distinct category list, each
+    covering all its messages. Messages the batch reply leaves out are
+    retried one by one.
+    """
+    results: list = [MISSING] * len(items)
+    groups: dict[tuple[str, ...], list[int]] = {}
+    for i, (_, categories) in enumerate(items):
+        groups.setdefault(categories, []).append(i)
+
+    async def run_group(categories: tuple[str, ...], indexes: list[int]):
+        if len(indexes) > 1:
+            messages = [items[i][0] for i in indexes]
+            try:
+                prompt = build_batch_intent_prompt(messages, list(categories))
+                record_prompt("intent_batch", prompt)
+                content = await call_custom_api(prompt, json_mode=True)
+                logger.debug("Batch intent JSON: %s", content)
+                for i, intent in zip(indexes, parse_batch_intents(content, len(indexes))):
+                    results[i] = intent
+            except Exception as e:
+                logger.warning("Batched intent extraction failed (%s), falling back to single calls", e)
+
+        missing = [i for i in indexes if results[i] is MISSING]
+        singles = await asyncio.gather(*(llm_extract_intent(items[i][0], list(categories)) for i in missing), return_exceptions=True)
+        for i, result in zip(missing, singles):
+            results[i] = result
 
+    await asyncio.gather(*(run_group(categories, indexes) for categories, indexes in groups.items()))
+    return results
+
+def get_intent_batcher() -> MicroBatcher | None:
+    """Shared batcher for LLM intent calls, or None when INTENT_BATCH_WAIT_MS is 0."""
+    global _intent_batcher
+    config = get_batch_config()
+    if config["wait_ms"] <= 0:
+        return None
+    if _intent_batcher is None:
+        _intent_batcher = MicroBatcher("intent", llm_extract_intents, max_size=config["max_size"], max_wait=config["wait_ms"] / 1000.0)
+    return _intent_batcher
+
+async def request_intent(user_message: str, valid_categories: list[str]) -> dict | None:
+    """LLM intent for one message, micro-batched with concurrent requests when enabled."""
+    batcher = get_intent_batcher()
+    if batcher is None:
+        return await llm_extract_intent(user_message, valid_categories)
+    return await batcher.submit((user_message, tuple(valid_categories)))
+
+async def audit_rules_intent(user_message: str, valid_categories: list[str], guess: dict | None, confidence: float):
+    """Compare a confident local classification with the LLM, for the agreement metrics only."""
     try:
-        content = ""
-        config = get_config()
-        
-        if config["AI_API_BASE"]:
-            content = call_custom_api(prompt, json_mode=True)
-        else:
-            model = get_model()
-            if not model:
-                return None
-            response = model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0,
-                    response_mime_type="application/json"
-                )
-            )
-            content = response.text.strip()
-
-        print(f"DEBUG: Intent JSON: {content}")
-        data = json.loads(content)
-        
-        if not data.get('product') and not data.get('category') and not data.get('is_location_request'):
+        data = await request_intent(user_message, valid_categories)
+    except Exception as e:
+        logger.debug("Intent audit failed: %s", e)
+        return
+    record_agreement(guess, confidence, data)
+
+async def extract_search_intent(user_message: str, valid_categories: list[str] | None = None, classifier: IntentClassifier | None = None) -> dict | None:
+    if not valid_categories:
+        valid_categories = ["Công nghệ", "Thời trang", "Ẩm thực"]
+
+    # --- Hard Rules (Regex) ---
+    ruled = hard_rule_intent(user_message)
+    if ruled is not None:
+        rule, intent = ruled
+        logger.debug("Intent decided by hard rule %s: %s", rule, intent)
+        INTENT_SOURCE.inc(source=rule)
+        return intent
+    # --------------------------
+
+    # --- Local classifier (catalog aliases) ---
+    rules_config = get_classifier_config()
+    classified = classifier is not None and rules_config["enabled"]
+    if classified:
+        guess, confidence = classifier.classify(user_message)
+        if guess is not None and confidence >= rules_config["min_confidence"]:
+            logger.debug("Intent from local rules (confidence %.2f): %s", confidence, guess)
+            record_classification("confident")
+            INTENT_SOURCE.inc(source="rules")
+            if rules_config["audit_rate"] > 0 and random.random() < rules_config["audit_rate"]:
+                task = asyncio.create_task(audit_rules_intent(user_message, valid_categories, guess, confidence))
+                _audit_tasks.add(task)
+                task.add_done_callback(_audit_tasks.discard)
+            return guess
+        record_classification("low_confidence" if guess is not None else "no_match")
+    # --------------------------
+
+    cache_key = intent_cache_key(user_message, valid_categories)
+    cached = intent_cache.get(cache_key)
+    if cached is not MISSING:
+        logger.debug("Intent cache hit")
+        INTENT_SOURCE.inc(source="cache")
+        data = dict(cached) if cached else None
+        if classified:
+            record_agreement(guess, confidence, data)
+        return data
+
+    try:
+        if not get_llm_backend():
+            INTENT_SOURCE.inc(source="unconfigured")
             return None
-            
+        data = await request_intent(user_message, valid_categories)
+
+        # Only successful extractions are cached; errors fall through to None below
+        intent_cache.set(cache_key, data)
+        INTENT_SOURCE.inc(source="llm")
+        if classified:
+            record_agreement(guess, confidence, data)
         return data
     except Exception as e:
-        print(f"Error extracting intent: {e}")
+        logger.error("Error extracting intent: %s", e)
+        INTENT_SOURCE.inc(source="error")
         return None
@@ -0,0 +1,77 @@
+import asyncio
+import os
+from typing import Awaitable, Callable
+
+from services.metrics_service import BATCH_SIZE
+
+
+def get_batch_config():
+    return {
+        # 0 disables intent micro-batching
+        "wait_ms": float(os.environ.get("INTENT_BATCH_WAIT_MS", "10")),
+        "max_size": int(os.environ.get("INTENT_BATCH_MAX", "16")),
+    }
+
+
+class MicroBatcher:
+    """
+    Gathers concurrent `submit` calls into one `handler` call.
+
+    A batch is sent once it holds `max_size` items or `max_wait` seconds
+    after its first item arrived, whichever comes first, so no caller waits
+    longer than `max_wait` for company. `handler` gets the items in order
+    and returns one result per item; a result that is an exception is raised
+    to that caller only. If the handler raises or returns the wrong number
+    of results, every caller in the batch gets the error.
+    """
+
+    def __init__(self, name: str, handler: Callable[[list], Awaitable[list]], max_size: int = 16, max_wait: float = 0.01):
+        self.name = name
+        self.handler = handler
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self._pending: list[tuple[object, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[object, asyncio.Future]]):
+        BATCH_SIZE.observe(len(batch), batcher=self.name)
+        try:
+            results = await self.handler([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f"{self.name} batch handler returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            results = [e] * len(batch)
+        except asyncio.CancelledError:
+            # Nobody will answer these callers now
+            for _, future in batch:
+                future.cancel()
+            raise
+        for (_, future), result in zip(batch, results):
+            # The caller may have given up (cancelled) in the meantime
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -0,0 +1,183 @@
+import atexit
+import hashlib
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from services.metrics_service import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+# Returned by TTLCache.get on a miss, so that None can be cached as a value
+MISSING = object()
+
+
+def make_key(*parts) -> str:
+    """Stable hash of JSON-serializable parts, used as a cache key."""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class SQLiteWriter:
+    """
+    Runs SQLite writes on a background thread with its own connection, so
+    callers on the event loop never wait for the disk. Statements are applied
+    in order; whatever is queued when the thread wakes up is committed as one
+    transaction. `done` callbacks run once their statement is committed.
+    """
+
+    def __init__(self, path: str, name: str, batch_size: int = 256):
+        self.path = path
+        self.batch_size = batch_size
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"{name}-sqlite-writer", daemon=True)
+        self._thread.start()
+        # Queued writes still land when the process exits normally
+        atexit.register(self.flush, 5.0)
+
+    def execute(self, sql: str, params: tuple = (), done=None):
+        self._queue.put((sql, params, done))
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Wait until every write queued so far is committed."""
+        committed = threading.Event()
+        self._queue.put((None, None, committed.set))
+        return committed.wait(timeout)
+
+    def _run(self):
+        db = sqlite3.connect(self.path, timeout=5)
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with db:
+                    for sql, params, _ in batch:
+                        if sql is not None:
+                            db.execute(sql, params)
+            except sqlite3.Error as e:
+                logger.error("Writing %d statements to %s failed: %s", len(batch), self.path, e)
+            for _, _, done in batch:
+                if done is not None:
+                    done()
+
+
+class TTLCache:
+    """
+    In-memory LRU cache with per-entry TTL and hit/miss counters.
+
+    When `path` is given, entries are also written to a SQLite file so they
+    survive restarts; memory misses fall through to disk. Disk writes are
+    batched on a background SQLiteWriter. Values must be JSON-serializable
+    when a disk backing is used.
+    """
+
+    def __init__(self, name: str, max_size: int = 1024, ttl: float = 3600.0, path: str | None = None):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._writer = None
+        # Clears queued on the writer; disk rows are stale until they land
+        self._pending_clears = 0
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            # Lets lookups read while the writer thread commits
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)")
+            self._db.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+            self._db.commit()
+            self._writer = SQLiteWriter(path, name)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remember(self, key: str, expires_at: float, value):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _load_from_disk(self, key: str, now: float):
+        row = self._db.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < now:
+            return MISSING
+        value = json.loads(row[0])
+        self._remember(key, row[1], value)
+        return value
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at >= now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    CACHE_LOOKUPS.inc(cache=self.name, result="hit")
+                    return value
+                del self._entries[key]
+
+            value = self._load_from_disk(key, now) if self._db and not self._pending_clears else MISSING
+            if value is MISSING:
+                self.misses += 1
+            else:
+                self.hits += 1
+        CACHE_LOOKUPS.inc(cache=self.name, result="miss" if value is MISSING else "hit")
+        return value
+
+    def set(self, key: str, value, ttl: float | None = None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._remember(key, expires_at, value)
+            if self._writer:
+                self._writer.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), expires_at)
+                )
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._writer:
+                self._pending_clears += 1
+                self._writer.execute("DELETE FROM cache", done=self._cleared)
+
+    def _cleared(self):
+        with self._lock:
+            self._pending_clears -= 1
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def cache_from_env(name: str, prefix: str, default_size: int = 1024, default_ttl: float = 3600.0) -> TTLCache:
+    """Build a TTLCache configured by <PREFIX>_SIZE, <PREFIX>_TTL and <PREFIX>_PATH."""
+    return TTLCache(
+        name,
+        max_size=int(os.environ.get(f"{prefix}_SIZE", default_size)),
+        ttl=float(os.environ.get(f"{prefix}_TTL", default_ttl)),
+        path=os.environ.get(f"{prefix}_PATH") or None,
+    )
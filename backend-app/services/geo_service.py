@@ -1,15 +1,391 @@
-from geopy.distance import geodesic
+import base64
+import json
+import numpy as np
 import pandas as pd
 
-def find_nearest_stores(user_lat: float, user_long: float, stores_df: pd.DataFrame, limit: int = 3):
+EARTH_RADIUS_KM = 6371.0088
+
+# Size of one grid cell in degrees (~5.5 km of latitude).
+GRID_CELL_DEG = 0.05
+
+# Below this many candidates a straight vectorized scan beats walking the grid.
+BRUTE_FORCE_THRESHOLD = 2048
+
+# Relative slack on per-cell distance bounds, so a cell is never pruned by
+# rounding or by the lat/lon-rectangle approximation of its outline.
+CELL_BOUND_MARGIN = 0.01
+
+# Approximate length of one degree of latitude.
+KM_PER_DEGREE = 111.2
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Vectorized haversine distance in km. Inputs are in radians."""
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def bounding_box(lat: float, lon: float, radius_km: float):
+    """
+    Lat/lon box (degrees) that contains every point within radius_km of (lat, lon).
+    Returns (min_lat, max_lat, min_lon, max_lon); the longitude range is widened
+    to the full circle when the cap touches a pole or the antimeridian.
+    """
+    delta = radius_km / EARTH_RADIUS_KM
+    lat_r = np.radians(lat)
+    min_lat = lat_r - delta
+    max_lat = lat_r + delta
+
+    if min_lat <= -np.pi / 2 or max_lat >= np.pi / 2:
+        return max(np.degrees(min_lat), -90.0), min(np.degrees(max_lat), 90.0), -180.0, 180.0
+
+    dlon = np.arcsin(min(1.0, np.sin(delta) / np.cos(lat_r)))
+    min_lon = lon - np.degrees(dlon)
+    max_lon = lon + np.degrees(dlon)
+    if min_lon < -180.0 or max_lon > 180.0:
+        return np.degrees(min_lat), np.degrees(max_lat), -180.0, 180.0
+    return np.degrees(min_lat), np.degrees(max_lat), min_lon, max_lon
+
+
+def geohash_bounds(lat: float, lon: float, precision: int) -> tuple[str, float, float, float, float]:
+    """Geohash of (lat, lon) and its cell as (geohash, min_lat, max_lat, min_lon, max_lon)."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        # Bits alternate between longitude and latitude, longitude first
+        interval, coordinate = (lon_range, lon) if even else (lat_range, lat)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return "".join(chars), lat_range[0], lat_range[1], lon_range[0], lon_range[1]
+
+
+def geohash_cell(lat: float, lon: float, precision: int) -> tuple[str, float, float, float]:
+    """(geohash, center_lat, center_lon, half_diagonal_km) of the cell containing (lat, lon)."""
+    code, min_lat, max_lat, min_lon, max_lon = geohash_bounds(lat, lon, precision)
+    center_lat, center_lon = (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+    corners_lat = np.radians([min_lat, min_lat, max_lat, max_lat])
+    corners_lon = np.radians([min_lon, max_lon, min_lon, max_lon])
+    half_diagonal = float(haversine_km(np.radians(center_lat), np.radians(center_lon), corners_lat, corners_lon).max())
+    return code, center_lat, center_lon, half_diagonal
+
+
+class StoreIndex:
+    """
+    Grid index over store coordinates, built once when the store data loads.
+
+    Stores are addressed by their row position in the DataFrame the index was
+    built from, so any subset of that frame (e.g. after category/product masks)
+    can be queried without rebuilding the index.
+    """
+
+    def __init__(self, stores_df: pd.DataFrame, cell_deg: float = GRID_CELL_DEG, arrays: dict[str, np.ndarray] | None = None):
+        self.stores_df = stores_df
+        self.cell_deg = cell_deg
+        self.size = len(stores_df)
+
+        if arrays is None:
+            arrays = self._build_arrays(stores_df, cell_deg)
+        self.arrays = arrays
+        self.lat_rad = arrays['lat_rad']
+        self.lon_rad = arrays['lon_rad']
+
+        # Grid cell -> row positions (views into the flat cell_members array)
+        keys, offsets, members = arrays['cell_keys'], arrays['cell_offsets'], arrays['cell_members']
+        self.cells: dict[tuple[int, int], np.ndarray] = {
+            (int(keys[c, 0]), int(keys[c, 1])): members[offsets[c]:offsets[c + 1]]
+            for c in range(len(keys))
+        }
+        if len(keys):
+            self.min_i, self.max_i = int(keys[:, 0].min()), int(keys[:, 0].max())
+            self.min_j, self.max_j = int(keys[:, 1].min()), int(keys[:, 1].max())
+
+    @staticmethod
+    def _build_arrays(stores_df: pd.DataFrame, cell_deg: float) -> dict[str, np.ndarray]:
+        """Flat array form of the index, suitable for saving and memory-mapping."""
+        size = len(stores_df)
+        lat_deg = stores_df['latitude'].to_numpy(dtype=np.float64) if size else np.empty(0)
+        lon_deg = stores_df['longitude'].to_numpy(dtype=np.float64) if size else np.empty(0)
+
+        # Bucket row positions by grid cell
+        cell_i = np.floor(lat_deg / cell_deg).astype(np.int64)
+        cell_j = np.floor(lon_deg / cell_deg).astype(np.int64)
+        order = np.lexsort((cell_j, cell_i))
+        keys = np.stack([cell_i[order], cell_j[order]], axis=1)
+        starts = np.concatenate([[0], np.flatnonzero(np.any(keys[1:] != keys[:-1], axis=1)) + 1]) if size else np.empty(0, dtype=np.int64)
+
+        return {
+            'lat_rad': np.radians(lat_deg),
+            'lon_rad': np.radians(lon_deg),
+            'cell_keys': keys[starts].reshape(-1, 2),
+            'cell_offsets': np.append(starts, size).astype(np.int64),
+            'cell_members': order.astype(np.int64),
+        }
+
+    def positions_for(self, subset_df: pd.DataFrame) -> np.ndarray:
+        """Map rows of a subset of the indexed frame back to row positions."""
+        return self.stores_df.index.get_indexer(subset_df.index)
+
+    def _cell_of(self, lat: float, lon: float) -> tuple[int, int]:
+        return int(np.floor(lat / self.cell_deg)), int(np.floor(lon / self.cell_deg))
+
+    @staticmethod
+    def _ring_keys(ci: int, cj: int, r: int) -> list[tuple[int, int]]:
+        """Keys of the cells at Chebyshev distance r from cell (ci, cj)."""
+        if r == 0:
+            return [(ci, cj)]
+        keys = [(ci + di, cj + dj) for di in range(-r, r + 1) for dj in (-r, r)]
+        keys += [(ci + di, cj + dj) for di in (-r, r) for dj in range(-r + 1, r)]
+        return keys
+
+    def _cells_in_box(self, box) -> tuple[list[tuple[int, int]], bool]:
+        """Keys of the grid cells overlapping a lat/lon box, and whether the box covers the whole grid."""
+        min_lat, max_lat, min_lon, max_lon = box
+        i0, j0 = self._cell_of(min_lat, min_lon)
+        i1, j1 = self._cell_of(max_lat, max_lon)
+        covers_all = i0 <= self.min_i and i1 >= self.max_i and j0 <= self.min_j and j1 >= self.max_j
+        i0, i1 = max(i0, self.min_i), min(i1, self.max_i)
+        j0, j1 = max(j0, self.min_j), min(j1, self.max_j)
+
+        # A box spanning more cells than the index holds is cheaper to walk by key
+        if (i1 - i0 + 1) * (j1 - j0 + 1) > len(self.cells):
+            keys = [k for k in self.cells if i0 <= k[0] <= i1 and j0 <= k[1] <= j1]
+        else:
+            keys = [(i, j) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1) if (i, j) in self.cells]
+        return keys, covers_all
+
+    def _gather_box(self, box, allowed: np.ndarray | None) -> np.ndarray:
+        keys, _ = self._cells_in_box(box)
+        return self._gather_cells(keys, allowed)
+
+    def _gather_cells(self, keys: list[tuple[int, int]], allowed: np.ndarray | None) -> np.ndarray:
+        found = []
+        for key in keys:
+            members = self.cells.get(key)
+            if members is None:
+                continue
+            if allowed is not None:
+                members = members[allowed[members]]
+            if len(members):
+                found.append(members)
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+    def _distances(self, lat: float, lon: float, positions: np.ndarray) -> np.ndarray:
+        return haversine_km(np.radians(lat), np.radians(lon), self.lat_rad[positions], self.lon_rad[positions])
+
+    def _top_k(self, lat: float, lon: float, positions: np.ndarray, k: int, max_distance_km: float | None = None, after: tuple[float, int] | None = None):
+        """
+        The k nearest of `positions`, ordered by (distance, position) so that
+        ties break the same way on every page. Only stores after the `after`
+        key and within max_distance_km are eligible.
+        """
+        distances = self._distances(lat, lon, positions)
+        if after is not None or max_distance_km is not None:
+            keep = np.ones(len(positions), dtype=bool)
+            if after is not None:
+                keep &= (distances > after[0]) | ((distances == after[0]) & (positions > after[1]))
+            if max_distance_km is not None:
+                keep &= distances <= max_distance_km
+            positions, distances = positions[keep], distances[keep]
+        if len(positions) > k:
+            # Everything up to the k-th distance, so ties at the cut are kept for the position order
+            kth = distances[np.argpartition(distances, k - 1)[k - 1]]
+            near = distances <= kth
+            positions, distances = positions[near], distances[near]
+        order = np.lexsort((positions, distances))[:k]
+        return positions[order], distances[order]
+
+    def _cell_distance_bounds(self, lat: float, lon: float, keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Lower and upper bounds (km) on the distance from (lat, lon) to anything in each cell."""
+        lat0 = keys[:, 0] * self.cell_deg
+        lon0 = keys[:, 1] * self.cell_deg
+        lat1 = lat0 + self.cell_deg
+        lon1 = lon0 + self.cell_deg
+        lat_r, lon_r = np.radians(lat), np.radians(lon)
+
+        nearest = haversine_km(lat_r, lon_r, np.radians(np.clip(lat, lat0, lat1)), np.radians(np.clip(lon, lon0, lon1)))
+        corners = [haversine_km(lat_r, lon_r, np.radians(a), np.radians(b)) for a in (lat0, lat1) for b in (lon0, lon1)]
+        farthest = np.maximum.reduce(corners)
+        return nearest * (1 - CELL_BOUND_MARGIN), farthest * (1 + CELL_BOUND_MARGIN)
+
+    def _query_after(self, lat: float, lon: float, k: int, allowed: np.ndarray | None, max_distance_km: float | None, after: tuple[float, int]):
+        """
+        Next k stores beyond the `after` key. Only cells overlapping the ring
+        between the key's distance and a search radius are read; the radius
+        doubles (up to max_distance_km) until k stores turn up.
+        """
+        inner = after[0]
+        radius = inner + self.cell_deg * KM_PER_DEGREE
+        while True:
+            if max_distance_km is not None:
+                radius = min(radius, max_distance_km)
+            keys, covers_all = self._cells_in_box(bounding_box(lat, lon, radius))
+            # Once the box spans the whole grid nothing lies beyond it, however
+            # far the stores are: rank all the rest instead of those within radius
+            bound = max_distance_km if covers_all else radius
+            if keys:
+                lower, upper = self._cell_distance_bounds(lat, lon, np.array(keys, dtype=np.int64))
+                # Skip cells wholly inside the pages already served or wholly beyond the bound
+                keys = [key for key, low, high in zip(keys, lower, upper) if (bound is None or low <= bound) and high >= inner]
+            candidates = self._gather_cells(keys, allowed)
+            positions, distances = self._top_k(lat, lon, candidates, k, bound, after)
+            if len(positions) >= k or covers_all or (max_distance_km is not None and radius >= max_distance_km):
+                return positions, distances
+            radius = inner + 2 * (radius - inner)
+
+    def within(self, lat: float, lon: float, radius_km: float, positions: np.ndarray | None = None) -> np.ndarray:
+        """Row positions (optionally among `positions`) within radius_km of (lat, lon)."""
+        if self.size == 0:
+            return np.empty(0, dtype=np.int64)
+        allowed = None
+        if positions is not None:
+            positions = np.asarray(positions, dtype=np.int64)
+            positions = positions[positions >= 0]
+            if len(positions) <= BRUTE_FORCE_THRESHOLD:
+                return positions[self._distances(lat, lon, positions) <= radius_km]
+            allowed = np.zeros(self.size, dtype=bool)
+            allowed[positions] = True
+        candidates = self._gather_box(bounding_box(lat, lon, radius_km), allowed)
+        return np.sort(candidates[self._distances(lat, lon, candidates) <= radius_km])
+
+    def query(self, lat: float, lon: float, k: int = 3, positions: np.ndarray | None = None, max_distance_km: float | None = None, after: tuple[float, int] | None = None):
+        """
+        Return (positions, haversine_km) of the k stores nearest to (lat, lon),
+        restricted to the given row positions when provided, to stores within
+        max_distance_km, and to stores ordered after the `after` key, i.e. the
+        (distance, position) of the last store of the previous page.
+        """
+        if self.size == 0 or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        if max_distance_km is not None and after is None:
+            # The k nearest, then the bound: cheaper than reading every cell within the radius
+            top_positions, top_distances = self.query(lat, lon, k, positions)
+            within = top_distances <= max_distance_km
+            return top_positions[within], top_distances[within]
+
+        allowed = None
+        if positions is not None:
+            positions = np.asarray(positions, dtype=np.int64)
+            positions = positions[positions >= 0]
+            if len(positions) == 0:
+                return np.empty(0, dtype=np.int64), np.empty(0)
+            if len(positions) <= max(BRUTE_FORCE_THRESHOLD, k):
+                return self._top_k(lat, lon, positions, k, max_distance_km, after)
+            allowed = np.zeros(self.size, dtype=bool)
+            allowed[positions] = True
+            candidate_count = len(positions)
+        else:
+            if self.size <= max(BRUTE_FORCE_THRESHOLD, k):
+                return self._top_k(lat, lon, np.arange(self.size), k, max_distance_km, after)
+            candidate_count = self.size
+
+        if after is not None:
+            return self._query_after(lat, lon, k, allowed, max_distance_km, after)
+
+        # Walk rings of cells outward until we hold at least k candidates
+        ci, cj = self._cell_of(lat, lon)
+        max_r = max(abs(ci - self.min_i), abs(ci - self.max_i), abs(cj - self.min_j), abs(cj - self.max_j))
+        found: list[np.ndarray] = []
+        count = 0
+        r = 0
+        while count < min(k, candidate_count) and r <= max_r:
+            if (2 * r + 1) ** 2 > len(self.cells):
+                # Sparse candidates: the rings now cost more than a full scan
+                everything = np.flatnonzero(allowed) if allowed is not None else np.arange(self.size)
+                return self._top_k(lat, lon, everything, k)
+            ring = self._gather_cells(self._ring_keys(ci, cj, r), allowed)
+            found.append(ring)
+            count += len(ring)
+            r += 1
+
+        if count == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        # Any closer store must lie inside the box around the k-th candidate's distance
+        seed = np.concatenate(found)
+        _, seed_distances = self._top_k(lat, lon, seed, k)
+        radius = float(seed_distances[-1]) * (1 + 1e-9) + 1e-9
+        candidates = self._gather_box(bounding_box(lat, lon, radius), allowed)
+        return self._top_k(lat, lon, candidates, k)
+
+
+def build_store_index(stores_df: pd.DataFrame, arrays: dict[str, np.ndarray] | None = None) -> StoreIndex:
+    return StoreIndex(stores_df, arrays=arrays)
+
+
+def encode_cursor(payload: dict) -> str:
+    """Opaque, URL-safe page cursor for a JSON-serializable payload."""
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    """Inverse of encode_cursor; raises ValueError for anything it did not produce."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception as e:
+        raise ValueError("Malformed cursor") from e
+    if not isinstance(payload, dict):
+        raise ValueError("Malformed cursor")
+    return payload
+
+
+def nearest_stores_page(user_lat: float, user_long: float, stores_df: pd.DataFrame | None, limit: int = 3, index: StoreIndex | None = None, max_distance_km: float | None = None, after: tuple[float, int] | None = None, positions: np.ndarray | None = None):
+    """
+    One page of the stores in stores_df closest to the user.
+
+    With an index, `positions` (row positions in the index's frame) can be
+    given instead of stores_df, so a filtered candidate set is searched
+    without first materializing its rows; only the returned stores are read.
+
+    Returns (stores, next_after): the stores as dicts sorted by distance, and
+    the `after` key for the next page, or None when this is the last page.
+    Pass that key back as `after` (with the same filters) to continue.
+    """
+    if index is None:
+        if stores_df is None or stores_df.empty:
+            return [], None
+        index = StoreIndex(stores_df)
+    elif positions is None:
+        positions = index.positions_for(stores_df)
+    if positions is not None and len(positions) == 0:
+        return [], None
+
+    # One extra store tells whether there is a next page
+    top_positions, top_distances = index.query(user_lat, user_long, limit + 1, positions, max_distance_km, after)
+    next_after = None
+    if len(top_positions) > limit:
+        top_positions, top_distances = top_positions[:limit], top_distances[:limit]
+        next_after = (float(top_distances[-1]), int(top_positions[-1]))
+
+    # Exact geodesic distances for the handful of stores we actually return
+    from geopy.distance import geodesic
     user_location = (user_lat, user_long)
     stores_with_distance = []
-
-    for index, store in stores_df.iterrows():
+    for position in top_positions:
+        store = index.stores_df.iloc[position]
         store_location = (store['latitude'], store['longitude'])
-        distance = geodesic(user_location, store_location).km
-
         stores_with_distance.append({
+            # Row in the index's store frame, for data precompiled per row
+            "position": int(position),
             "store_id": store['store_id'],
             "store_name": store['store_name'],
             "address": store['address'],
@@ -18,14 +394,26 @@ def find_nearest_stores(user_lat: float, user_long: float, stores_df: pd.DataFra
             "promotion": store['promotion'],
             "latitude": store['latitude'],
             "longitude": store['longitude'],
-            "distance_km": distance
+            "distance_km": geodesic(user_location, store_location).km
         })
-    
-    # Sort by distance
+
+    # Haversine and geodesic can disagree on near ties
     stores_with_distance.sort(key=lambda x: x['distance_km'])
-    
-    # Return top 'limit' stores
-    return stores_with_distance[:limit]
+    return stores_with_distance, next_after
+
+
+def find_nearest_stores(user_lat: float, user_long: float, stores_df: pd.DataFrame | None, limit: int = 3, index: StoreIndex | None = None, max_distance_km: float | None = None, positions: np.ndarray | None = None):
+    """
+    Return the `limit` stores in stores_df closest to the user, optionally
+    only those within max_distance_km.
+
+    When an index built over the full store frame is provided, stores_df may be
+    any subset of that frame (its index labels are used to locate the rows),
+    or `positions` may name the rows directly; otherwise a throwaway index is
+    built over stores_df itself.
+    """
+    stores, _ = nearest_stores_page(user_lat, user_long, stores_df, limit, index, max_distance_km, positions=positions)
+    return stores
 
 if __name__ == '__main__':
     # Example usage (for testing purposes)
@@ -40,8 +428,9 @@ if __name__ == '__main__':
     user_lat_test = 10.762622  # User's current latitude
     user_long_test = 106.660172 # User's current longitude
 
-    nearest = find_nearest_store(user_lat_test, user_long_test, stores_df_test)
+    index_test = build_store_index(stores_df_test)
+    nearest = find_nearest_stores(user_lat_test, user_long_test, stores_df_test, limit=1, index=index_test)
     if nearest:
-        print(f"Nearest store: {nearest['store_name']} at {nearest['address']} ({nearest['distance_km']:.2f} km away)")
+        print(f"Nearest store: {nearest[0]['store_name']} at {nearest[0]['address']} ({nearest[0]['distance_km']:.2f} km away)")
     else:
         print("No stores found.")
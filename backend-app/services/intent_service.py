@@ -0,0 +1,268 @@
+import os
+import re
+import unicodedata
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from services.metrics_service import INTENT_AGREEMENT, INTENT_CLASSIFIER
+from services.search_service import TOKEN_PATTERN, fold_text
+
+# product_info cells may list several products
+PHRASE_SEPARATORS = r"[,;/|\n]+"
+
+# Query words that never start or extend a product mention, even when a
+# product name happens to contain them
+STOPWORDS = frozenset(fold_text(word) for word in """
+    mua ban tim kiem can muon co khong o dau gan day nao cho toi minh ban em anh chi
+    shop cua hang cuahang nhe a ah voi va hay hoac la thi the nhung nay kia do di den
+    gi bao nhieu gia re tot nhat moi cai chiec mot vai xem hoi oi giup di dang
+    """.split())
+
+
+# Hard rules checked before anything else: a short message or one about the
+# user's own position asks for their location; a vague shopping wish has no intent
+LOCATION_KEYWORDS = ["vị trí", "tọa độ", "định vị", "ở đâu", "location", "gps"]
+LOCATION_SUBJECTS = ["tôi", "mình", "user", "hiện tại", "của tớ"]
+GENERIC_KEYWORDS = ["mua đồ", "sắm đồ", "mua sắm", "shopping", "mua gì đó"]
+LOCATION_INTENT = {"product": None, "generic_term": None, "category": None, "is_location_request": True}
+
+
+def hard_rule_intent(user_message: str) -> tuple[str, dict | None] | None:
+    """(rule, intent) when a hard rule decides the message's intent, else None."""
+    user_msg_lower = user_message.lower()
+    words = len(user_msg_lower.split())
+    if any(k in user_msg_lower for k in LOCATION_KEYWORDS):
+        if words <= 3:
+            return "regex_location_short", dict(LOCATION_INTENT)
+        if any(p in user_msg_lower for p in LOCATION_SUBJECTS):
+            return "regex_location_keyword", dict(LOCATION_INTENT)
+    if any(k in user_msg_lower for k in GENERIC_KEYWORDS) and words <= 6:
+        return "regex_generic", None
+    return None
+
+
+# A product named by a single word this short ("áo", "phở", "chào") is too
+# easily a word of small talk; its confidence stays below the default
+# INTENT_RULES_MIN_CONFIDENCE so the LLM decides
+SHORT_WORD_LENGTH = 4
+SHORT_RUN_CONFIDENCE = 0.5
+
+
+def get_classifier_config():
+    return {
+        "enabled": os.environ.get("INTENT_RULES", "1") != "0",
+        # Below this confidence the LLM decides
+        "min_confidence": float(os.environ.get("INTENT_RULES_MIN_CONFIDENCE", "0.8")),
+        # Share of confident answers also sent to the LLM to measure agreement
+        "audit_rate": float(os.environ.get("INTENT_RULES_AUDIT_RATE", "0")),
+    }
+
+
+def _surface(word: str) -> str:
+    """Lowercase word with its diacritics, in one Unicode form."""
+    return unicodedata.normalize("NFC", word.lower())
+
+
+def _tokens(text: str) -> list[tuple[str, int, int]]:
+    """(folded token, start, end) for each word of `text`."""
+    return [(fold_text(m.group()), m.start(), m.end()) for m in re.finditer(TOKEN_PATTERN, text)]
+
+
+class IntentClassifier:
+    """
+    Local intent extractor compiled from the store catalog.
+
+    Every product phrase in `product_info` becomes an alias for its
+    categories, and every category name matches itself. A message is
+    classified by its longest run of catalog words: the run is the product,
+    the catalog phrases containing it vote on the category, and the
+    confidence is how fully one phrase covers the run times the share of the
+    winning category. Words are looked up without diacritics, but a word the
+    user typed with diacritics only matches a catalog word spelled the same
+    way ("chào" is not "cháo", "đẹp" is not "dép"). Returns the same dict
+    shape as the LLM extraction.
+
+    It is compiled from `arrays`: the catalog's category names and distinct
+    (category, product_info) pairs with their store counts, which a saved
+    snapshot keeps so workers can skip the groupby over every store.
+    """
+
+    def __init__(self, stores_df: pd.DataFrame, arrays: dict[str, np.ndarray] | None = None):
+        if arrays is None:
+            arrays = self._build_arrays(stores_df)
+        self.arrays = arrays
+        self.phrases: list[tuple[str, ...]] = []
+        self.generic_terms: list[str] = []
+        self.phrase_categories: list[Counter] = []
+        self.token_phrases: dict[str, list[int]] = {}
+        # folded token -> the catalog's spellings of it (see _surface)
+        self.token_surfaces: dict[str, set[str]] = {}
+        self.categories: dict[tuple[str, ...], str] = {}
+
+        for category in arrays['categories'].tolist():
+            self.categories[tuple(token for token, _, _ in _tokens(category))] = category
+
+        phrase_ids: dict[tuple[str, ...], int] = {}
+        surfaces: list[list[str]] = []
+        pairs = zip(arrays['pair_categories'].tolist(), arrays['pair_products'].tolist(), arrays['pair_counts'].tolist())
+        for category, product_info, count in pairs:
+            for phrase in re.split(PHRASE_SEPARATORS, str(product_info)):
+                words = re.findall(TOKEN_PATTERN, phrase)
+                key = tuple(fold_text(word) for word in words)
+                if not key:
+                    continue
+                if key not in phrase_ids:
+                    phrase_ids[key] = len(self.phrases)
+                    self.phrases.append(key)
+                    self.phrase_categories.append(Counter())
+                    surfaces.append(words)
+                self.phrase_categories[phrase_ids[key]][category] += count
+                for token, word in zip(key, words):
+                    self.token_surfaces.setdefault(token, set()).add(_surface(word))
+
+        for phrase_id, key in enumerate(self.phrases):
+            for token in set(key):
+                self.token_phrases.setdefault(token, []).append(phrase_id)
+        self.generic_terms = [self._generic_term(key, words) for key, words in zip(self.phrases, surfaces)]
+
+    @staticmethod
+    def _build_arrays(stores_df: pd.DataFrame) -> dict[str, np.ndarray]:
+        if stores_df.empty:
+            categories, pairs = [], pd.Series(dtype="int64")
+        else:
+            categories = [str(category) for category in stores_df['category'].dropna().unique()]
+            pairs = stores_df.groupby(['category', 'product_info'], observed=True).size()
+        return {
+            'categories': np.array(categories, dtype=str),
+            'pair_categories': np.array([str(category) for category, _ in pairs.index], dtype=str),
+            'pair_products': np.array([str(product_info) for _, product_info in pairs.index], dtype=str),
+            'pair_counts': pairs.to_numpy(dtype=np.int64),
+        }
+
+    def _generic_term(self, key: tuple[str, ...], words: list[str]) -> str:
+        # Longest leading word sequence shared with another phrase ("Giày" for
+        # "Giày chạy bộ" and "Giày da"), else the first word
+        shared = 1
+        for length in range(len(key) - 1, 1, -1):
+            prefix = key[:length]
+            if any(other != key and other[:length] == prefix for other in self._phrases_with(key[0])):
+                shared = length
+                break
+        return " ".join(words[:shared])
+
+    def _phrases_with(self, token: str):
+        return (self.phrases[i] for i in self.token_phrases.get(token, ()))
+
+    def _mentioned_category(self, folded: list[str]) -> str | None:
+        for key, category in self.categories.items():
+            n = len(key)
+            if n and any(tuple(folded[i:i + n]) == key for i in range(len(folded) - n + 1)):
+                return category
+        return None
+
+    def _is_catalog_word(self, message: str, token: tuple[str, int, int]) -> bool:
+        folded, start, end = token
+        if folded in STOPWORDS or folded not in self.token_phrases:
+            return False
+        # Typed without diacritics, any spelling matches; with them, only the same one
+        word = _surface(message[start:end])
+        return word == folded or word in self.token_surfaces[folded]
+
+    def _product_run(self, message: str, tokens: list[tuple[str, int, int]]) -> tuple[int, int] | None:
+        """Longest run of catalog words (not all numbers) as a [start, end) token range."""
+        best = None
+        i = 0
+        while i < len(tokens):
+            if not self._is_catalog_word(message, tokens[i]):
+                i += 1
+                continue
+            j = i
+            while j < len(tokens) and self._is_catalog_word(message, tokens[j]):
+                j += 1
+            if not all(token.isdigit() for token, _, _ in tokens[i:j]) and (best is None or j - i > best[1] - best[0]):
+                best = (i, j)
+            i = j
+        return best
+
+    def classify(self, message: str) -> tuple[dict | None, float]:
+        """(intent, confidence); intent is None when nothing in the catalog was mentioned."""
+        tokens = _tokens(message)
+        folded = [token for token, _, _ in tokens]
+        mentioned = self._mentioned_category(folded)
+
+        run = self._product_run(message, tokens)
+        if run is None:
+            if mentioned is None:
+                return None, 0.0
+            return {"product": None, "generic_term": None, "category": mentioned, "is_location_request": False}, 0.9
+
+        run_tokens = set(folded[run[0]:run[1]])
+        coverage: dict[int, int] = {}
+        for token in run_tokens:
+            for phrase_id in self.token_phrases[token]:
+                coverage[phrase_id] = coverage.get(phrase_id, 0) + 1
+        best_cover = max(coverage.values())
+        top = [phrase_id for phrase_id, covered in coverage.items() if covered == best_cover]
+
+        votes = Counter()
+        for phrase_id in top:
+            votes.update(self.phrase_categories[phrase_id])
+        category, weight = votes.most_common(1)[0]
+        confidence = best_cover / len(run_tokens) * weight / sum(votes.values())
+        if run[1] - run[0] == 1 and len(folded[run[0]]) <= SHORT_WORD_LENGTH:
+            confidence = min(confidence, SHORT_RUN_CONFIDENCE)
+        if mentioned is not None and mentioned != category:
+            # The user named a different category than the product suggests
+            category = mentioned
+            confidence *= 0.5
+
+        generic_phrase = max(top, key=lambda phrase_id: sum(self.phrase_categories[phrase_id].values()))
+        intent = {
+            "product": message[tokens[run[0]][1]:tokens[run[1] - 1][2]],
+            "generic_term": self.generic_terms[generic_phrase],
+            "category": category,
+            "is_location_request": False,
+        }
+        return intent, confidence
+
+
+def build_intent_classifier(stores_df: pd.DataFrame, arrays: dict[str, np.ndarray] | None = None) -> IntentClassifier:
+    return IntentClassifier(stores_df, arrays=arrays)
+
+
+def confidence_bucket(confidence: float) -> str:
+    """Confidence rounded down to a tenth, used as a metrics label."""
+    return f"{min(int(confidence * 10), 10) / 10:.1f}"
+
+
+def compare_intents(local: dict | None, llm: dict | None) -> str:
+    """'agree' when category and product match after folding, 'category_only' or 'disagree' otherwise."""
+    def norm(intent, field):
+        value = (intent or {}).get(field)
+        return " ".join(token for token, _, _ in _tokens(value)) if value else None
+
+    if norm(local, "category") != norm(llm, "category"):
+        return "disagree"
+    return "agree" if norm(local, "product") == norm(llm, "product") else "category_only"
+
+
+def record_classification(outcome: str):
+    """Count one classifier outcome: confident, low_confidence or no_match."""
+    INTENT_CLASSIFIER.inc(outcome=outcome)
+
+
+def record_agreement(local: dict | None, confidence: float, llm: dict | None):
+    INTENT_AGREEMENT.inc(confidence=confidence_bucket(confidence), result=compare_intents(local, llm))
+
+
+if __name__ == '__main__':
+    # Example usage
+    catalog = pd.DataFrame({
+        'category': ['Công nghệ', 'Công nghệ', 'Thời trang', 'Thời trang', 'Ẩm thực'],
+        'product_info': ['iPhone 16 Pro, iPhone 15', 'Laptop Dell', 'Giày chạy bộ', 'Giày da', 'Phở bò'],
+    })
+    classifier = build_intent_classifier(catalog)
+    for text in ["mua iPhone 16", "tìm giày chạy bộ gần đây", "quán phở ở đâu", "đồ công nghệ", "xin chào", "giay da"]:
+        print(text, "->", classifier.classify(text))
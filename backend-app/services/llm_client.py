@@ -0,0 +1,246 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+
+import httpx
+
+from services.metrics_service import LLM_CALL_SECONDS, LLM_RETRIES, LLM_TOKENS
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def get_client_config():
+    """Concurrency / timeout / retry settings shared by every LLM backend."""
+    return {
+        "max_concurrency": int(os.environ.get("AI_MAX_CONCURRENCY", "8")),
+        "timeout": float(os.environ.get("AI_TIMEOUT", "60")),
+        "max_retries": int(os.environ.get("AI_MAX_RETRIES", "2")),
+        "backoff_base": float(os.environ.get("AI_BACKOFF_BASE", "0.5")),
+    }
+
+
+class LLMBackend:
+    """
+    Base class for an async LLM backend.
+
+    Subclasses implement `_generate` and `_stream`; this class bounds
+    concurrency per backend and wraps each call in a timeout with
+    exponential-backoff retries. Call latency, retries and the token counts
+    subclasses pass to `record_usage` are exported as metrics.
+    """
+
+    name = "base"
+
+    def __init__(self, model_name: str, max_concurrency: int = 8, timeout: float = 60.0, max_retries: int = 2, backoff_base: float = 0.5, name: str | None = None):
+        # Metric label; set when several backends of one kind are routed together
+        if name:
+            self.name = name
+        self.model_name = model_name
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def is_retryable(self, error: Exception) -> bool:
+        return isinstance(error, asyncio.TimeoutError)
+
+    async def _generate(self, prompt: str, json_mode: bool = False) -> str:
+        raise NotImplementedError
+
+    def record_usage(self, prompt_tokens: int | None, completion_tokens: int | None):
+        """Count the tokens a backend reported for one call."""
+        if prompt_tokens:
+            LLM_TOKENS.inc(prompt_tokens, backend=self.name, type="prompt")
+        if completion_tokens:
+            LLM_TOKENS.inc(completion_tokens, backend=self.name, type="completion")
+
+    async def generate(self, prompt: str, json_mode: bool = False) -> str:
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            text = await self._generate_with_retries(prompt, json_mode)
+            outcome = "ok"
+            return text
+        except asyncio.CancelledError:
+            # e.g. the slower half of a hedged request
+            outcome = "cancelled"
+            raise
+        finally:
+            LLM_CALL_SECONDS.observe(time.perf_counter() - start, backend=self.name, kind="generate", outcome=outcome)
+
+    async def _generate_with_retries(self, prompt: str, json_mode: bool) -> str:
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    return await asyncio.wait_for(self._generate(prompt, json_mode), timeout=self.timeout)
+            except Exception as e:
+                if attempt >= self.max_retries or not self.is_retryable(e):
+                    raise
+                delay = self._backoff_delay(attempt)
+                logger.warning("%s call failed (%r), retrying in %.2fs", self.name, e, delay)
+                LLM_RETRIES.inc(backend=self.name)
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def _stream(self, prompt: str):
+        raise NotImplementedError
+        yield
+
+    def _backoff_delay(self, attempt: int) -> float:
+        return self.backoff_base * (2 ** attempt) * (0.5 + random.random() / 2)
+
+    async def stream(self, prompt: str):
+        """
+        Yield reply text chunks as the backend produces them.
+
+        The timeout applies to the wait for each chunk. A failed attempt is
+        only retried if nothing has been yielded yet.
+        """
+        start = time.perf_counter()
+        outcome = "error"
+        attempt = 0
+        try:
+            while True:
+                started = False
+                try:
+                    async with self._semaphore:
+                        chunks = self._stream(prompt).__aiter__()
+                        while True:
+                            try:
+                                chunk = await asyncio.wait_for(chunks.__anext__(), timeout=self.timeout)
+                            except StopAsyncIteration:
+                                outcome = "ok"
+                                return
+                            if chunk:
+                                started = True
+                                yield chunk
+                except Exception as e:
+                    if started or attempt >= self.max_retries or not self.is_retryable(e):
+                        raise
+                    delay = self._backoff_delay(attempt)
+                    logger.warning("%s stream failed (%r), retrying in %.2fs", self.name, e, delay)
+                    LLM_RETRIES.inc(backend=self.name)
+                    attempt += 1
+                    await asyncio.sleep(delay)
+        except (asyncio.CancelledError, GeneratorExit):
+            # Abandoned by the consumer before the end
+            outcome = "cancelled"
+            raise
+        finally:
+            LLM_CALL_SECONDS.observe(time.perf_counter() - start, backend=self.name, kind="stream", outcome=outcome)
+
+    async def aclose(self):
+        pass
+
+
+class OllamaBackend(LLMBackend):
+    """Ollama `/api/generate` endpoint over a pooled keep-alive HTTP client."""
+
+    name = "ollama"
+
+    def __init__(self, base_url: str, model_name: str, **kwargs):
+        super().__init__(model_name, **kwargs)
+        self.url = self.resolve_url(base_url)
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(self.timeout),
+            limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency),
+        )
+
+    @staticmethod
+    def resolve_url(url: str) -> str:
+        # Simple heuristic for Ollama URL adjustment
+        if "ollama" in str(url).lower() or "localhost" in str(url).lower() or "127.0.0.1" in str(url):
+            if not url.endswith("/api/generate") and not url.endswith("/v1/chat/completions"):
+                url = f"{url.rstrip('/')}/api/generate"
+        return url
+
+    def is_retryable(self, error: Exception) -> bool:
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code in RETRYABLE_STATUS
+        return isinstance(error, httpx.TransportError) or super().is_retryable(error)
+
+    async def _generate(self, prompt: str, json_mode: bool = False) -> str:
+        payload = {
+            "model": self.model_name,
+            "prompt": prompt,
+            "stream": False,
+            "format": "json" if json_mode else None
+        }
+        response = await self._client.post(self.url, json=payload)
+        response.raise_for_status()
+        data = response.json()
+        self.record_usage(data.get("prompt_eval_count"), data.get("eval_count"))
+        return data.get("response", "")
+
+    async def _stream(self, prompt: str):
+        payload = {"model": self.model_name, "prompt": prompt, "stream": True}
+        async with self._client.stream("POST", self.url, json=payload) as response:
+            response.raise_for_status()
+            # Ollama streams one JSON object per line
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                yield data.get("response", "")
+                if data.get("done"):
+                    # The final line carries the token counts
+                    self.record_usage(data.get("prompt_eval_count"), data.get("eval_count"))
+                    break
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini through the SDK's native async API."""
+
+    name = "gemini"
+
+    def __init__(self, model, model_name: str, **kwargs):
+        super().__init__(model_name, **kwargs)
+        self.model = model
+
+    def is_retryable(self, error: Exception) -> bool:
+        from google.api_core import exceptions as google_exceptions
+        transient = (
+            google_exceptions.ResourceExhausted,
+            google_exceptions.ServiceUnavailable,
+            google_exceptions.DeadlineExceeded,
+            google_exceptions.InternalServerError,
+        )
+        return isinstance(error, transient) or super().is_retryable(error)
+
+    async def _generate(self, prompt: str, json_mode: bool = False) -> str:
+        if json_mode:
+            import google.generativeai as genai
+            response = await self.model.generate_content_async(
+                prompt,
+                generation_config=genai.types.GenerationConfig(
+                    temperature=0,
+                    response_mime_type="application/json"
+                )
+            )
+            self._record_response_usage(response)
+            return response.text.strip()
+        response = await self.model.generate_content_async(prompt)
+        self._record_response_usage(response)
+        return response.text
+
+    def _record_response_usage(self, response):
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            self.record_usage(getattr(usage, "prompt_token_count", None), getattr(usage, "candidates_token_count", None))
+
+    async def _stream(self, prompt: str):
+        response = await self.model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            yield chunk.text
+        self._record_response_usage(response)
@@ -0,0 +1,299 @@
+import asyncio
+import collections
+import logging
+import os
+import random
+import time
+
+from services.llm_client import LLMBackend
+from services.metrics_service import LLM_CIRCUIT, LLM_HEDGES
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(RuntimeError):
+    """No routed backend currently accepts calls."""
+
+
+def get_router_config():
+    return {
+        # Hedge once the first backend is slower than this percentile of its recent calls; 0 disables hedging
+        "hedge_percentile": float(os.environ.get("LLM_HEDGE_PERCENTILE", "95")),
+        # Calls a backend needs in its window before its own percentile is used ...
+        "hedge_min_samples": int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", "20")),
+        # ... and the hedge delay until then (0 = no hedging until then)
+        "hedge_delay_ms": float(os.environ.get("LLM_HEDGE_DELAY_MS", "2000")),
+        # Recent successful calls kept per backend for latency stats
+        "window": int(os.environ.get("LLM_ROUTER_WINDOW", "200")),
+        # Share of calls sent first to a random other backend, so slower ones keep fresh stats
+        "explore_rate": float(os.environ.get("LLM_ROUTER_EXPLORE", "0.05")),
+        # Consecutive failures that open a backend's circuit (0 = never), and seconds until it is tried again
+        "failure_threshold": int(os.environ.get("LLM_CIRCUIT_FAILURES", "5")),
+        "reset_timeout": float(os.environ.get("LLM_CIRCUIT_RESET", "30")),
+    }
+
+
+class LatencyWindow:
+    """Durations (seconds) of a backend's most recent successful calls."""
+
+    def __init__(self, size: int = 200):
+        self.samples = collections.deque(maxlen=max(1, size))
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> float | None:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, round(q / 100 * (len(ordered) - 1)))]
+
+
+class CircuitBreaker:
+    """
+    Stops sending calls to a backend that keeps failing.
+
+    closed     calls go through; failure_threshold consecutive failures open it
+    open       calls are refused for reset_timeout seconds
+    half_open  then a single trial call goes through: success closes the
+               circuit, failure opens it again
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_running = False
+
+    def available(self) -> bool:
+        """Whether a call would be let through now (without taking the half-open trial)."""
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            return time.monotonic() - self.opened_at >= self.reset_timeout
+        return not self.trial_running
+
+    def allow(self) -> bool:
+        """Claim a call; in the half-open state only one is let through at a time."""
+        if not self.available():
+            return False
+        if self.state == "open":
+            self._transition("half_open")
+        if self.state == "half_open":
+            self.trial_running = True
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.trial_running = False
+        if self.state != "closed":
+            self._transition("closed")
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_running = False
+        if self.state == "half_open" or (self.state == "closed" and 0 < self.failure_threshold <= self.failures):
+            self.opened_at = time.monotonic()
+            self._transition("open")
+
+    def record_cancel(self):
+        # A call cut short says nothing about the backend's health
+        self.trial_running = False
+
+    def _transition(self, state: str):
+        logger.log(logging.WARNING if state == "open" else logging.INFO, "LLM backend %s circuit %s -> %s", self.name, self.state, state)
+        self.state = state
+        LLM_CIRCUIT.inc(backend=self.name, state=state)
+
+
+class LLMRouter(LLMBackend):
+    """
+    Several LLM backends behind the LLMBackend interface.
+
+    Each call goes to the available backend with the lowest recent median
+    latency; backends with fewer than hedge_min_samples calls come first, in
+    configured order, and explore_rate of the calls try a random other
+    backend first so a backend that recovers is noticed. When it has
+    not answered (streams: sent a first chunk) by its hedge_percentile
+    latency, the call is also sent to the next backend; the first answer
+    wins and the other call is cancelled. A failed call moves on to the next
+    backend at once. Every backend has a circuit breaker, so one that keeps
+    failing is skipped until its reset timeout has passed. Timeouts, retries
+    and concurrency limits stay with the backends themselves.
+    """
+
+    name = "router"
+
+    def __init__(self, backends: list[LLMBackend], hedge_percentile: float = 95.0, hedge_min_samples: int = 20, hedge_delay_ms: float = 2000.0,
+                 window: int = 200, explore_rate: float = 0.05, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        super().__init__(" | ".join(backend.model_name for backend in backends))
+        self.backends = backends
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_delay_ms = hedge_delay_ms
+        self.explore_rate = explore_rate
+        # backend name -> call kind ("generate" or "stream") -> recent latencies
+        self.latency = {backend.name: {"generate": LatencyWindow(window), "stream": LatencyWindow(window)} for backend in backends}
+        self.breakers = {backend.name: CircuitBreaker(backend.name, failure_threshold, reset_timeout) for backend in backends}
+
+    def ranked(self, kind: str) -> list[LLMBackend]:
+        """Backends accepting calls, in the order they are tried."""
+        available = [(position, backend) for position, backend in enumerate(self.backends) if self.breakers[backend.name].available()]
+
+        def speed(item):
+            # Backends still warming up first, in configured order; then by recent median
+            position, backend = item
+            window = self.latency[backend.name][kind]
+            if len(window) < self.hedge_min_samples:
+                return 0, position
+            return 1, window.percentile(50)
+
+        ranked = [backend for _, backend in sorted(available, key=speed)]
+        if len(ranked) > 1 and random.random() < self.explore_rate:
+            ranked.insert(0, ranked.pop(random.randrange(1, len(ranked))))
+        return ranked
+
+    def hedge_delay(self, backend: LLMBackend, kind: str) -> float | None:
+        """Seconds to wait for a backend before hedging; None never hedges."""
+        if self.hedge_percentile <= 0:
+            return None
+        window = self.latency[backend.name][kind]
+        if len(window) >= self.hedge_min_samples:
+            return window.percentile(self.hedge_percentile)
+        return self.hedge_delay_ms / 1000 if self.hedge_delay_ms > 0 else None
+
+    def stats(self) -> dict:
+        """Circuit state and recent latency percentiles (ms) per backend."""
+        stats = {}
+        for backend in self.backends:
+            stats[backend.name] = {"state": self.breakers[backend.name].state}
+            for kind, window in self.latency[backend.name].items():
+                stats[backend.name][kind] = {
+                    "calls": len(window),
+                    **{f"p{q}_ms": None if window.percentile(q) is None else round(window.percentile(q) * 1000, 1) for q in (50, 95, 99)},
+                }
+        return stats
+
+    async def _race(self, kind: str, call, discard=None):
+        """
+        (backend, result) of the first backend whose call(backend) succeeds,
+        hedging and falling back as described above. `discard` releases the
+        result of a call that finished but lost.
+        """
+        candidates = self.ranked(kind)
+        pending: dict[asyncio.Task, tuple[LLMBackend, float]] = {}
+        hedge: LLMBackend | None = None
+        last_error = None
+
+        def launch() -> LLMBackend | None:
+            while candidates:
+                backend = candidates.pop(0)
+                if self.breakers[backend.name].allow():
+                    pending[asyncio.ensure_future(call(backend))] = (backend, time.perf_counter())
+                    return backend
+            return None
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if hedge is None and candidates and len(pending) == 1:
+                    backend, started = next(iter(pending.values()))
+                    delay = self.hedge_delay(backend, kind)
+                    if delay is not None:
+                        timeout = max(0.0, started + delay - time.perf_counter())
+
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedge = launch()
+                    if hedge is not None:
+                        logger.debug("%s slower than its p%.0f, hedging on %s", next(iter(pending.values()))[0].name, self.hedge_percentile, hedge.name)
+                    continue
+
+                for task in done:
+                    backend, started = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        self.breakers[backend.name].record_failure()
+                        last_error = e
+                        logger.warning("LLM backend %s failed (%r), %s", backend.name, e, "falling back" if pending or candidates else "no backend left")
+                        continue
+                    self.breakers[backend.name].record_success()
+                    self.latency[backend.name][kind].add(time.perf_counter() - started)
+                    if hedge is not None:
+                        LLM_HEDGES.inc(backend=hedge.name, result="won" if backend is hedge else "lost")
+                    return backend, result
+
+                # Every running call failed: the next backend takes over right away
+                if not pending:
+                    launch()
+        finally:
+            for task, (backend, _) in pending.items():
+                self.breakers[backend.name].record_cancel()
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled() and task.exception() is None and discard:
+                    await discard(task.result())
+
+        raise last_error or CircuitOpenError("Every LLM backend's circuit is open.")
+
+    async def generate(self, prompt: str, json_mode: bool = False) -> str:
+        _, text = await self._race("generate", lambda backend: backend.generate(prompt, json_mode))
+        return text
+
+    async def stream(self, prompt: str):
+        """Streams race on their first chunk; once one has started, failures are not retried elsewhere."""
+
+        async def first_chunk(backend: LLMBackend):
+            chunks = backend.stream(prompt).__aiter__()
+            async for chunk in chunks:
+                if chunk:
+                    return chunks, chunk
+            return chunks, ""
+
+        async def discard(result):
+            await result[0].aclose()
+
+        backend, (chunks, first) = await self._race("stream", first_chunk, discard)
+        try:
+            if first:
+                yield first
+            async for chunk in chunks:
+                yield chunk
+        except Exception:
+            self.breakers[backend.name].record_failure()
+            raise
+        finally:
+            await chunks.aclose()
+
+    async def aclose(self):
+        for backend in self.backends:
+            await backend.aclose()
+
+
+if __name__ == '__main__':
+    # Example usage: a fast backend with a slow tail and a steady one
+    class FakeBackend(LLMBackend):
+        def __init__(self, name, latency, slow_rate=0.0):
+            super().__init__(name, name=name)
+            self.latency = latency
+            self.slow_rate = slow_rate
+
+        async def _generate(self, prompt, json_mode=False):
+            await asyncio.sleep(self.latency * (20 if random.random() < self.slow_rate else 1))
+            return f"{self.name}: {prompt}"
+
+    async def main():
+        router = LLMRouter([FakeBackend("fast", 0.01, slow_rate=0.03), FakeBackend("steady", 0.03)], hedge_min_samples=10)
+        for i in range(200):
+            await router.generate(f"prompt {i}")
+        print(router.stats())
+
+    asyncio.run(main())
@@ -0,0 +1,50 @@
+import os
+
+import numpy as np
+
+from services.cache_service import cache_from_env, make_key
+from services.geo_service import StoreIndex, geohash_cell
+
+# Ranked-candidate neighborhoods per (geohash cell, intent) (LOCATION_CACHE_SIZE / _TTL / _PATH)
+location_cache = cache_from_env("location", "LOCATION_CACHE", default_size=4096, default_ttl=600)
+
+
+def get_location_cache_config():
+    return {
+        # Geohash length of a cache cell: 6 is about 1.2 x 0.6 km; 0 disables the cache
+        "precision": int(os.environ.get("LOCATION_CACHE_PRECISION", "6")),
+    }
+
+
+def location_cache_key(lat: float, lon: float, search_intent: dict, k: int, data_version: str | None) -> str | None:
+    """Key of the cell containing (lat, lon) for this intent, or None when the cache is off."""
+    precision = get_location_cache_config()["precision"]
+    if precision <= 0:
+        return None
+    code, _, _, _ = geohash_cell(lat, lon, precision)
+    intent = {key: str(value).strip().lower() if isinstance(value, str) else value for key, value in search_intent.items()}
+    return make_key(code, intent, k, data_version)
+
+
+def neighborhood(index: StoreIndex, lat: float, lon: float, k: int, positions: np.ndarray | None = None) -> np.ndarray:
+    """
+    Candidate row positions that contain the k nearest stores for every point
+    in the geohash cell of (lat, lon).
+
+    With c the cell center, h its half-diagonal and D the k-th nearest
+    distance from c, a store among the k nearest to any point in the cell is
+    within D + 2h of c (triangle inequality), so re-ranking just these stores
+    is exact anywhere in the cell, for any max_distance_km as well.
+    """
+    precision = get_location_cache_config()["precision"]
+    _, center_lat, center_lon, half_diagonal = geohash_cell(lat, lon, precision)
+    _, distances = index.query(center_lat, center_lon, k, positions)
+    if len(distances) < k:
+        # Fewer candidates than k: all of them
+        return np.arange(index.size) if positions is None else np.asarray(positions, dtype=np.int64)
+    return index.within(center_lat, center_lon, float(distances[-1]) + 2 * half_diagonal, positions)
+
+
+def invalidate_location_cache():
+    """Drop every cached neighborhood; row positions change with the store data."""
+    location_cache.clear()
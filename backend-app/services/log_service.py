@@ -0,0 +1,19 @@
+import logging
+import os
+
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(name)s] %(message)s"
+
+
+def configure_logging(level: str | None = None):
+    """
+    Configure the root logger from LOG_LEVEL (default INFO).
+
+    Modules log through `logging.getLogger(__name__)` with %-style arguments,
+    so a disabled level costs one level check and never formats the message.
+    """
+    level = (level or os.environ.get("LOG_LEVEL") or "INFO").upper()
+    logging.basicConfig(level=level, format=LOG_FORMAT)
+    logging.getLogger().setLevel(level)
+    # One INFO line per HTTP call (every LLM request, every sheet poll) is noise
+    if logging.getLogger().getEffectiveLevel() > logging.DEBUG:
+        logging.getLogger("httpx").setLevel(logging.WARNING)
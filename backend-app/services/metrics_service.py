@@ -0,0 +1,168 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from in-memory lookups up to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Every metric created below, in creation order, rendered by /metrics
+REGISTRY: list = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(label_names: tuple[str, ...], values: tuple, le: str | None = None) -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(label_names, values)]
+    if le is not None:
+        parts.append(f'le="{le}"')
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    """Monotonic counter with optional labels, in the Prometheus text format."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, label_names: tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels.get(name, "") for name in self.label_names), 0.0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, key)} {value:g}" for key, value in items]
+
+
+class Histogram:
+    """Bucketed distribution (count, sum, cumulative buckets) with optional labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, label_names: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted((key, [list(series[0]), series[1], series[2]]) for key, series in self._series.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {total:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+
+def render_metrics() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_SECONDS = Histogram("chat_request_seconds", "End-to-end API request latency (to response headers).", ("endpoint", "method", "status"))
+STAGE_SECONDS = Histogram("chat_stage_seconds", "Latency of each /chat pipeline stage.", ("stage",))
+LLM_CALL_SECONDS = Histogram("llm_call_seconds", "LLM backend call latency, including retries.", ("backend", "kind", "outcome"))
+LLM_RETRIES = Counter("llm_retries_total", "LLM calls retried after a transient error.", ("backend",))
+LLM_HEDGES = Counter("llm_hedged_requests_total", "Second requests sent to another backend when the first was slow, by whether they answered first.", ("backend", "result"))
+LLM_CIRCUIT = Counter("llm_circuit_transitions_total", "LLM backend circuit breaker state changes.", ("backend", "state"))
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens reported by the LLM backend.", ("backend", "type"))
+CACHE_LOOKUPS = Counter("cache_lookups_total", "Cache lookups by result.", ("cache", "result"))
+INTENT_SOURCE = Counter("intent_resolutions_total", "How search intents were resolved (regex fast path, rules, cache, LLM or a session follow-up).", ("source",))
+BATCH_SIZE = Histogram("batch_size", "Items per micro-batched LLM call.", ("batcher",), buckets=(1, 2, 4, 8, 16, 32, 64))
+INTENT_CLASSIFIER = Counter("intent_classifier_total", "Local intent classifier outcomes (confident share = coverage).", ("outcome",))
+INTENT_AGREEMENT = Counter("intent_classifier_agreement_total", "Local classifier answers compared with the LLM, by confidence.", ("confidence", "result"))
+PROMPT_TOKENS = Histogram("llm_prompt_tokens", "Estimated tokens per LLM prompt, counted before sending.", ("kind",), buckets=(64, 128, 256, 512, 1024, 2048, 4096, 8192))
+PROMPT_STORES_DROPPED = Counter("prompt_stores_dropped_total", "Stores left out of reply prompts by the context token budget.")
+
+
+class RequestTrace:
+    """Per-request list of (stage, seconds) spans."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: list[tuple[str, float]] = []
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def merged(self) -> dict[str, float]:
+        """Slowest span per stage; concurrent sub-requests (/chat/batch) repeat stages."""
+        stages: dict[str, float] = {}
+        for stage, seconds in self.spans:
+            stages[stage] = max(seconds, stages.get(stage, 0.0))
+        return stages
+
+    def server_timing(self) -> str:
+        """Spans as a Server-Timing header value (durations in ms)."""
+        return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.merged().items())
+
+    def summary(self) -> str:
+        return " ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in self.merged().items())
+
+
+_current_trace: contextvars.ContextVar[RequestTrace | None] = contextvars.ContextVar("request_trace", default=None)
+
+
+def start_trace() -> RequestTrace:
+    trace = RequestTrace()
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace() -> RequestTrace | None:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(stage: str):
+    """Time a pipeline stage into STAGE_SECONDS and the current request's trace."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append((stage, seconds))
@@ -0,0 +1,237 @@
+import itertools
+import logging
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from services.metrics_service import PROMPT_STORES_DROPPED, PROMPT_TOKENS
+
+logger = logging.getLogger(__name__)
+
+# Word runs and single punctuation marks: close to how LLM tokenizers split
+# Vietnamese text, and cheap enough to run on every prompt
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+ELLIPSIS = "…"
+
+SYSTEM_INSTRUCTION = "Bạn là trợ lý ảo bán hàng. Nhiệm vụ của bạn là trả lời câu hỏi của khách hàng một cách thân thiện và mời họ đến cửa hàng gần nhất nếu có thông tin."
+
+STORE_TEMPLATE = (
+    "Cửa hàng {number}:\n"
+    "- Tên: {name}\n"
+    "- Khoảng cách: {distance:.2f} km\n"
+    "- Sản phẩm: {product}\n"
+    "- Khuyến mãi: {promotion}\n"
+    "- Địa chỉ: {address}\n\n"
+)
+
+CONTEXT_TEMPLATE = SYSTEM_INSTRUCTION + "\n\nContext: Thông tin các cửa hàng gần nhất:\n{stores}\n\n{history}User Query: {message}.\n\n{instruction}"
+QUERY_TEMPLATE = SYSTEM_INSTRUCTION + "\n\n{history}User Query: {message}.\n\nChỉ dẫn:\n{instruction}"
+
+# Earlier turns of the same session, oldest first
+HISTORY_TEMPLATE = "Lịch sử hội thoại:\n{turns}\n\n"
+TURN_TEMPLATE = "- Khách: {message}\n- Trợ lý: {reply}"
+
+# Instructions by match type once stores were found (CONTEXT_TEMPLATE) ...
+STORE_INSTRUCTIONS = {
+    "product": "Chỉ dẫn:\n1. Người dùng tìm đúng sản phẩm có trong Context. Hãy báo tin vui và mời họ đến.\n2. Tóm tắt khuyến mãi hấp dẫn nhất.",
+    # The exact product is missing, stores of its category stand in
+    "category_product": "Chỉ dẫn:\n1. Người dùng tìm '{product_name}' nhưng hiện tại KHÔNG có cửa hàng nào gần đây bán chính xác sản phẩm đó.\n2. Hệ thống tìm thấy các cửa hàng thuộc nhóm '{category_name}' để thay thế.\n3. Hãy nói rõ: 'Tiếc là mình không thấy cửa hàng nào có sẵn {product_name} ở gần bạn. Tuy nhiên, mình tìm thấy các cửa hàng {category_name} này có thể phù hợp...'.\n4. Giới thiệu ngắn gọn.",
+    "category": "Chỉ dẫn:\n1. Người dùng đang tìm kiếm chung về '{category_name}' (hoặc các sản phẩm thuộc nhóm này).\n2. Hãy nói: 'Mình tìm thấy các cửa hàng {category_name} này phù hợp với nhu cầu của bạn...'.\n3. Giới thiệu ngắn gọn.",
+}
+
+# ... and otherwise (QUERY_TEMPLATE)
+QUERY_INSTRUCTIONS = {
+    "location": "Người dùng đang hỏi về vị trí. Hãy trả lời ngắn gọn: '...' (Frontend sẽ tự động xử lý phần còn lại).",
+    "not_found": "Người dùng muốn tìm '{product_name}' nhưng hiện tại không tìm thấy cửa hàng nào phù hợp trong hệ thống. Hãy xin lỗi khách hàng một cách khéo léo và hỏi họ muốn tìm sản phẩm khác không.",
+    "chitchat": "Đây là hội thoại xã giao hoặc câu hỏi chưa rõ ý định.\n1. Tự xưng là 'Trợ lý ảo'.\n2. Nếu người dùng nói muốn mua đồ chung chung, hãy hỏi thẳng: 'Bạn đang tìm kiếm sản phẩm nào cụ thể ạ? (Ví dụ: Điện thoại, Quần áo, Laptop...)' (KHÔNG cần chào 'Chào bạn' ở đầu).\n3. CHỈ chào hỏi ('Chào bạn!...') NẾU người dùng có lời chào trước (như 'hi', 'xin chào').\n4. TUYỆT ĐỐI KHÔNG dùng các từ trong ngoặc vuông như '[...]'.",
+}
+
+# Store text cut to the field budget when a snapshot is built
+FRAGMENT_FIELDS = ("product_info", "promotion")
+
+
+def get_prompt_config():
+    return {
+        # Token budget for each store's product_info and promotion text
+        "field_tokens": int(os.environ.get("PROMPT_FIELD_TOKENS", "40")),
+        # Token budget for all store blocks together; farther stores are left out
+        "context_tokens": int(os.environ.get("PROMPT_CONTEXT_TOKENS", "400")),
+        # Reply prompts above this size are logged as warnings
+        "max_tokens": int(os.environ.get("PROMPT_MAX_TOKENS", "1024")),
+    }
+
+
+def count_tokens(text: str) -> int:
+    """Estimated LLM tokens in text (words and punctuation marks)."""
+    return len(TOKEN_PATTERN.findall(text))
+
+
+def truncate_tokens(text: str, budget: int) -> str:
+    """
+    Text cut to `budget` tokens plus an ellipsis. Whole list items
+    ("iPhone 16, iPhone 15, ...") are dropped rather than one cut in half
+    when a separator falls in the second half of the kept text.
+    """
+    # A token is at least one character
+    if budget <= 0 or len(text) <= budget:
+        return text
+    tokens = list(itertools.islice(TOKEN_PATTERN.finditer(text), budget + 1))
+    if len(tokens) <= budget:
+        return text
+    kept = text[:tokens[budget - 1].end()]
+    separator = max(kept.rfind(","), kept.rfind(";"))
+    if separator > len(kept) // 2:
+        kept = kept[:separator]
+    return kept.rstrip(" ,;.-") + ELLIPSIS
+
+
+class StoreFragments:
+    """
+    Prompt text of every store in a snapshot, compiled when the data loads.
+
+    product_info and promotion are cut to the field token budget here rather
+    than on every request. Only texts longer than the budget need cutting and
+    long descriptions repeat across stores, so each distinct long text is cut
+    once and its rows keep a code into the results. `arrays` from a saved
+    snapshot are reused when they were cut to the same budget.
+    """
+
+    def __init__(self, stores_df: pd.DataFrame, field_tokens: int | None = None, arrays: dict[str, np.ndarray] | None = None):
+        self.field_tokens = get_prompt_config()["field_tokens"] if field_tokens is None else field_tokens
+        self.size = len(stores_df)
+        # column -> (per-row code into the cut texts, -1 where the text fits as is; cut texts)
+        self.fields: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        if arrays is not None and "field_tokens" in arrays and int(arrays["field_tokens"][0]) == self.field_tokens:
+            for column in FRAGMENT_FIELDS:
+                if f"{column}_codes" in arrays and len(arrays[f"{column}_codes"]) == self.size:
+                    self.fields[column] = (arrays[f"{column}_codes"], arrays[f"{column}_texts"])
+            return
+        if stores_df.empty:
+            return
+
+        for column in FRAGMENT_FIELDS:
+            if column not in stores_df.columns:
+                continue
+            values = stores_df[column].fillna("").astype(str)
+            # Texts no longer than the budget in characters fit it in tokens
+            long_rows = np.flatnonzero(values.str.len().to_numpy() > self.field_tokens)
+            codes = np.full(self.size, -1, dtype=np.int32)
+            codes[long_rows], uniques = pd.factorize(values.iloc[long_rows])
+            self.fields[column] = (codes, np.array([truncate_tokens(text, self.field_tokens) for text in uniques.tolist()], dtype=str))
+
+    @property
+    def arrays(self) -> dict[str, np.ndarray]:
+        """Flat array form of the fragments, suitable for saving and memory-mapping."""
+        arrays = {"field_tokens": np.array([self.field_tokens], dtype=np.int64)}
+        for column, (codes, truncated) in self.fields.items():
+            arrays[f"{column}_codes"] = codes
+            arrays[f"{column}_texts"] = truncated
+        return arrays
+
+    def field(self, position: int | None, store: dict, column: str) -> str:
+        """Budgeted text of one store field, precompiled when the row position is known."""
+        text = str(store.get(column) or "")
+        compiled = self.fields.get(column)
+        if compiled is None or position is None or not 0 <= position < self.size:
+            return truncate_tokens(text, self.field_tokens)
+        codes, truncated = compiled
+        code = codes[position]
+        return text if code < 0 else str(truncated[code])
+
+
+def build_store_fragments(stores_df: pd.DataFrame, arrays: dict[str, np.ndarray] | None = None) -> StoreFragments:
+    return StoreFragments(stores_df, arrays=arrays)
+
+
+def store_blocks(stores_info: list[dict], fragments: StoreFragments | None = None, context_tokens: int | None = None) -> list[str]:
+    """
+    One context block per store, nearest first, within the context token
+    budget. The nearest store is always kept.
+    """
+    fragments = fragments or StoreFragments(pd.DataFrame())
+    if context_tokens is None:
+        context_tokens = get_prompt_config()["context_tokens"]
+
+    blocks = []
+    used = 0
+    for i, store in enumerate(stores_info):
+        position = store.get("position")
+        block = STORE_TEMPLATE.format(
+            number=i + 1,
+            name=store['store_name'],
+            distance=store['distance_km'],
+            product=fragments.field(position, store, "product_info"),
+            promotion=fragments.field(position, store, "promotion"),
+            address=store['address'],
+        )
+        tokens = count_tokens(block)
+        if blocks and context_tokens > 0 and used + tokens > context_tokens:
+            PROMPT_STORES_DROPPED.inc(len(stores_info) - i)
+            logger.debug("Prompt context budget reached, leaving out %d of %d stores", len(stores_info) - i, len(stores_info))
+            break
+        blocks.append(block)
+        used += tokens
+    return blocks
+
+
+def history_block(history: list[list[str]] | None) -> str:
+    """Earlier [message, reply] turns as prompt text; empty without history."""
+    if not history:
+        return ""
+    turns = "\n".join(TURN_TEMPLATE.format(message=message, reply=reply) for message, reply in history)
+    return HISTORY_TEMPLATE.format(turns=turns)
+
+
+def build_reply_prompt(user_message: str, stores_info: list[dict] | None, search_intent: dict | None = None, match_type: str | None = None, fragments: StoreFragments | None = None, history: list[list[str]] | None = None) -> str:
+    """Reply prompt from the template for this match type."""
+    search_intent = search_intent or {}
+    history = history_block(history)
+
+    if stores_info:
+        instruction = ""
+        if match_type == 'product':
+            instruction = STORE_INSTRUCTIONS['product']
+        elif match_type == 'category':
+            product_name = search_intent.get('product')
+            category_name = search_intent.get('category') or 'danh mục này'
+            template = STORE_INSTRUCTIONS['category_product' if product_name else 'category']
+            instruction = template.format(product_name=product_name, category_name=category_name)
+        stores = "".join(store_blocks(stores_info, fragments))
+        return CONTEXT_TEMPLATE.format(stores=stores, history=history, message=user_message, instruction=instruction)
+
+    if search_intent.get('is_location_request'):
+        instruction = QUERY_INSTRUCTIONS['location']
+    elif search_intent:
+        product_name = search_intent.get('product') or search_intent.get('category')
+        instruction = QUERY_INSTRUCTIONS['not_found'].format(product_name=product_name)
+    else:
+        instruction = QUERY_INSTRUCTIONS['chitchat']
+    return QUERY_TEMPLATE.format(history=history, message=user_message, instruction=instruction)
+
+
+def record_prompt(kind: str, prompt: str) -> int:
+    """Count a prompt's tokens into PROMPT_TOKENS; warns when a reply prompt exceeds PROMPT_MAX_TOKENS."""
+    tokens = count_tokens(prompt)
+    PROMPT_TOKENS.observe(tokens, kind=kind)
+    max_tokens = get_prompt_config()["max_tokens"]
+    if kind == "reply" and 0 < max_tokens < tokens:
+        logger.warning("Reply prompt has %d tokens, above PROMPT_MAX_TOKENS=%d", tokens, max_tokens)
+    return tokens
+
+
+if __name__ == '__main__':
+    # Example usage
+    catalog = pd.DataFrame({
+        'store_name': ['Phone Zone', 'Laptop Pro'],
+        'product_info': ['iPhone 16 Pro Max 256GB, iPhone 16 Pro, iPhone 15, iPhone 14, ốp lưng, cáp sạc, tai nghe, sạc dự phòng', 'Laptop Dell'],
+        'promotion': ['Giảm 10% cho khách hàng mới', ''],
+        'address': ['1 Lê Lợi, Quận 1', '2 Nguyễn Huệ, Quận 1'],
+    })
+    store_fragments = StoreFragments(catalog, field_tokens=12)
+    stores = [{**row, 'position': i, 'distance_km': 0.5 + i} for i, row in enumerate(catalog.to_dict('records'))]
+    prompt = build_reply_prompt("mua iPhone 16", stores, {'product': 'iPhone 16', 'category': 'Công nghệ'}, 'product', store_fragments)
+    print(prompt)
+    print(count_tokens(prompt), "tokens")
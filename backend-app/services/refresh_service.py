@@ -0,0 +1,260 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from typing import Awaitable, Callable
+
+import httpx
+
+from services.sheet_service import get_csv_url, parse_stores_csv
+from services.snapshot_service import StoreSnapshot, build_snapshot, load_saved_snapshot, read_manifest, save_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+def get_refresh_config():
+    return {
+        "interval": float(os.environ.get("STORE_REFRESH_INTERVAL", "300")),
+        "timeout": float(os.environ.get("STORE_REFRESH_TIMEOUT", "30")),
+        # Chat requests arriving while the first load is still running wait
+        # this long for it; /health and /ready never wait
+        "startup_wait": float(os.environ.get("STORE_STARTUP_WAIT", "30")),
+        # Multi-worker mode: how often workers check the manifest, and how far
+        # ahead the loader schedules the switch so every worker is ready by then
+        "follow_interval": float(os.environ.get("STORE_FOLLOW_INTERVAL", "1")),
+        "switch_delay": float(os.environ.get("STORE_SWITCH_DELAY", "3")),
+    }
+
+
+class BackgroundPoller:
+    """
+    Calls `poll()` every `interval` seconds on a background task and hands
+    the snapshots it produces to `on_update`.
+
+    `first_load` is set after the first poll, or with `ready_on_publish`
+    only once a poll has published something. `last_error` holds the error
+    of the latest poll, None once one succeeds.
+    """
+
+    activity = "polling store data"
+    ready_on_publish = False
+
+    def __init__(self, on_update: Callable[[StoreSnapshot], Awaitable[None] | None], interval: float):
+        self.on_update = on_update
+        self.interval = interval
+        self.last_error: str | None = None
+        self.first_load = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    async def poll(self) -> bool:
+        """One check of the source. Returns True if a new snapshot was published."""
+        raise NotImplementedError
+
+    async def _publish(self, snapshot: StoreSnapshot):
+        result = self.on_update(snapshot)
+        if asyncio.iscoroutine(result):
+            await result
+
+    async def run(self):
+        while True:
+            published = False
+            try:
+                published = await self.poll()
+                self.last_error = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error("Error %s: %s", self.activity, e)
+            if published or not self.ready_on_publish:
+                self.first_load.set()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class StoreDataRefresher(BackgroundPoller):
+    """
+    Polls the store sheet in the background and publishes a new snapshot
+    only when the data actually changed.
+
+    Each poll is a conditional GET (If-None-Match / If-Modified-Since); a 304
+    or a body with the same SHA-256 as the current snapshot is a no-op.
+    Parsing and index building run in a worker thread, and `on_update` is
+    called with the finished snapshot so the caller can swap it in at once.
+
+    With a `snapshot_dir`, every published snapshot is also saved locally and
+    `restore()` can serve it on the next start before the sheet is reachable.
+    The manifest carries an `activate_at` time `switch_delay` seconds ahead,
+    which SnapshotFollower workers use to switch over together.
+    """
+
+    activity = "refreshing store data"
+
+    def __init__(self, on_update: Callable[[StoreSnapshot], Awaitable[None] | None], url: str | None = None, interval: float = 300.0, timeout: float = 30.0, snapshot_dir: str | None = None, switch_delay: float = 0.0):
+        super().__init__(on_update, interval)
+        self.url = url or get_csv_url()
+        self.snapshot_dir = snapshot_dir
+        self.switch_delay = switch_delay
+        self.timeout = timeout
+        self.etag: str | None = None
+        self.last_modified: str | None = None
+        self.source_hash: str | None = None
+        self.version = 0
+        self.last_checked: float | None = None
+
+    def _conditional_headers(self) -> dict:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    async def refresh_once(self) -> bool:
+        """Poll the source once. Returns True if a new snapshot was published."""
+        async with httpx.AsyncClient(timeout=self.timeout, follow_redirects=True) as client:
+            response = await client.get(self.url, headers=self._conditional_headers())
+        self.last_checked = time.time()
+
+        if response.status_code == 304:
+            return False
+        response.raise_for_status()
+
+        # The validators only count once this body is in use; after a failed
+        # build the next poll must not get a 304 for it
+        etag = response.headers.get("ETag") or self.etag
+        last_modified = response.headers.get("Last-Modified") or self.last_modified
+
+        content = response.content
+        source_hash = hashlib.sha256(content).hexdigest()
+        if source_hash == self.source_hash:
+            self.etag, self.last_modified = etag, last_modified
+            return False
+
+        snapshot = await asyncio.to_thread(self._build, content, source_hash, self.version + 1, etag, last_modified)
+        if snapshot.empty:
+            logger.warning("Store sheet returned no usable rows, keeping the current data.")
+            return False
+
+        await self._publish(snapshot)
+        self.source_hash = source_hash
+        self.version = snapshot.version
+        self.etag, self.last_modified = etag, last_modified
+        logger.info("Store data refreshed: %d stores (version %d).", len(snapshot.stores_dataframe), snapshot.version)
+        return True
+
+    def _build(self, content: bytes, source_hash: str, version: int, etag: str | None = None, last_modified: str | None = None) -> StoreSnapshot:
+        stores, rejected = parse_stores_csv(content)
+        snapshot = build_snapshot(stores, source_hash=source_hash, version=version, rejected_rows=len(rejected))
+        if self.snapshot_dir and not snapshot.empty:
+            try:
+                extra = {"etag": etag, "last_modified": last_modified, "source_url": self.url, "activate_at": time.time() + self.switch_delay}
+                save_snapshot(snapshot, self.snapshot_dir, extra=extra, rejected=rejected)
+            except Exception as e:
+                logger.warning("Could not save local store snapshot: %s", e)
+        return snapshot
+
+    async def restore(self) -> bool:
+        """Publish the locally saved snapshot, if any. Returns True on success."""
+        if not self.snapshot_dir:
+            return False
+        start = time.perf_counter()
+        loaded = await asyncio.to_thread(load_saved_snapshot, self.snapshot_dir)
+        if loaded is None:
+            return False
+
+        snapshot, manifest = loaded
+        self.source_hash = snapshot.source_hash
+        self.version = snapshot.version
+        if manifest.get("source_url") == self.url:
+            self.etag = manifest.get("etag")
+            self.last_modified = manifest.get("last_modified")
+        await self._publish(snapshot)
+        logger.info("Restored %d stores from local snapshot in %.0f ms (version %d).", len(snapshot.stores_dataframe), (time.perf_counter() - start) * 1000, snapshot.version)
+        return True
+
+    async def poll(self) -> bool:
+        return await self.refresh_once()
+
+
+class SnapshotFollower(BackgroundPoller):
+    """
+    Worker side of the multi-worker mode: follows the snapshot a loader
+    process saves under `snapshot_dir` instead of downloading and parsing the
+    sheet itself.
+
+    Only the index arrays are memory-mapped and shared through the page
+    cache. Each worker still converts the table to its own DataFrame and
+    rebuilds the intent classifier and prompt fragments from it. A new snapshot is
+    preloaded as soon as its manifest appears and published at the manifest's
+    `activate_at` time, so all workers switch within one poll interval of
+    each other.
+    """
+
+    activity = "following store snapshot"
+    ready_on_publish = True
+
+    def __init__(self, on_update: Callable[[StoreSnapshot], Awaitable[None] | None], snapshot_dir: str, interval: float = 1.0):
+        super().__init__(on_update, interval)
+        self.snapshot_dir = snapshot_dir
+        self.current_path: str | None = None
+        self.version = 0
+
+    async def follow_once(self) -> bool:
+        """Check the manifest once. Returns True if a new snapshot was published."""
+        manifest = await asyncio.to_thread(read_manifest, self.snapshot_dir)
+        if manifest is None or manifest.get("path") == self.current_path:
+            return False
+
+        loaded = await asyncio.to_thread(load_saved_snapshot, self.snapshot_dir)
+        if loaded is None:
+            return False
+        snapshot, manifest = loaded
+
+        # The first snapshot is served at once; later ones wait for the common switch time
+        if self.first_load.is_set():
+            delay = manifest.get("activate_at", 0) - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        self.current_path = manifest["path"]
+        self.version = snapshot.version
+        await self._publish(snapshot)
+        logger.info("Switched to shared store snapshot version %d (%d stores).", snapshot.version, len(snapshot.stores_dataframe))
+        return True
+
+    async def poll(self) -> bool:
+        return await self.follow_once()
+
+
+def run_loader(snapshot_dir: str):
+    """
+    Entry point of the loader process in multi-worker mode: keeps the shared
+    snapshot under `snapshot_dir` up to date for SnapshotFollower workers.
+    """
+    config = get_refresh_config()
+    refresher = StoreDataRefresher(lambda snapshot: None, interval=config["interval"], timeout=config["timeout"], snapshot_dir=snapshot_dir, switch_delay=config["switch_delay"])
+
+    async def main():
+        await refresher.restore()
+        await refresher.run()
+
+    logger.info("Store loader started (pid %d), sharing snapshots via %s", os.getpid(), snapshot_dir)
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
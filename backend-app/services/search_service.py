@@ -0,0 +1,169 @@
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+EMPTY_POSTINGS = np.empty(0, dtype=np.int64)
+
+# Sorts a code point above any real character, closing a prefix range
+PREFIX_END = "\U0010ffff"
+
+
+def fold_text(text) -> str:
+    """Lowercase and strip Vietnamese diacritics ('Điện Thoại' -> 'dien thoai')."""
+    if text is None or (not isinstance(text, str) and pd.isna(text)):
+        return ""
+    s = str(text).lower().replace("đ", "d")
+    s = unicodedata.normalize("NFD", s)
+    return "".join(ch for ch in s if unicodedata.category(ch) != "Mn")
+
+
+def tokenize(text) -> list[str]:
+    return TOKEN_PATTERN.findall(fold_text(text))
+
+
+class InvertedIndex:
+    """Token -> sorted store row positions, with prefix lookups over a sorted vocabulary."""
+
+    def __init__(self, values: pd.Series | None = None, arrays: dict[str, np.ndarray] | None = None, size: int | None = None):
+        self.size = len(values) if size is None else size
+        if arrays is None:
+            arrays = self._build_arrays(values)
+        self.arrays = arrays
+
+        # Posting list of vocabulary[t] is ids[offsets[t]:offsets[t + 1]].
+        # The vocabulary stays a sorted numpy array so a memory-mapped index
+        # is never copied into Python strings.
+        self.vocabulary = arrays['vocabulary']
+        self.offsets = arrays['offsets']
+        self.ids = arrays['ids']
+
+    def postings(self, t: int) -> np.ndarray:
+        return self.ids[self.offsets[t]:self.offsets[t + 1]]
+
+    @staticmethod
+    def _build_arrays(values: pd.Series) -> dict[str, np.ndarray]:
+        """Flat array form of the index, suitable for saving and memory-mapping."""
+        buckets: dict[str, list[int]] = {}
+        for position, value in enumerate(values.tolist()):
+            for token in set(tokenize(value)):
+                buckets.setdefault(token, []).append(position)
+        vocabulary = sorted(buckets)
+        lengths = [len(buckets[token]) for token in vocabulary]
+        return {
+            'vocabulary': np.array(vocabulary, dtype=str),
+            'offsets': np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)]).astype(np.int64),
+            'ids': np.fromiter((i for token in vocabulary for i in buckets[token]), dtype=np.int64, count=sum(lengths)),
+        }
+
+    def lookup_token(self, term: str) -> np.ndarray:
+        """Rows containing a token that starts with `term` (term must already be folded)."""
+        # Tokens sharing a prefix are adjacent in the vocabulary, so their
+        # postings form one contiguous run of the flat ids array
+        lo = int(np.searchsorted(self.vocabulary, term, side='left'))
+        hi = int(np.searchsorted(self.vocabulary, term + PREFIX_END, side='left'))
+        if lo == hi:
+            return EMPTY_POSTINGS
+        if hi == lo + 1:
+            return self.postings(lo)
+        return self._unique(self.ids[self.offsets[lo]:self.offsets[hi]])
+
+    def _unique(self, ids: np.ndarray) -> np.ndarray:
+        # A bitmap over all rows beats sorting once the run is large
+        if len(ids) * 16 < self.size:
+            return np.unique(ids)
+        seen = np.zeros(self.size, dtype=bool)
+        seen[ids] = True
+        return np.flatnonzero(seen)
+
+    def intersect(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        """Intersection of two sorted unique posting lists."""
+        if min(len(a), len(b)) * 64 < self.size:
+            return np.intersect1d(a, b, assume_unique=True)
+        seen = np.zeros(self.size, dtype=bool)
+        seen[a] = True
+        return b[seen[b]]
+
+    def lookup(self, text: str) -> np.ndarray | None:
+        """Rows matching every token of `text`; None when text has no tokens."""
+        tokens = tokenize(text)
+        if not tokens:
+            return None
+        result = None
+        # Start from the rarest token so intersections stay small
+        for postings in sorted((self.lookup_token(t) for t in tokens), key=len):
+            result = postings if result is None else self.intersect(result, postings)
+            if len(result) == 0:
+                break
+        return result
+
+
+class StoreSearchIndex:
+    """
+    Posting indexes over the store catalog used by the /chat filter chain.
+
+    All results are row positions into the DataFrame the index was built from.
+    """
+
+    def __init__(self, stores_df: pd.DataFrame, arrays: dict[str, np.ndarray] | None = None):
+        self.size = len(stores_df)
+        self.category = self.product = None
+        if not self.size:
+            return
+
+        if arrays is None:
+            self.category = InvertedIndex(stores_df['category'])
+            # Product terms match either the product description or the store name
+            self.product = InvertedIndex(stores_df['product_info'].fillna('').astype(str) + ' ' + stores_df['store_name'].fillna('').astype(str))
+        else:
+            self.category = InvertedIndex(arrays={k[len('category_'):]: v for k, v in arrays.items() if k.startswith('category_')}, size=self.size)
+            self.product = InvertedIndex(arrays={k[len('product_'):]: v for k, v in arrays.items() if k.startswith('product_')}, size=self.size)
+
+    @property
+    def arrays(self) -> dict[str, np.ndarray]:
+        if not self.size:
+            return {}
+        arrays = {f'category_{k}': v for k, v in self.category.arrays.items()}
+        arrays.update({f'product_{k}': v for k, v in self.product.arrays.items()})
+        return arrays
+
+    def all_stores(self) -> np.ndarray:
+        return np.arange(self.size, dtype=np.int64)
+
+    def match_category(self, category_term: str) -> np.ndarray:
+        """Stores whose category contains every word of category_term."""
+        if not self.size:
+            return EMPTY_POSTINGS
+        matched = self.category.lookup(category_term)
+        return self.all_stores() if matched is None else matched
+
+    def match_product(self, text: str, within: np.ndarray | None = None) -> np.ndarray:
+        """Stores (optionally restricted to `within`) whose product info or name contains every word of text."""
+        if not self.size:
+            return EMPTY_POSTINGS
+        matched = self.product.lookup(text)
+        if matched is None:
+            return self.all_stores() if within is None else within
+        if within is None or len(within) == self.size:
+            return matched
+        return self.product.intersect(within, matched)
+
+
+def build_search_index(stores_df: pd.DataFrame, arrays: dict[str, np.ndarray] | None = None) -> StoreSearchIndex:
+    return StoreSearchIndex(stores_df, arrays=arrays)
+
+
+if __name__ == '__main__':
+    data = [
+        {"store_id": "1", "store_name": "Giày Việt", "category": "Thời trang", "product_info": "Giày chạy bộ size 40-45"},
+        {"store_id": "2", "store_name": "Phone Zone", "category": "Công nghệ", "product_info": "iPhone 16, iPhones cũ, Điện thoại Android"},
+        {"store_id": "3", "store_name": "Laptop Pro", "category": "Công nghệ", "product_info": "Laptop, máy tính bảng"},
+    ]
+    index_test = build_search_index(pd.DataFrame(data))
+    tech = index_test.match_category("cong nghe")
+    print("Tech stores:", tech)
+    print("iPhone 16 in tech:", index_test.match_product("iPhone 16", within=tech))
+    print("dien thoai:", index_test.match_product("điện thoại"))
@@ -0,0 +1,208 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from services.cache_service import MISSING, SQLiteWriter, TTLCache
+from services.intent_service import IntentClassifier, get_classifier_config, hard_rule_intent
+from services.metrics_service import CACHE_LOOKUPS
+from services.prompt_service import truncate_tokens
+from services.search_service import fold_text, tokenize
+
+def _phrases(text: str) -> tuple[str, ...]:
+    return tuple(" ".join(tokenize(phrase)) for phrase in text.split(","))
+
+
+# Phrases that point back at the previous search ("cái đó ở đâu?", "còn cái
+# nào rẻ hơn không?"); single words like "nào" or "vậy" are too common in new
+# requests and small talk to count on their own
+SAME_PHRASES = _phrases("""
+    cái đó, cái này, cái kia, cái ấy, cái nào, món đó, món này, loại đó, loại này,
+    sản phẩm đó, sản phẩm này, hàng đó, hàng này, chỗ đó, chỗ này, chỗ ấy, ở đó,
+    cửa hàng đó, cửa hàng này, cửa hàng ấy, shop đó, shop này, còn cái, còn loại
+    """)
+# Phrases asking for other stores than the ones already shown
+MORE_PHRASES = _phrases("""
+    nào khác, nào nữa, khác nữa, còn nữa, cửa hàng khác, chỗ khác, shop khác, nơi khác,
+    tiệm khác, địa chỉ khác, thêm cửa hàng, thêm chỗ, xem thêm
+    """)
+# Single words that count as a follow-up only when the local classifier also
+# puts the message in the last search's category ("còn điện thoại nào rẻ hơn?")
+FOLLOW_UP_CUES = frozenset(fold_text(word) for word in """
+    còn khác nữa thêm rẻ đắt gần xa hơn nhất nào đó này kia ấy vậy sao cái chỗ
+    """.split())
+MORE_CUES = frozenset(fold_text(word) for word in "khác nữa thêm".split())
+# Longer messages are treated as new requests
+MAX_FOLLOW_UP_WORDS = 10
+
+# Session backend, created on first use (SESSION_BACKEND)
+_store = None
+
+
+def get_session_config():
+    return {
+        # "memory" (LRU dict, per process) or "sqlite" (SESSION_PATH, shared by workers)
+        "backend": os.environ.get("SESSION_BACKEND", "memory"),
+        "path": os.environ.get("SESSION_PATH", "sessions.sqlite3"),
+        "size": int(os.environ.get("SESSION_SIZE", "10000")),
+        "ttl": float(os.environ.get("SESSION_TTL", "1800")),
+        # Seconds between sweeps of expired sessions from SESSION_PATH
+        "sweep_interval": float(os.environ.get("SESSION_SWEEP_INTERVAL", "300")),
+        # Previous turns given to the LLM as context
+        "history_turns": int(os.environ.get("SESSION_HISTORY_TURNS", "3")),
+        # Larger candidate sets are recomputed from the intent instead of stored
+        "max_candidates": int(os.environ.get("SESSION_MAX_CANDIDATES", "10000")),
+        # Token budget of each assistant reply kept in the history
+        "reply_tokens": int(os.environ.get("SESSION_REPLY_TOKENS", "60")),
+    }
+
+
+class SQLiteSessionStore:
+    """
+    Sessions in a SQLite file, read on every call so several worker processes
+    see each other's updates. Same get/set interface as TTLCache. Writes go
+    through a background SQLiteWriter; until one is committed, this process
+    answers from the queued value. Expired rows are swept every
+    `sweep_interval` seconds.
+    """
+
+    name = "session"
+
+    def __init__(self, path: str, ttl: float = 1800.0, sweep_interval: float = 300.0):
+        self.path = path
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        # session id -> (id, value, expires_at) row queued but not yet committed
+        self._pending: dict[str, tuple] = {}
+        self._swept_at = time.time()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, value TEXT, expires_at REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_expiry ON sessions (expires_at)")
+        self._db.commit()
+        self._writer = SQLiteWriter(path, self.name)
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._pending.get(key)
+            if row is None:
+                row = self._db.execute("SELECT id, value, expires_at FROM sessions WHERE id = ?", (key,)).fetchone()
+        value = MISSING if row is None or row[2] < time.time() else json.loads(row[1])
+        CACHE_LOOKUPS.inc(cache=self.name, result="miss" if value is MISSING else "hit")
+        return value
+
+    def set(self, key: str, value):
+        now = time.time()
+        row = (key, json.dumps(value, ensure_ascii=False), now + self.ttl)
+        with self._lock:
+            self._pending[key] = row
+            sweep = now - self._swept_at >= self.sweep_interval
+            if sweep:
+                self._swept_at = now
+        self._writer.execute("INSERT OR REPLACE INTO sessions (id, value, expires_at) VALUES (?, ?, ?)", row, done=lambda: self._written(row))
+        if sweep:
+            self._writer.execute("DELETE FROM sessions WHERE expires_at < ?", (now,))
+
+    def _written(self, row: tuple):
+        with self._lock:
+            if self._pending.get(row[0]) is row:
+                del self._pending[row[0]]
+
+
+def get_session_store():
+    global _store
+    if _store is None:
+        config = get_session_config()
+        if config["backend"] == "sqlite":
+            _store = SQLiteSessionStore(config["path"], ttl=config["ttl"], sweep_interval=config["sweep_interval"])
+        else:
+            _store = TTLCache("session", max_size=config["size"], ttl=config["ttl"])
+    return _store
+
+
+def load_session(session_id: str | None) -> dict | None:
+    if not session_id:
+        return None
+    session = get_session_store().get(session_id)
+    return None if session is MISSING else session
+
+
+def save_session(session_id: str, session: dict):
+    get_session_store().set(session_id, session)
+
+
+def follow_up_kind(message: str, session: dict | None, classifier: IntentClassifier | None = None) -> tuple[str | None, dict | None]:
+    """
+    How a message relates to the session's last search, without the LLM.
+    Messages the hard location/generic rules decide are never follow-ups.
+
+      ('refine', intent)  names a product of the same category; narrow the candidates
+      ('more', None)      asks for other stores than those already shown
+      ('same', None)      asks about the same search again
+      (None, None)        anything else, handled as a new request
+    """
+    last = (session or {}).get("intent")
+    if not last or last.get("is_location_request") or hard_rule_intent(message) is not None:
+        return None, None
+
+    words = tokenize(message)
+    if len(words) > MAX_FOLLOW_UP_WORDS:
+        return None, None
+
+    same_category = False
+    if classifier is not None:
+        guess, confidence = classifier.classify(message)
+        # Guesses the classifier would not trust for a new request don't steer a follow-up either
+        if guess is not None and confidence >= get_classifier_config()["min_confidence"]:
+            if guess.get("category") != last.get("category"):
+                return None, None
+            if guess.get("product"):
+                return "refine", {**last, "product": guess["product"], "generic_term": guess.get("generic_term") or last.get("generic_term")}
+            same_category = True
+
+    text = f" {' '.join(words)} "
+    if any(f" {phrase} " in text for phrase in MORE_PHRASES) or (same_category and MORE_CUES & set(words)):
+        return "more", None
+    if any(f" {phrase} " in text for phrase in SAME_PHRASES) or (same_category and FOLLOW_UP_CUES & set(words)):
+        return "same", None
+    return None, None
+
+
+def history_of(session: dict | None) -> list[list[str]]:
+    """Previous [message, reply] turns to give the LLM, oldest first."""
+    return (session or {}).get("history") or []
+
+
+def record_turn(session: dict | None, message: str, reply: str, search: dict | None = None) -> dict:
+    """
+    Session after one more turn. `search` (version, intent, match_type,
+    candidates, shown) replaces the stored search state when the turn ran one;
+    chit-chat turns only extend the history.
+    """
+    config = get_session_config()
+    session = dict(session or {})
+    if search is not None:
+        candidates = search.get("candidates")
+        if candidates is not None and len(candidates) > config["max_candidates"]:
+            search = {**search, "candidates": None}
+        session.update(search)
+    turns = config["history_turns"]
+    history = history_of(session) + [[message, truncate_tokens(reply, config["reply_tokens"])]]
+    session["history"] = history[-turns:] if turns > 0 else []
+    return session
+
+
+if __name__ == '__main__':
+    # Example usage
+    session = record_turn(None, "mua iPhone 16", "Có 3 cửa hàng gần bạn bán iPhone 16...", {
+        "version": "v1",
+        "intent": {"product": "iPhone 16", "generic_term": "iPhone", "category": "Công nghệ", "is_location_request": False},
+        "match_type": "product",
+        "candidates": [3, 8, 21, 34],
+        "shown": [8, 3, 21],
+    })
+    save_session("demo", session)
+    for message in ("còn cửa hàng nào khác không?", "cái đó ở đâu?", "mình muốn ăn phở", "cảm ơn nhé, vậy thôi"):
+        print(message, "->", follow_up_kind(message, load_session("demo")))
@@ -1,19 +1,39 @@
+import io
+import logging
+import numpy as np
 import pandas as pd
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 import os
 
-# For simplicity, we'll use a mock CSV file instead of Google Sheets
-# In a real scenario, you would set up gspread and authenticate
-# scope = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
-# credentials = ServiceAccountCredentials.from_json_keyfile_name('credentials.json', scope)
-# client = gspread.authorize(credentials)
+logger = logging.getLogger(__name__)
+
+DEFAULT_CSV_URL = "https://docs.google.com/spreadsheets/d/1FlVCrM1jAKv3GLKhT6B05Vx379xdOCNAj8HDPPLIxvA/export?format=csv&gid=0"
+
+REQUIRED_COLUMNS = ["store_id", "store_name", "address", "category", "product_info", "promotion", "latitude", "longitude"]
+
+# Column dtypes after cleaning
+TEXT_COLUMNS = ["store_id", "store_name", "address", "product_info", "promotion"]
+
+# Default bounding box for valid store coordinates (Vietnam): min_lat, max_lat, min_lon, max_lon
+DEFAULT_BOUNDS = (8.0, 23.5, 102.0, 110.0)
+
+def get_csv_url() -> str:
+    """Store sheet CSV export URL; STORE_DATA_URL overrides it (e.g. a local stand-in)."""
+    return os.environ.get("STORE_DATA_URL") or DEFAULT_CSV_URL
+
+def get_bounds() -> tuple[float, float, float, float]:
+    """Coordinate bounding box from STORE_BOUNDS='min_lat,max_lat,min_lon,max_lon'."""
+    raw = os.environ.get("STORE_BOUNDS")
+    if not raw:
+        return DEFAULT_BOUNDS
+    min_lat, max_lat, min_lon, max_lon = (float(v) for v in raw.split(","))
+    return min_lat, max_lat, min_lon, max_lon
 
 # Function to load store data from Google Sheet CSV
 def clean_coordinate(value):
     """
     Cleans coordinate strings that might have multiple dots (e.g., '105.820.730').
     Assumes the first dot is the decimal separator and removes subsequent dots.
+    Per-value version; the loader uses the vectorized clean_coordinates.
     """
     if pd.isna(value):
         return 0.0
@@ -29,24 +49,99 @@ def clean_coordinate(value):
     except ValueError:
         return 0.0
 
-def load_stores_data():
-    csv_url = "https://docs.google.com/spreadsheets/d/1FlVCrM1jAKv3GLKhT6B05Vx379xdOCNAj8HDPPLIxvA/export?format=csv&gid=0"
+# A plain decimal number, the only form cast straight to float
+NUMBER_PATTERN = r"^[+-]?(\d+\.?\d*|\.\d+)$"
+
+def clean_coordinates(values: pd.Series) -> pd.Series:
+    """
+    Vectorized clean_coordinate over a whole column, using Arrow compute
+    kernels. Returns float64 with NaN (not 0.0) for missing or unparseable values.
+    """
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype("float64")
+
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    text = pc.utf8_trim_whitespace(pa.array(values.astype("string"), from_pandas=True))
+    result = np.full(len(values), np.nan)
+
+    is_number = pc.fill_null(pc.match_substring_regex(text, NUMBER_PATTERN), False)
+    number_mask = is_number.to_numpy(zero_copy_only=False)
+    result[number_mask] = pc.cast(pc.filter(text, is_number), pa.float64()).to_numpy(zero_copy_only=False)
+
+    # Only the rest needs the multi-dot repair: '105.820.730' -> '105.820730'
+    retry_mask = ~number_mask & pc.is_valid(text).to_numpy(zero_copy_only=False)
+    if retry_mask.any():
+        retry = pc.filter(text, pa.array(retry_mask))
+        parts = pc.extract_regex(retry, r"^(?P<head>[^.]*)\.(?P<tail>.*)$")
+        repaired = pc.binary_join_element_wise(parts.field("head"), pc.replace_substring(parts.field("tail"), ".", ""), pa.scalar(".", retry.type))
+        repaired = pc.if_else(pc.match_substring_regex(repaired, NUMBER_PATTERN), repaired, pa.scalar(None, retry.type))
+        result[retry_mask] = pc.cast(repaired, pa.float64()).to_numpy(zero_copy_only=False)
+
+    return pd.Series(result, index=values.index, dtype="float64")
+
+def validate_stores_data(df: pd.DataFrame, bounds: tuple[float, float, float, float] | None = None) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Clean coordinates, apply the typed schema and range-check coordinates.
+
+    Returns (stores, rejected). `rejected` holds the original rows that were
+    dropped, with a `reject_reason` column.
+    """
+    min_lat, max_lat, min_lon, max_lon = bounds or get_bounds()
+
+    latitude = clean_coordinates(df['latitude'])
+    longitude = clean_coordinates(df['longitude'])
+
+    missing = df['latitude'].isna() | df['longitude'].isna()
+    unparseable = ~missing & (latitude.isna() | longitude.isna())
+    out_of_bounds = ~missing & ~unparseable & ~(latitude.between(min_lat, max_lat) & longitude.between(min_lon, max_lon))
+
+    reasons = pd.Series(None, index=df.index, dtype="object")
+    reasons[missing] = "missing_coordinate"
+    reasons[unparseable] = "unparseable_coordinate"
+    reasons[out_of_bounds] = "out_of_bounds"
+    rejected_mask = reasons.notna()
+
+    rejected = df[rejected_mask].assign(reject_reason=reasons[rejected_mask])
+
+    stores = df[~rejected_mask].copy()
+    stores['latitude'] = latitude[~rejected_mask]
+    stores['longitude'] = longitude[~rejected_mask]
+    for column in TEXT_COLUMNS:
+        # Empty text rather than NaN/NA, so prompts never show 'nan'
+        stores[column] = stores[column].astype("string").fillna("")
+    stores['category'] = stores['category'].astype("string").astype("category")
+    return stores.reset_index(drop=True), rejected
+
+def prepare_stores_data(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Validate the sheet columns and clean the rows. Returns (stores, rejected); stores is empty if invalid."""
+    # Ensure required columns exist
+    if not all(col in df.columns for col in REQUIRED_COLUMNS):
+        logger.error("Missing columns in Google Sheet. Expected: %s", REQUIRED_COLUMNS)
+        return pd.DataFrame(), pd.DataFrame()
+
+    stores, rejected = validate_stores_data(df)
+    if not rejected.empty:
+        summary = rejected['reject_reason'].value_counts().to_dict()
+        logger.warning("Rejected %d store rows with invalid coordinates: %s", len(rejected), summary)
+    return stores, rejected
+
+def parse_stores_csv(content: bytes) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Parse a downloaded sheet CSV body into (stores, rejected)."""
+    return prepare_stores_data(pd.read_csv(io.BytesIO(content)))
+
+def load_stores_data(csv_url: str | None = None):
+    csv_url = csv_url or get_csv_url()
     try:
-        df = pd.read_csv(csv_url)
-        # Ensure required columns exist
-        required_columns = ["store_id", "store_name", "address", "category", "product_info", "promotion", "latitude", "longitude"]
-        if not all(col in df.columns for col in required_columns):
-            print(f"Error: Missing columns in Google Sheet. Expected: {required_columns}")
-            return pd.DataFrame()
-        
-        # Clean coordinates
-        df['latitude'] = df['latitude'].apply(clean_coordinate)
-        df['longitude'] = df['longitude'].apply(clean_coordinate)
-
-        print(f"Store data loaded successfully from Google Sheet. {len(df)} records found.")
+        df, _ = prepare_stores_data(pd.read_csv(csv_url))
+        if df.empty:
+            return df
+
+        logger.info("Store data loaded successfully from Google Sheet. %d records found.", len(df))
         return df
     except Exception as e:
-        print(f"Error loading data from Google Sheet: {e}")
+        logger.error("Error loading data from Google Sheet: %s", e)
         return pd.DataFrame()
 
 if __name__ == '__main__':
@@ -0,0 +1,212 @@
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from services.geo_service import StoreIndex, build_store_index
+from services.intent_service import IntentClassifier, build_intent_classifier
+from services.prompt_service import StoreFragments, build_store_fragments
+from services.search_service import StoreSearchIndex, build_search_index
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class StoreSnapshot:
+    """
+    Immutable bundle of the store data and everything derived from it.
+
+    Request handlers read the current snapshot once and use it throughout,
+    so a refresh that swaps in a new snapshot never exposes half-built data.
+    """
+
+    stores_dataframe: pd.DataFrame
+    unique_categories: list[str]
+    store_index: StoreIndex
+    search_index: StoreSearchIndex
+    intent_classifier: IntentClassifier
+    prompt_fragments: StoreFragments
+    source_hash: str | None = None
+    loaded_at: float = field(default_factory=time.time)
+    version: int = 0
+    rejected_rows: int = 0
+
+    @property
+    def empty(self) -> bool:
+        return self.stores_dataframe.empty
+
+
+MANIFEST_NAME = "manifest.json"
+SNAPSHOT_FORMAT = 1
+
+
+def get_snapshot_dir() -> str | None:
+    """Directory for the local snapshot (STORE_SNAPSHOT_DIR); an empty value disables it."""
+    default = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data_cache")
+    return os.environ.get("STORE_SNAPSHOT_DIR", default) or None
+
+
+def _categories_of(stores_dataframe: pd.DataFrame) -> list[str]:
+    if stores_dataframe.empty or 'category' not in stores_dataframe.columns:
+        return []
+    return stores_dataframe['category'].dropna().unique().tolist()
+
+
+def build_snapshot(stores_dataframe: pd.DataFrame, source_hash: str | None = None, version: int = 0, loaded_at: float | None = None, index_arrays: dict[str, dict[str, np.ndarray]] | None = None, rejected_rows: int = 0) -> StoreSnapshot:
+    """Build (or, given saved index_arrays, reattach) the indexes for a store DataFrame."""
+    index_arrays = index_arrays or {}
+    return StoreSnapshot(
+        stores_dataframe=stores_dataframe,
+        unique_categories=_categories_of(stores_dataframe),
+        store_index=build_store_index(stores_dataframe, arrays=index_arrays.get("geo")),
+        search_index=build_search_index(stores_dataframe, arrays=index_arrays.get("search")),
+        intent_classifier=build_intent_classifier(stores_dataframe, arrays=index_arrays.get("classifier")),
+        prompt_fragments=build_store_fragments(stores_dataframe, arrays=index_arrays.get("fragments")),
+        source_hash=source_hash,
+        loaded_at=time.time() if loaded_at is None else loaded_at,
+        version=version,
+        rejected_rows=rejected_rows,
+    )
+
+
+def save_snapshot(snapshot: StoreSnapshot, directory: str, extra: dict | None = None, rejected: pd.DataFrame | None = None) -> str:
+    """
+    Persist a snapshot under `directory`: the table as an Arrow/Feather file
+    of one record batch, every index, classifier and prompt fragment array as
+    a .npy file, the rejected-rows report as CSV, and a manifest.json
+    pointing at them.
+
+    Files go to a fresh subdirectory and the manifest is replaced atomically,
+    so a reader never sees a partially written snapshot.
+    """
+    os.makedirs(directory, exist_ok=True)
+    name = f"v{snapshot.version}-{uuid.uuid4().hex[:8]}"
+    target = os.path.join(directory, name)
+    os.makedirs(target)
+
+    import pyarrow as pa
+    from pyarrow import feather
+    # One chunk per column so loading can hand out numpy views of the mapping
+    table = pa.Table.from_pandas(snapshot.stores_dataframe.reset_index(drop=True), preserve_index=False).combine_chunks()
+    feather.write_feather(table, os.path.join(target, "stores.feather"), compression="uncompressed", chunksize=max(1, len(table)))
+    arrays = {f"geo.{k}": v for k, v in snapshot.store_index.arrays.items()}
+    arrays.update({f"search.{k}": v for k, v in snapshot.search_index.arrays.items()})
+    arrays.update({f"classifier.{k}": v for k, v in snapshot.intent_classifier.arrays.items()})
+    arrays.update({f"fragments.{k}": v for k, v in snapshot.prompt_fragments.arrays.items()})
+    for key, array in arrays.items():
+        np.save(os.path.join(target, f"{key}.npy"), np.ascontiguousarray(array))
+    if rejected is not None and not rejected.empty:
+        rejected.to_csv(os.path.join(target, "rejected.csv"), index=False)
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "path": name,
+        "source_hash": snapshot.source_hash,
+        "loaded_at": snapshot.loaded_at,
+        "saved_at": time.time(),
+        "version": snapshot.version,
+        "rows": len(snapshot.stores_dataframe),
+        "rejected_rows": snapshot.rejected_rows,
+        "arrays": sorted(arrays),
+        **(extra or {}),
+    }
+    manifest_tmp = os.path.join(directory, f".{MANIFEST_NAME}.{name}")
+    with open(manifest_tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(manifest_tmp, os.path.join(directory, MANIFEST_NAME))
+
+    # Drop older snapshot directories, keeping the previous one for workers still switching over
+    previous = sorted(
+        (entry for entry in os.listdir(directory) if entry != name and entry.startswith("v") and os.path.isdir(os.path.join(directory, entry))),
+        key=lambda entry: os.path.getmtime(os.path.join(directory, entry)),
+    )
+    for entry in previous[:-1]:
+        shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+    return target
+
+
+def read_manifest(directory: str) -> dict | None:
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(manifest, dict) or manifest.get("format") != SNAPSHOT_FORMAT:
+        return None
+    return manifest
+
+
+def _frame_from_table(table) -> pd.DataFrame:
+    """
+    DataFrame over an Arrow table that reuses its buffers where it can.
+
+    Arrow-backed string columns already point into the table. Numeric
+    columns and category codes of a single-chunk file without nulls are
+    wrapped as numpy views; the rest (older chunked files) go through
+    to_pandas, which copies them.
+    """
+    import pyarrow as pa
+    direct = {}
+    for name in table.column_names:
+        column = table.column(name)
+        if column.num_chunks != 1 or column.null_count:
+            continue
+        chunk = column.chunk(0)
+        if pa.types.is_floating(chunk.type) or pa.types.is_integer(chunk.type):
+            direct[name] = chunk.to_numpy(zero_copy_only=True)
+        elif pa.types.is_dictionary(chunk.type):
+            categories = chunk.dictionary.to_pandas()
+            direct[name] = pd.Categorical.from_codes(chunk.indices.to_numpy(zero_copy_only=True), categories=categories, ordered=chunk.type.ordered, validate=False)
+    rest = table.drop_columns(list(direct)).to_pandas()
+    # DataFrame(copy=False) keeps the views; assigning columns one by one would copy them
+    return pd.DataFrame({name: direct[name] if name in direct else rest[name] for name in table.column_names}, copy=False)
+
+
+def load_saved_snapshot(directory: str, mmap: bool = True) -> tuple[StoreSnapshot, dict] | None:
+    """
+    Load the snapshot saved under `directory`. By default everything is
+    memory-mapped: the DataFrame's columns are views of the Feather file (see
+    _frame_from_table) and the index, classifier and fragment arrays are
+    mapped .npy files, so workers loading the same snapshot share those pages
+    through the OS page cache. Only the Python objects compiled from the
+    small classifier arrays are built per process.
+    """
+    manifest = read_manifest(directory)
+    if manifest is None:
+        return None
+
+    try:
+        if not isinstance(manifest.get("path"), str) or not isinstance(manifest.get("arrays"), list):
+            raise ValueError("manifest has no snapshot path or array list")
+        target = os.path.join(directory, manifest["path"])
+        from pyarrow import feather
+        stores_dataframe = _frame_from_table(feather.read_table(os.path.join(target, "stores.feather"), memory_map=mmap))
+        index_arrays: dict[str, dict[str, np.ndarray]] = {}
+        for key in manifest["arrays"]:
+            group, name = key.split(".", 1)
+            array = np.load(os.path.join(target, f"{key}.npy"), mmap_mode="r" if mmap else None)
+            # Plain ndarray view of the mapping: same pages, no memmap slicing overhead
+            index_arrays.setdefault(group, {})[name] = array.view(np.ndarray)
+    except Exception as e:
+        logger.error("Error loading local store snapshot: %s", e)
+        return None
+
+    snapshot = build_snapshot(
+        stores_dataframe,
+        source_hash=manifest.get("source_hash"),
+        version=manifest.get("version", 0),
+        loaded_at=manifest.get("loaded_at"),
+        index_arrays=index_arrays,
+        rejected_rows=manifest.get("rejected_rows", 0),
+    )
+    return snapshot, manifest
+
+
+def empty_snapshot() -> StoreSnapshot:
+    return build_snapshot(pd.DataFrame())
@@ -0,0 +1,72 @@
+import os
+import sys
+
+# Tests import modules the way main.py does (services.*, models, main)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+PRODUCTS = {
+    "Công nghệ": ["iPhone 16", "Laptop Dell", "iPhone 16, Laptop Dell"],
+    "Ẩm thực": ["Phở bò", "Bánh mì"],
+}
+INTENTS = {
+    "mua iphone 16": {"product": "iPhone 16", "generic_term": "Điện thoại", "category": "Công nghệ", "is_location_request": False},
+    "mua laptop": {"product": "Laptop", "generic_term": "Laptop", "category": "Công nghệ", "is_location_request": False},
+    "ăn phở": {"product": "Phở bò", "generic_term": "Phở", "category": "Ẩm thực", "is_location_request": False},
+}
+
+
+def store_sheet(size: int = 400, seed: int = 1) -> pd.DataFrame:
+    """Sheet rows around Ho Chi Minh City, the way parse_stores_csv reads them."""
+    from services.sheet_service import prepare_stores_data
+
+    rng = np.random.default_rng(seed)
+    categories = rng.choice(list(PRODUCTS), size)
+    sheet = pd.DataFrame({
+        "store_id": [str(i) for i in range(size)],
+        "store_name": [f"Shop {i}" for i in range(size)],
+        "address": "HCM",
+        "category": categories,
+        "product_info": [rng.choice(PRODUCTS[category]) for category in categories],
+        "promotion": "Giảm 10%",
+        "latitude": rng.uniform(10.6, 10.9, size),
+        "longitude": rng.uniform(106.5, 106.8, size),
+    })
+    stores, _ = prepare_stores_data(sheet)
+    return stores
+
+
+@pytest.fixture
+def chat(monkeypatch):
+    """
+    main.app serving store_sheet() with the LLM calls replaced: intents come
+    from the hard rules or INTENTS, replies are "reply N". `chat.calls` counts both.
+    """
+    import main
+    from fastapi.testclient import TestClient
+    from services.intent_service import hard_rule_intent
+    from services.snapshot_service import build_snapshot
+
+    calls = {"intent": 0, "reply": 0}
+
+    async def extract_search_intent(message, *args, **kwargs):
+        calls["intent"] += 1
+        ruled = hard_rule_intent(message)
+        return ruled[1] if ruled else INTENTS.get(message.lower())
+
+    async def get_ai_response(*args, **kwargs):
+        calls["reply"] += 1
+        return f"reply {calls['reply']}"
+
+    monkeypatch.setattr(main, "extract_search_intent", extract_search_intent)
+    monkeypatch.setattr(main, "get_ai_response", get_ai_response)
+    monkeypatch.setattr(main, "store_snapshot", main.store_snapshot)
+    main.publish_snapshot(build_snapshot(store_sheet(), source_hash="v1", version=1))
+
+    client = TestClient(main.app)
+    client.calls = calls
+    client.publish = lambda stores, source_hash: main.publish_snapshot(build_snapshot(stores, source_hash=source_hash, version=2))
+    return client
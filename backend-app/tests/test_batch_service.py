@@ -0,0 +1,141 @@
+import asyncio
+import time
+
+import pytest
+
+from services.batch_service import MicroBatcher
+
+
+class Recorder:
+    """Batch handler answering item * 2, raising for items that are exceptions."""
+
+    def __init__(self, delay: float = 0.0, fail_on=None):
+        self.batches: list[list] = []
+        self.times: list[float] = []
+        self.delay = delay
+        self.fail_on = fail_on
+
+    async def __call__(self, items):
+        self.batches.append(list(items))
+        self.times.append(time.perf_counter())
+        await asyncio.sleep(self.delay)
+        if self.fail_on is not None and self.fail_on in items:
+            raise RuntimeError("batch failed")
+        return [item if isinstance(item, Exception) else item * 2 for item in items]
+
+
+def run(main):
+    """Run the async function main, failing instead of hanging on a lost waiter."""
+    async def bounded():
+        return await asyncio.wait_for(main(), timeout=5)
+    return asyncio.run(bounded())
+
+
+def test_batch_is_sent_after_the_wait():
+    handler = Recorder()
+    batcher = MicroBatcher("test", handler, max_size=16, max_wait=0.05)
+
+    async def main():
+        started = time.perf_counter()
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(3)))
+        return results, handler.times[0] - started
+
+    results, waited = run(main)
+    assert results == [0, 2, 4]
+    assert handler.batches == [[0, 1, 2]]
+    assert waited >= 0.04
+
+
+def test_full_batch_is_sent_without_waiting():
+    handler = Recorder()
+    batcher = MicroBatcher("test", handler, max_size=4, max_wait=0.5)
+
+    async def main():
+        started = time.perf_counter()
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+        return results, [at - started for at in handler.times]
+
+    results, sent_at = run(main)
+    assert results == [i * 2 for i in range(10)]
+    assert handler.batches == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+    # Both full batches went out at once; only the remainder waited for the timer
+    assert sent_at[0] < 0.2 and sent_at[1] < 0.2
+    assert sent_at[2] >= 0.4
+
+
+def test_each_caller_gets_its_own_result():
+    handler = Recorder(delay=0.01)
+    batcher = MicroBatcher("test", handler, max_size=5, max_wait=0.01)
+
+    async def caller(i):
+        # Callers arrive at different times and land in different batches
+        await asyncio.sleep((i % 4) * 0.015)
+        return i, await batcher.submit(i)
+
+    pairs = run(lambda: asyncio.gather(*(caller(i) for i in range(23))))
+    assert all(result == i * 2 for i, result in pairs)
+    assert sorted(item for batch in handler.batches for item in batch) == list(range(23))
+    assert len(handler.batches) > 1
+
+
+def test_exception_result_goes_to_its_caller_only():
+    batcher = MicroBatcher("test", Recorder(), max_size=3, max_wait=0.01)
+    error = ValueError("bad item")
+
+    results = run(lambda: asyncio.gather(batcher.submit(1), batcher.submit(error), batcher.submit(3), return_exceptions=True))
+    assert results == [2, error, 6]
+
+
+def test_failing_batch_does_not_hang_its_waiters():
+    handler = Recorder(fail_on=5)
+    batcher = MicroBatcher("test", handler, max_size=4, max_wait=0.01)
+
+    results = run(lambda: asyncio.gather(*(batcher.submit(i) for i in range(10)), return_exceptions=True))
+    # The batch holding 5 fails as a whole; the others are answered
+    assert [type(r).__name__ if isinstance(r, Exception) else r for r in results] == [0, 2, 4, 6] + ["RuntimeError"] * 4 + [16, 18]
+
+    # The batcher keeps working afterwards
+    assert run(lambda: batcher.submit(7)) == 14
+
+
+@pytest.mark.parametrize("results", [[], [1], [1, 2, 3]])
+def test_wrong_number_of_results_fails_the_batch(results):
+    async def handler(items):
+        return results
+
+    batcher = MicroBatcher("test", handler, max_size=2, max_wait=0.01)
+    answers = run(lambda: asyncio.gather(batcher.submit("a"), batcher.submit("b"), return_exceptions=True))
+    assert all(isinstance(answer, ValueError) for answer in answers)
+
+
+def test_cancelled_handler_cancels_its_waiters():
+    async def main():
+        entered = asyncio.Event()
+
+        async def handler(items):
+            entered.set()
+            await asyncio.sleep(10)
+
+        batcher = MicroBatcher("test", handler, max_size=2, max_wait=0.01)
+        waiters = [asyncio.ensure_future(batcher.submit(i)) for i in range(2)]
+        await entered.wait()
+        for task in batcher._tasks:
+            task.cancel()
+        return await asyncio.gather(*waiters, return_exceptions=True)
+
+    answers = run(main)
+    assert all(isinstance(answer, asyncio.CancelledError) for answer in answers)
+
+
+def test_caller_that_gives_up_does_not_break_the_batch():
+    handler = Recorder(delay=0.05)
+    batcher = MicroBatcher("test", handler, max_size=3, max_wait=0.01)
+
+    async def main():
+        impatient = asyncio.ensure_future(batcher.submit(1))
+        others = [asyncio.ensure_future(batcher.submit(i)) for i in (2, 3)]
+        await asyncio.sleep(0.02)
+        impatient.cancel()
+        return await asyncio.gather(*others)
+
+    assert run(main) == [4, 6]
@@ -0,0 +1,34 @@
+from services.cache_service import MISSING, TTLCache
+
+
+def test_disk_entries_survive_a_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = TTLCache("test", path=path)
+    cache.set("a", {"stores": [1, 2]})
+    cache.set("old", 1, ttl=-1)
+    assert cache.get("a") == {"stores": [1, 2]}
+    assert cache._writer.flush(5)
+
+    restarted = TTLCache("test", path=path)
+    assert restarted.get("a") == {"stores": [1, 2]}
+    assert restarted.get("old") is MISSING
+
+
+def test_clear_reaches_the_disk(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = TTLCache("test", path=path)
+    cache.set("a", 1)
+    cache._writer.flush(5)
+
+    cache.clear()
+    assert cache.get("a") is MISSING
+    assert cache._writer.flush(5)
+    assert TTLCache("test", path=path).get("a") is MISSING
+
+
+def test_lru_without_disk():
+    cache = TTLCache("test", max_size=2)
+    for key in "abc":
+        cache.set(key, key)
+    assert cache.get("a") is MISSING
+    assert (cache.get("b"), cache.get("c")) == ("b", "c")
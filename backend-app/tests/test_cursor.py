@@ -0,0 +1,50 @@
+import pytest
+
+from conftest import store_sheet
+from services.geo_service import decode_cursor, encode_cursor
+
+HERE = {"latitude": 10.75, "longitude": 106.66}
+
+
+def test_cursor_round_trip():
+    payload = {"version": "v1", "lat": 10.75, "lon": 106.66, "distance": 1.25, "position": 42,
+               "intent": {"product": "Phở bò", "category": "Ẩm thực"}, "max_distance_km": None}
+    assert decode_cursor(encode_cursor(payload)) == payload
+
+
+@pytest.mark.parametrize("max_distance_km", [None, 15.0])
+def test_pages_continue_the_first_search(chat, max_distance_km):
+    single = chat.post("/chat", json={"message": "mua iPhone 16", **HERE, "limit": 30, "max_distance_km": max_distance_km}).json()
+    assert len(single["nearest_stores"]) == 30
+    chat.calls.update(intent=0, reply=0)
+
+    page = chat.post("/chat", json={"message": "mua iPhone 16", **HERE, "limit": 6, "max_distance_km": max_distance_km}).json()
+    stores = page["nearest_stores"]
+    while len(stores) < 30:
+        # The cursor carries the search: message and location of later requests are ignored
+        page = chat.post("/chat", json={"message": "ăn phở", "latitude": 0, "longitude": 0, "limit": 6, "cursor": page["next_cursor"]}).json()
+        assert page["reply"] == ""
+        stores += page["nearest_stores"]
+
+    assert [store["name"] for store in stores] == [store["name"] for store in single["nearest_stores"]]
+    assert chat.calls == {"intent": 1, "reply": 1}
+
+
+def test_stream_pages_send_no_reply(chat):
+    first = chat.post("/chat", json={"message": "mua iPhone 16", **HERE, "limit": 3}).json()
+    body = chat.post("/chat/stream", json={"message": "mua iPhone 16", **HERE, "limit": 3, "cursor": first["next_cursor"]}).text
+    assert "event: stores" in body and "event: done" in body
+    assert "event: token" not in body
+
+
+def test_cursor_of_replaced_store_data_is_gone(chat):
+    first = chat.post("/chat", json={"message": "mua iPhone 16", **HERE, "limit": 3}).json()
+    chat.publish(store_sheet(seed=2), source_hash="v2")
+    response = chat.post("/chat", json={"message": "mua iPhone 16", **HERE, "cursor": first["next_cursor"]})
+    assert response.status_code == 410
+
+
+@pytest.mark.parametrize("cursor", ["garbage", encode_cursor({"version": "v1"}), encode_cursor({"version": "v1", "lat": 1, "lon": 2, "distance": 0, "position": 0, "intent": None})])
+def test_malformed_cursor_is_rejected(chat, cursor):
+    response = chat.post("/chat", json={"message": "mua iPhone 16", **HERE, "cursor": cursor})
+    assert response.status_code == 400
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.geo_service import StoreIndex, haversine_km
+
+
+def random_stores(size: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    # Dense city clusters plus stores scattered over the country
+    centers = np.array([[10.78, 106.70], [21.03, 105.85], [16.05, 108.20]])
+    clustered = centers[rng.integers(0, len(centers), size // 2)] + rng.normal(0, 0.05, (size // 2, 2))
+    scattered = np.column_stack([rng.uniform(8.5, 23.0, size - size // 2), rng.uniform(102.5, 109.5, size - size // 2)])
+    coords = np.vstack([clustered, scattered])
+    return pd.DataFrame({"latitude": coords[:, 0], "longitude": coords[:, 1]})
+
+
+def brute_force(stores: pd.DataFrame, lat: float, lon: float, positions: np.ndarray | None = None):
+    """(positions, distances) of every store by (distance, position), the order the index promises."""
+    positions = np.arange(len(stores)) if positions is None else np.asarray(positions)
+    distances = haversine_km(np.radians(lat), np.radians(lon), np.radians(stores["latitude"].to_numpy()[positions]), np.radians(stores["longitude"].to_numpy()[positions]))
+    order = np.lexsort((positions, distances))
+    return positions[order], distances[order]
+
+
+@pytest.fixture(scope="module")
+def stores():
+    return random_stores(20_000, seed=0)
+
+
+@pytest.fixture(scope="module")
+def index(stores):
+    return StoreIndex(stores)
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_query_matches_brute_force(stores, index, seed):
+    rng = np.random.default_rng(seed)
+    lat, lon = rng.uniform(8.0, 23.5), rng.uniform(102.0, 110.0)
+    k = int(rng.integers(1, 30))
+    # Whole catalog, a large subset (grid walk) and a small one (direct scan)
+    for size in (None, 5_000, 300):
+        positions = None if size is None else np.sort(rng.choice(len(stores), size, replace=False))
+        expected, expected_distances = brute_force(stores, lat, lon, positions)
+        got, got_distances = index.query(lat, lon, k, positions)
+        np.testing.assert_array_equal(got, expected[:k])
+        np.testing.assert_allclose(got_distances, expected_distances[:k])
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_max_distance_matches_brute_force(stores, index, seed):
+    rng = np.random.default_rng(1000 + seed)
+    lat, lon = rng.uniform(8.5, 23.0), rng.uniform(102.5, 109.5)
+    radius = float(rng.uniform(1, 80))
+    expected, distances = brute_force(stores, lat, lon)
+    expected = expected[distances <= radius]
+    got, _ = index.query(lat, lon, 10, max_distance_km=radius)
+    np.testing.assert_array_equal(got, expected[:10])
+    np.testing.assert_array_equal(index.within(lat, lon, radius), np.sort(expected))
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_pages_walk_the_brute_force_order(stores, index, seed):
+    rng = np.random.default_rng(2000 + seed)
+    lat, lon = rng.uniform(8.5, 23.0), rng.uniform(102.5, 109.5)
+    positions = None if seed % 2 else np.sort(rng.choice(len(stores), 8_000, replace=False))
+    expected, _ = brute_force(stores, lat, lon, positions)
+
+    pages, after = [], None
+    for _ in range(5):
+        got, distances = index.query(lat, lon, 7, positions, after=after)
+        pages.append(got)
+        after = (float(distances[-1]), int(got[-1]))
+    np.testing.assert_array_equal(np.concatenate(pages), expected[:35])
+
+
+def walk_all_pages(index, lat, lon, k, positions=None, max_distance_km=None):
+    pages, after = [], None
+    while True:
+        got, distances = index.query(lat, lon, k, positions, max_distance_km=max_distance_km, after=after)
+        if not len(got):
+            return np.concatenate(pages) if pages else np.empty(0, dtype=np.int64)
+        pages.append(got)
+        after = (float(distances[-1]), int(got[-1]))
+
+
+@pytest.fixture(scope="module")
+def sparse_stores():
+    rng = np.random.default_rng(7)
+    return pd.DataFrame({"latitude": rng.uniform(8.5, 23.0, 5_000), "longitude": rng.uniform(102.5, 109.5, 5_000)})
+
+
+@pytest.mark.parametrize("origin, k", [((0.0, 0.0), 4), ((0.0, 0.0), 250), ((-33.9, 151.2), 40), ((15.0, 105.0), 97)])
+def test_pages_reach_the_end_from_far_away(sparse_stores, origin, k):
+    # (0, 0) is what the frontend sends without a location: every store is far off
+    index = StoreIndex(sparse_stores)
+    expected, _ = brute_force(sparse_stores, *origin)
+    np.testing.assert_array_equal(walk_all_pages(index, *origin, k), expected)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_pages_reach_the_end_of_a_subset(stores, index, seed):
+    rng = np.random.default_rng(3000 + seed)
+    lat, lon = rng.uniform(-10, 40), rng.uniform(90, 120)
+    positions = np.sort(rng.choice(len(stores), int(rng.integers(3_000, 8_000)), replace=False))
+    max_distance_km = None if seed % 2 else float(rng.uniform(100, 2_000))
+    expected, distances = brute_force(stores, lat, lon, positions)
+    if max_distance_km is not None:
+        expected = expected[distances <= max_distance_km]
+    np.testing.assert_array_equal(walk_all_pages(index, lat, lon, 96, positions, max_distance_km), expected)
+
+
+def test_empty_and_tiny_inputs():
+    empty = StoreIndex(pd.DataFrame({"latitude": [], "longitude": []}))
+    assert len(empty.query(10.0, 106.0, 3)[0]) == 0
+    single = StoreIndex(pd.DataFrame({"latitude": [10.0], "longitude": [106.0]}))
+    np.testing.assert_array_equal(single.query(11.0, 107.0, 3)[0], [0])
+    np.testing.assert_array_equal(single.query(11.0, 107.0, 3, positions=np.empty(0, dtype=np.int64))[0], [])
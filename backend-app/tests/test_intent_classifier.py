@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+
+from services.intent_service import build_intent_classifier, get_classifier_config
+
+CATALOG = pd.DataFrame({
+    "category": ["Ẩm thực", "Ẩm thực", "Thời trang", "Thời trang", "Thời trang", "Công nghệ"],
+    "product_info": ["Cháo gà", "Phở bò", "Dép tổ ong", "Giày da", "Giày chạy bộ, Áo thun", "iPhone 16 Pro, Laptop Dell"],
+})
+MIN_CONFIDENCE = get_classifier_config()["min_confidence"]
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    return build_intent_classifier(CATALOG)
+
+
+@pytest.mark.parametrize("message", [
+    "xin chào",
+    "chào bạn",
+    "hôm nay trời đẹp quá",
+    "ai đã tạo ra bạn",
+    "cảm ơn bạn nhiều",
+    "tạm biệt nhé",
+    # Lookalikes that only match once diacritics are dropped
+    "đã lâu không gặp",
+    "bộ phim hay quá",
+    # A single short word is too weak on its own, even typed without diacritics
+    "xin chao",
+    "ao",
+])
+def test_small_talk_is_not_a_confident_product(classifier, message):
+    _, confidence = classifier.classify(message)
+    assert confidence < MIN_CONFIDENCE
+
+
+@pytest.mark.parametrize("message, product, category", [
+    ("mua dép tổ ong", "dép tổ ong", "Thời trang"),
+    ("muốn ăn cháo gà", "cháo gà", "Ẩm thực"),
+    ("tìm giày da gần đây", "giày da", "Thời trang"),
+    # Typed without diacritics
+    ("giay da o dau", "giay da", "Thời trang"),
+    ("chao ga", "chao ga", "Ẩm thực"),
+    ("mua iPhone 16", "iPhone 16", "Công nghệ"),
+    ("LAPTOP DELL", "LAPTOP DELL", "Công nghệ"),
+])
+def test_catalog_products_are_confident(classifier, message, product, category):
+    intent, confidence = classifier.classify(message)
+    assert confidence >= MIN_CONFIDENCE
+    assert (intent["product"], intent["category"]) == (product, category)
+
+
+def test_category_name_alone(classifier):
+    intent, confidence = classifier.classify("đồ thời trang")
+    assert intent["product"] is None and intent["category"] == "Thời trang"
+    assert confidence >= MIN_CONFIDENCE
+
+
+def test_short_word_still_guesses_for_the_llm_audit(classifier):
+    intent, confidence = classifier.classify("quán phở")
+    assert intent["category"] == "Ẩm thực" and confidence < MIN_CONFIDENCE
+
+
+def test_empty_catalog():
+    assert build_intent_classifier(pd.DataFrame()).classify("mua iPhone") == (None, 0.0)
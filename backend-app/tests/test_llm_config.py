@@ -0,0 +1,33 @@
+import asyncio
+
+import pytest
+
+from services import ai_service
+
+
+@pytest.fixture
+def malformed_backends(monkeypatch):
+    monkeypatch.setenv("AI_BACKENDS", "ollama@http://localhost:11434,openai:gpt-4o")
+    monkeypatch.setattr(ai_service, "_backend", None)
+
+
+def test_parse_backend_specs():
+    assert ai_service.parse_backend_specs("ollama@http://h:1, gemini:gemini-2.0-flash,") == [
+        ("ollama", None, "http://h:1"), ("gemini", "gemini-2.0-flash", None),
+    ]
+    with pytest.raises(ValueError, match="openai"):
+        ai_service.parse_backend_specs("openai:gpt-4o")
+
+
+def test_malformed_backends_leave_startup_working(malformed_backends, caplog):
+    ai_service.preload_llm_sdk()
+    ai_service.configure_genai()
+    assert ai_service.get_llm_backend() is None
+    assert "Invalid AI_BACKENDS" in caplog.text
+
+
+def test_malformed_backends_stream_a_config_error(malformed_backends):
+    async def collect():
+        return [chunk async for chunk in ai_service.stream_ai_response("xin chào", [], data_version="config-test")]
+
+    assert asyncio.run(collect()) == [ai_service.CONFIG_ERROR_REPLY]
@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+from services.llm_client import LLMBackend
+from services.llm_router import CircuitOpenError, LLMRouter
+
+
+class FakeBackend(LLMBackend):
+    def __init__(self, name, latency=0.0, fail=False):
+        super().__init__(name, name=name, max_retries=0)
+        self.latency = latency
+        self.fail = fail
+        self.calls = 0
+        self.cancelled = 0
+
+    async def _generate(self, prompt, json_mode=False):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.latency)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise RuntimeError(f"{self.name} down")
+        return self.name
+
+    async def _stream(self, prompt):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if self.fail:
+            raise RuntimeError(f"{self.name} down")
+        for chunk in (self.name, " says", " hi"):
+            yield chunk
+
+
+def router(*backends, **options):
+    return LLMRouter(list(backends), **{"explore_rate": 0, "hedge_delay_ms": 0, **options})
+
+
+def test_warming_backends_keep_configured_order():
+    a, b = FakeBackend("a"), FakeBackend("b")
+    r = router(a, b, hedge_min_samples=5)
+    for seconds in (0.5, 0.5):
+        r.latency["a"]["generate"].add(seconds)
+    r.latency["b"]["generate"].add(0.01)
+    assert r.ranked("generate") == [a, b]
+
+    # Once both have enough calls, the faster median goes first
+    for _ in range(4):
+        r.latency["b"]["generate"].add(0.01)
+    assert r.ranked("generate") == [a, b]
+    for _ in range(3):
+        r.latency["a"]["generate"].add(0.5)
+    assert r.ranked("generate") == [b, a]
+
+
+def test_failed_call_falls_back_to_the_next_backend():
+    a, b = FakeBackend("a", fail=True), FakeBackend("b")
+    assert asyncio.run(router(a, b).generate("hi")) == "b"
+    assert (a.calls, b.calls) == (1, 1)
+
+
+def test_every_backend_failing_raises_the_last_error():
+    r = router(FakeBackend("a", fail=True), FakeBackend("b", fail=True))
+    with pytest.raises(RuntimeError, match="b down"):
+        asyncio.run(r.generate("hi"))
+
+
+def test_circuit_opens_and_recovers_through_half_open():
+    a, b = FakeBackend("a", fail=True), FakeBackend("b")
+    r = router(a, b, failure_threshold=2, reset_timeout=0.05)
+
+    async def scenario():
+        for _ in range(2):
+            assert await r.generate("hi") == "b"
+        assert r.breakers["a"].state == "open"
+        # Open: a is skipped without being called
+        assert await r.generate("hi") == "b"
+        assert a.calls == 2
+
+        # After the reset timeout one trial call goes through; it fails, so a opens again
+        await asyncio.sleep(0.06)
+        assert await r.generate("hi") == "b"
+        assert (a.calls, r.breakers["a"].state) == (3, "open")
+
+        await asyncio.sleep(0.06)
+        a.fail = False
+        assert await r.generate("hi") == "a"
+        assert r.breakers["a"].state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_all_circuits_open():
+    r = router(FakeBackend("a", fail=True), failure_threshold=1, reset_timeout=60)
+    with pytest.raises(RuntimeError):
+        asyncio.run(r.generate("hi"))
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(r.generate("hi"))
+
+
+def test_slow_call_is_hedged_and_the_loser_cancelled():
+    a, b = FakeBackend("a", latency=1.0), FakeBackend("b", latency=0.01)
+    r = router(a, b, hedge_delay_ms=20)
+    assert asyncio.run(r.generate("hi")) == "b"
+    assert (a.calls, a.cancelled, b.calls) == (1, 1, 1)
+    # A cut-short call is no failure
+    assert r.breakers["a"].failures == 0
+
+
+def test_no_hedge_when_disabled():
+    a, b = FakeBackend("a", latency=0.05), FakeBackend("b")
+    assert asyncio.run(router(a, b, hedge_percentile=0, hedge_delay_ms=1).generate("hi")) == "a"
+    assert b.calls == 0
+
+
+def test_stream_falls_back_before_the_first_chunk():
+    a, b = FakeBackend("a", fail=True), FakeBackend("b")
+
+    async def collect():
+        return [chunk async for chunk in router(a, b).stream("hi")]
+
+    assert "".join(asyncio.run(collect())) == "b says hi"
@@ -0,0 +1,144 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from conftest import store_sheet
+from services.refresh_service import SnapshotFollower, StoreDataRefresher
+from services.snapshot_service import build_snapshot, save_snapshot
+
+
+def test_follower_is_ready_once_a_snapshot_is_published(tmp_path):
+    published = []
+
+    async def follow():
+        follower = SnapshotFollower(published.append, str(tmp_path), interval=0.01)
+        follower.start()
+        await asyncio.sleep(0.05)
+        # Nothing saved yet: still waiting, and no error
+        assert not follower.first_load.is_set() and follower.last_error is None
+
+        save_snapshot(build_snapshot(store_sheet(50), source_hash="v1", version=1), str(tmp_path), extra={"activate_at": 0})
+        await asyncio.wait_for(follower.first_load.wait(), timeout=5)
+        await follower.stop()
+        return follower
+
+    follower = asyncio.run(follow())
+    assert [snapshot.source_hash for snapshot in published] == ["v1"]
+    assert follower.version == 1
+
+
+def test_refresher_is_ready_after_a_failed_poll(tmp_path):
+    published = []
+
+    async def refresh():
+        refresher = StoreDataRefresher(published.append, url="http://127.0.0.1:9/sheet.csv", interval=60, timeout=1)
+        refresher.start()
+        # Requests stop waiting for data once the first poll has failed
+        await asyncio.wait_for(refresher.first_load.wait(), timeout=5)
+        await refresher.stop()
+        return refresher
+
+    refresher = asyncio.run(refresh())
+    assert refresher.last_error and not published
+
+
+class SheetServer:
+    """Local stand-in for the published sheet: serves `body` under `etag` and honours If-None-Match."""
+
+    def __init__(self, body: bytes, etag: str):
+        self.body, self.etag = body, etag
+        self.requests = self.not_modified = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.requests += 1
+                if self.headers.get("If-None-Match") == server.etag:
+                    server.not_modified += 1
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("ETag", server.etag)
+                self.send_header("Content-Length", str(len(server.body)))
+                self.end_headers()
+                self.wfile.write(server.body)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/sheet.csv"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def sheet_csv(seed: int) -> bytes:
+    return store_sheet(50, seed=seed).to_csv(index=False).encode()
+
+
+@pytest.fixture
+def sheet():
+    server = SheetServer(sheet_csv(1), '"v1"')
+    yield server
+    server.close()
+
+
+def polls(refresher, count: int) -> list[bool]:
+    async def run():
+        return [await refresher.refresh_once() for _ in range(count)]
+
+    return asyncio.run(run())
+
+
+async def poll_like_the_loop(refresher) -> bool:
+    # run() logs a failed poll and tries again after the interval
+    try:
+        return await refresher.refresh_once()
+    except Exception:
+        return False
+
+
+def test_changed_sheet_is_published_and_unchanged_one_is_not(sheet):
+    published = []
+    refresher = StoreDataRefresher(published.append, url=sheet.url, timeout=5)
+    assert polls(refresher, 2) == [True, False]
+    # The second poll was a conditional GET answered with 304
+    assert (sheet.requests, sheet.not_modified) == (2, 1)
+    assert refresher.etag == '"v1"' and len(published) == 1
+
+    sheet.body, sheet.etag = sheet_csv(2), '"v2"'
+    assert polls(refresher, 1) == [True]
+    assert [snapshot.version for snapshot in published] == [1, 2]
+
+
+def test_same_content_under_a_new_etag_is_no_swap(sheet):
+    published = []
+    refresher = StoreDataRefresher(published.append, url=sheet.url, timeout=5)
+    polls(refresher, 1)
+    sheet.etag = '"v1-regenerated"'
+    assert polls(refresher, 1) == [False]
+    assert len(published) == 1
+    # Later polls are conditional on the new validator
+    assert refresher.etag == '"v1-regenerated"'
+
+
+@pytest.mark.parametrize("bad_body", [b"<html>Sign in to continue</html>", b"store_id,name\n1,x\n", b"\xff\xfe\x00garbage"])
+def test_failed_build_is_retried_on_the_next_poll(sheet, bad_body):
+    published = []
+    refresher = StoreDataRefresher(published.append, url=sheet.url, timeout=5)
+    polls(refresher, 1)
+
+    # A broken body under the ETag the fixed sheet will keep
+    sheet.body, sheet.etag = bad_body, '"v2"'
+    assert asyncio.run(poll_like_the_loop(refresher)) is False
+    assert refresher.etag == '"v1"' and len(published) == 1
+
+    sheet.body = sheet_csv(2)
+    assert polls(refresher, 1) == [True]
+    assert len(published) == 2 and refresher.etag == '"v2"'
@@ -0,0 +1,118 @@
+import re
+import time
+
+import pytest
+from conftest import store_sheet
+
+import main
+from services import ai_service
+from services.ai_service import reply_cache_key
+from services.cache_service import TTLCache
+
+HERE = {"latitude": 10.75, "longitude": 106.65}
+STORES = [
+    {"store_id": "1", "store_name": "Shop 1", "address": "HCM", "product_info": "iPhone 16", "promotion": "Giảm 10%", "distance_km": 0.42},
+    {"store_id": "2", "store_name": "Shop 2", "address": "HCM", "product_info": "iPhone 16", "promotion": "", "distance_km": 1.9},
+]
+INTENT = {"product": "iPhone 16", "generic_term": "Điện thoại", "category": "Công nghệ", "is_location_request": False}
+
+
+@pytest.fixture
+def llm(chat, monkeypatch):
+    """
+    The chat fixture with the real get_ai_response over a fresh reply cache;
+    the LLM call records its prompts and answers "llm N".
+    """
+    prompts = []
+
+    class Backend:
+        name = "fake"
+        model_name = "fake"
+
+    async def call_custom_api(prompt, *args, **kwargs):
+        prompts.append(prompt)
+        return f"llm {len(prompts)}"
+
+    monkeypatch.setattr(main, "get_ai_response", ai_service.get_ai_response)
+    monkeypatch.setattr(ai_service, "reply_cache", TTLCache("reply", ttl=60))
+    monkeypatch.setattr(ai_service, "get_llm_backend", lambda: Backend())
+    monkeypatch.setattr(ai_service, "call_custom_api", call_custom_api)
+    chat.prompts = prompts
+    return chat
+
+
+def ask(chat, message="mua iPhone 16", **location):
+    return chat.post("/chat", json={"message": message, **(location or HERE)}).json()
+
+
+def test_same_question_is_answered_from_the_cache(llm):
+    first = ask(llm)
+    assert ask(llm) == first
+    assert first["reply"] == "llm 1" and len(llm.prompts) == 1
+
+
+def test_message_is_normalized_in_the_key(llm):
+    ask(llm, "mua iPhone 16")
+    for message in ("MUA IPHONE 16", "Mua iphone 16"):
+        assert ask(llm, message)["reply"] == "llm 1"
+    assert len(llm.prompts) == 1
+
+    key = reply_cache_key("mua iPhone 16", STORES, INTENT, "product", "v1")
+    for message in ("  MUA   iphone 16!", "Mua iPhone 16?", "mua\tiphone 16."):
+        assert reply_cache_key(message, STORES, INTENT, "product", "v1") == key
+    assert reply_cache_key("mua iPhone 15", STORES, INTENT, "product", "v1") != key
+
+
+def test_different_question_misses(llm):
+    ask(llm, "mua iPhone 16")
+    assert ask(llm, "ăn phở")["reply"] == "llm 2"
+
+
+def test_expired_reply_is_asked_again(llm, monkeypatch):
+    ask(llm)
+    later = time.time() + 61
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert ask(llm)["reply"] == "llm 2"
+
+
+def test_new_store_data_misses(llm):
+    ask(llm)
+    llm.publish(store_sheet(seed=2), source_hash="v2")
+    assert ask(llm)["reply"] == "llm 2"
+
+
+def test_far_away_user_gets_their_own_reply(llm):
+    near = ask(llm, latitude=10.62, longitude=106.52)
+    far = ask(llm, latitude=10.88, longitude=106.78)
+    assert [s["name"] for s in near["nearest_stores"]] != [s["name"] for s in far["nearest_stores"]]
+    assert far["reply"] == "llm 2"
+
+
+def test_reply_quotes_the_distances_of_its_key(llm):
+    # A few metres apart: the same stores, distances within the same 0.5 km step
+    first = ask(llm, latitude=10.75, longitude=106.65)
+    second = ask(llm, latitude=10.7501, longitude=106.6501)
+    assert [s["name"] for s in first["nearest_stores"]] == [s["name"] for s in second["nearest_stores"]]
+    assert second["reply"] == "llm 1"
+    # What the cached reply was written from holds for both users
+    quoted = [float(km) for km in re.findall(r"Khoảng cách: ([\d.]+) km", llm.prompts[0])]
+    assert quoted and all(round(km / 0.5, 6).is_integer() for km in quoted)
+
+
+def test_key_separates_stores_and_distances(monkeypatch):
+    key = reply_cache_key("mua iPhone 16", STORES, INTENT, "product", "v1")
+    other_promotion = [{**STORES[0], "promotion": "Mua 1 tặng 1"}, STORES[1]]
+    other_store = [{**STORES[0], "store_id": "3"}, STORES[1]]
+    farther = [{**STORES[0], "distance_km": 0.8}, STORES[1]]
+    for stores in (other_promotion, other_store, farther, STORES[:1], STORES[::-1]):
+        assert reply_cache_key("mua iPhone 16", stores, INTENT, "product", "v1") != key
+    assert reply_cache_key("mua iPhone 16", STORES, INTENT, "fallback", "v1") != key
+    assert reply_cache_key("mua iPhone 16", STORES, {**INTENT, "category": "Ẩm thực"}, "product", "v1") != key
+    assert reply_cache_key("mua iPhone 16", STORES, INTENT, "product", "v1", history=[["mua laptop", "llm 1"]]) != key
+    # Within the same step, and with intent text differing only in case
+    assert reply_cache_key("mua iPhone 16", [{**STORES[0], "distance_km": 0.38}, STORES[1]], INTENT, "product", "v1") == key
+    assert reply_cache_key("mua iPhone 16", STORES, {**INTENT, "product": "IPHONE 16"}, "product", "v1") == key
+
+    monkeypatch.setenv("REPLY_CACHE_DISTANCE_STEP", "0")
+    exact = reply_cache_key("mua iPhone 16", STORES, INTENT, "product", "v1")
+    assert reply_cache_key("mua iPhone 16", [{**STORES[0], "distance_km": 0.43}, STORES[1]], INTENT, "product", "v1") != exact
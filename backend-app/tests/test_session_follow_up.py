@@ -0,0 +1,122 @@
+import pytest
+
+from conftest import INTENTS, store_sheet
+from services.intent_service import build_intent_classifier
+from services.session_service import SQLiteSessionStore, follow_up_kind
+
+HERE = {"latitude": 10.75, "longitude": 106.66}
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    return build_intent_classifier(store_sheet())
+
+
+@pytest.fixture
+def iphone_session():
+    return {"version": "v1", "intent": INTENTS["mua iphone 16"], "match_type": "product", "candidates": [1, 2, 3], "shown": [1]}
+
+
+@pytest.mark.parametrize("message, kind", [
+    ("còn cửa hàng nào khác không?", "more"),
+    ("còn chỗ nào nữa không", "more"),
+    ("cho mình xem thêm", "more"),
+    ("cái đó ở đâu?", "same"),
+    ("còn cái nào rẻ hơn không?", "same"),
+    ("cửa hàng đó có giảm giá không", "same"),
+    # Hard rules decide these before any follow-up cue is looked at
+    ("vị trí của tôi ở đâu vậy?", None),
+    ("ở đâu?", None),
+    ("muốn đi mua sắm", None),
+    # Small talk and new requests
+    ("xin chào, bạn là ai vậy?", None),
+    ("cảm ơn nhé, vậy thôi", None),
+    ("quán cà phê nào gần nhất?", None),
+    ("ăn phở", None),
+    ("công nghệ", None),
+    ("còn cửa hàng nào khác bán đồ ăn sáng ngon mà giá rẻ gần trường học không?", None),
+])
+def test_follow_up_kind(classifier, iphone_session, message, kind):
+    assert follow_up_kind(message, iphone_session, classifier) == (kind, None)
+
+
+def test_product_of_the_same_category_refines(classifier, iphone_session):
+    kind, refined = follow_up_kind("mua laptop dell", iphone_session, classifier)
+    assert kind == "refine"
+    assert refined["product"] == "laptop dell" and refined["category"] == "Công nghệ"
+
+
+@pytest.mark.parametrize("session", [None, {}, {"intent": {"is_location_request": True}}])
+def test_no_follow_up_without_a_search(classifier, session):
+    assert follow_up_kind("còn cửa hàng nào khác không?", session, classifier) == (None, None)
+
+
+def test_location_question_in_a_session_asks_for_location(chat):
+    first = chat.post("/chat", json={"message": "mua iPhone 16", **HERE, "session_id": "s1"}).json()
+    assert first["nearest_stores"] and not first["trigger_location"]
+
+    response = chat.post("/chat", json={"message": "vị trí của tôi ở đâu vậy?", **HERE, "session_id": "s1"}).json()
+    assert response["trigger_location"]
+    assert response["nearest_stores"] == []
+
+
+def test_more_follow_up_shows_other_stores(chat):
+    first = chat.post("/chat", json={"message": "mua iPhone 16", **HERE, "session_id": "s2"}).json()
+    more = chat.post("/chat", json={"message": "còn cửa hàng nào khác không?", **HERE, "session_id": "s2"}).json()
+    assert chat.calls["intent"] == 1
+    assert len(more["nearest_stores"]) == 3
+    assert not {store["name"] for store in first["nearest_stores"]} & {store["name"] for store in more["nearest_stores"]}
+
+
+def test_refine_searches_the_whole_category(chat):
+    chat.post("/chat", json={"message": "mua iPhone 16", **HERE, "session_id": "s3"})
+    refined = chat.post("/chat", json={"message": "mua laptop", **HERE, "limit": 50, "session_id": "s3"}).json()
+    assert chat.calls["intent"] == 1
+
+    # Same stores as a fresh search, not only those selling both products
+    fresh = chat.post("/chat", json={"message": "mua laptop", **HERE, "limit": 50}).json()
+    assert [store["name"] for store in refined["nearest_stores"]] == [store["name"] for store in fresh["nearest_stores"]]
+
+
+def test_sqlite_sessions_are_shared_and_swept(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    store = SQLiteSessionStore(path, ttl=60, sweep_interval=0)
+    store.set("a", {"history": [["hi", "hello"]]})
+    # Answered from the queued write before it is committed
+    assert store.get("a") == {"history": [["hi", "hello"]]}
+    assert store._writer.flush(5)
+
+    other_worker = SQLiteSessionStore(path, ttl=-1, sweep_interval=0)
+    assert other_worker.get("a") == {"history": [["hi", "hello"]]}
+    other_worker.set("b", {})
+    assert other_worker._writer.flush(5)
+    # b expired on arrival; the sweep after it dropped it from the file
+    rows = other_worker._db.execute("SELECT id FROM sessions").fetchall()
+    assert rows == [("a",)]
+
+
+def test_low_confidence_guess_is_no_refine(chat):
+    # "phở" alone is a short single-word guess the classifier does not trust
+    chat.post("/chat", json={"message": "ăn phở", **HERE, "session_id": "s4"})
+    assert chat.calls["intent"] == 1
+    chat.post("/chat", json={"message": "phở", **HERE, "session_id": "s4"})
+    assert chat.calls["intent"] == 2
+
+
+def test_stream_location_request_leaves_no_empty_turn(chat):
+    from services.session_service import load_session
+
+    chat.post("/chat", json={"message": "mua iPhone 16", **HERE, "session_id": "s5"})
+    body = chat.post("/chat/stream", json={"message": "vị trí của tôi", **HERE, "session_id": "s5"}).text
+    assert '"trigger_location": true' in body
+    assert load_session("s5")["history"] == [["mua iPhone 16", "reply 1"]]
+
+
+def test_greeting_after_a_food_search_is_no_refine():
+    import pandas as pd
+
+    food = build_intent_classifier(pd.DataFrame({"category": ["Ẩm thực", "Ẩm thực"], "product_info": ["Cháo gà", "Phở bò"]}))
+    session = {"intent": {"product": "Phở bò", "generic_term": "Phở", "category": "Ẩm thực", "is_location_request": False}}
+    for message in ("xin chào", "xin chao", "chào bạn", "phở"):
+        assert follow_up_kind(message, session, food) == (None, None)
+    assert follow_up_kind("còn cháo gà không", session, food)[0] == "refine"
@@ -0,0 +1,100 @@
+import asyncio
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import INTENTS, store_sheet
+
+from services.refresh_service import SnapshotFollower
+from services.snapshot_service import MANIFEST_NAME, build_snapshot, load_saved_snapshot, read_manifest, save_snapshot
+
+MESSAGES = list(INTENTS) + ["iphone 16 ở đâu", "bánh mì gần đây", "xin chào", "laptop dell giá bao nhiêu"]
+
+
+@pytest.fixture
+def stores():
+    stores = store_sheet(300)
+    # Long promotions repeat across stores, so the fragments cut them once
+    promotions = [" ".join(["Giảm giá"] * (20 + i % 3)) if i % 2 else "Giảm 10%" for i in range(len(stores))]
+    return stores.assign(promotion=pd.array(promotions, dtype=stores["promotion"].dtype))
+
+
+def assert_same_frame(loaded, built):
+    # Arrow gives the category labels back as str, not the sheet's string dtype
+    built = built.reset_index(drop=True)
+    pd.testing.assert_frame_equal(loaded, built, check_dtype=False, check_categorical=False)
+    assert list(loaded.dtypes.astype(str)) == list(built.dtypes.astype(str))
+
+
+def fragment_texts(snapshot):
+    records = snapshot.stores_dataframe.to_dict("records")
+    return [snapshot.prompt_fragments.field(position, store, column) for position, store in enumerate(records) for column in ("product_info", "promotion")]
+
+
+def test_loaded_snapshot_matches_the_built_one(tmp_path, stores):
+    built = build_snapshot(stores, source_hash="v1", version=1)
+    save_snapshot(built, str(tmp_path))
+    loaded, manifest = load_saved_snapshot(str(tmp_path))
+
+    assert_same_frame(loaded.stores_dataframe, built.stores_dataframe)
+    assert loaded.unique_categories == built.unique_categories
+    assert [loaded.intent_classifier.classify(m) for m in MESSAGES] == [built.intent_classifier.classify(m) for m in MESSAGES]
+    assert fragment_texts(loaded) == fragment_texts(built)
+    assert {key.split(".")[0] for key in manifest["arrays"]} == {"geo", "search", "classifier", "fragments"}
+
+
+def test_loaded_columns_are_views_of_the_saved_file(tmp_path, stores):
+    save_snapshot(build_snapshot(stores), str(tmp_path))
+    loaded, _ = load_saved_snapshot(str(tmp_path))
+    frame = loaded.stores_dataframe
+    # Read-only arrays are mapped pages, not copies of this process's own
+    for values in (frame["latitude"].to_numpy(), frame["longitude"].to_numpy(), frame["category"].cat.codes.to_numpy()):
+        assert not values.flags.writeable
+    assert not loaded.intent_classifier.arrays["pair_counts"].flags.writeable
+    assert not loaded.prompt_fragments.arrays["promotion_codes"].flags.writeable
+
+
+def test_fragments_are_recut_for_a_new_budget(tmp_path, stores, monkeypatch):
+    save_snapshot(build_snapshot(stores), str(tmp_path))
+    monkeypatch.setenv("PROMPT_FIELD_TOKENS", "5")
+    loaded, _ = load_saved_snapshot(str(tmp_path))
+    assert fragment_texts(loaded) == fragment_texts(build_snapshot(stores))
+
+
+def test_chunked_table_still_loads(tmp_path, stores):
+    # Snapshots saved before the table was written as one record batch
+    built = build_snapshot(stores)
+    target = save_snapshot(built, str(tmp_path))
+    built.stores_dataframe.reset_index(drop=True).to_feather(f"{target}/stores.feather", compression="uncompressed", chunksize=7)
+    loaded, _ = load_saved_snapshot(str(tmp_path))
+    assert_same_frame(loaded.stores_dataframe, built.stores_dataframe)
+    assert read_manifest(str(tmp_path))["rows"] == len(loaded.stores_dataframe)
+    np.testing.assert_array_equal(loaded.store_index.query(10.75, 106.65, 5)[0], built.store_index.query(10.75, 106.65, 5)[0])
+
+
+@pytest.mark.parametrize("change", [
+    lambda manifest: manifest.pop("path"),
+    lambda manifest: manifest.update(path=None),
+    lambda manifest: manifest.update(path=["v1"]),
+    lambda manifest: manifest.pop("arrays"),
+    lambda manifest: manifest.update(arrays="geo.lat_rad"),
+    lambda manifest: manifest.update(path="missing"),
+])
+def test_malformed_manifest_is_no_snapshot(tmp_path, change):
+    save_snapshot(build_snapshot(store_sheet(50), version=1), str(tmp_path))
+    manifest = read_manifest(str(tmp_path))
+    change(manifest)
+    (tmp_path / MANIFEST_NAME).write_text(json.dumps(manifest), encoding="utf-8")
+
+    assert load_saved_snapshot(str(tmp_path)) is None
+    published = []
+    assert asyncio.run(SnapshotFollower(published.append, str(tmp_path)).follow_once()) is False
+    assert published == []
+
+
+@pytest.mark.parametrize("content", ["[]", "null", '"v1"', "{not json"])
+def test_manifest_that_is_not_an_object_is_ignored(tmp_path, content):
+    (tmp_path / MANIFEST_NAME).write_text(content, encoding="utf-8")
+    assert read_manifest(str(tmp_path)) is None
+    assert load_saved_snapshot(str(tmp_path)) is None
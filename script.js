@@ -4,6 +4,14 @@ let userMarker;
 let storeMarkers = L.featureGroup();
 let currentUserLocation = null;
 
+// Conversation id sent with every message, so follow-ups ("còn cửa hàng nào khác không?")
+// continue the last search; kept for the lifetime of the browser tab
+const sessionId = sessionStorage.getItem('chatSessionId') || (window.crypto && crypto.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random().toString(36).slice(2)}`);
+sessionStorage.setItem('chatSessionId', sessionId);
+
+// Stores per page; "Xem thêm cửa hàng" asks for the next page with the response's next_cursor
+const STORES_PER_PAGE = 3;
+
 // Inject CSS for Store Cards
 const style = document.createElement('style');
 style.innerHTML = `
@@ -30,6 +38,15 @@ style.innerHTML = `
         color: #555;
         font-size: 0.85em;
     }
+    .load-more {
+        align-self: flex-start;
+        background: none;
+        border: 1px solid #007bff;
+        border-radius: 8px;
+        color: #007bff;
+        cursor: pointer;
+        padding: 6px 12px;
+    }
 `;
 document.head.appendChild(style);
 
@@ -117,9 +134,26 @@ function getUserLocation() {
 }
 
 // 3.3. Kết nối Backend (Real API Call)
-async function fetchAIResponse(userMessage, userLocation) {
+// Parse one Server-Sent Events block ("event: ...\ndata: ...") into { event, data }
+function parseSSEEvent(block) {
+    let event = 'message';
+    let data = '';
+    block.split('\n').forEach(line => {
+        if (line.startsWith('event:')) {
+            event = line.slice(6).trim();
+        } else if (line.startsWith('data:')) {
+            data += line.slice(5).trim();
+        }
+    });
+    return { event, data: data ? JSON.parse(data) : {} };
+}
+
+// Streams the reply from /chat/stream. onStores(stores, triggerLocation, nextCursor) is called as
+// soon as the store search is done, onToken(textSoFar) as reply tokens arrive. With a cursor the
+// server returns the next page of stores of the earlier search and no reply.
+async function fetchAIResponse(userMessage, userLocation, onToken, onStores, cursor = null) {
     try {
-        const response = await fetch('/chat', {
+        const response = await fetch('/chat/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -127,44 +161,70 @@ async function fetchAIResponse(userMessage, userLocation) {
             body: JSON.stringify({
                 message: userMessage,
                 latitude: userLocation ? userLocation.lat : 0.0,
-                longitude: userLocation ? userLocation.lng : 0.0
+                longitude: userLocation ? userLocation.lng : 0.0,
+                session_id: sessionId,
+                limit: STORES_PER_PAGE,
+                cursor: cursor
             })
         });
 
         if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
+            const error = new Error(`HTTP error! status: ${response.status}`);
+            error.status = response.status;
+            throw error;
         }
 
-        const data = await response.json();
-
-        // Map backend response format to frontend format
-        // Backend returns: { reply: "...", nearest_stores: [ { ... }, ... ] }
-        let stores = [];
-        if (data.nearest_stores && data.nearest_stores.length > 0) {
-            data.nearest_stores.forEach(store => {
-                stores.push({
-                    name: store.name,
-                    lat: store.lat,
-                    lng: store.lng,
-                    description: store.address
-                });
-            });
+        // Backend sends: "stores" { nearest_stores, trigger_location, next_cursor }, then "token" { text } ..., then "done"
+        let triggerLocation = false;
+        let text = '';
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const { event, data } = parseSSEEvent(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+
+                if (event === 'stores') {
+                    triggerLocation = data.trigger_location;
+                    // Map backend response format to frontend format
+                    const stores = (data.nearest_stores || []).map(store => ({
+                        name: store.name,
+                        lat: store.lat,
+                        lng: store.lng,
+                        description: store.address,
+                        distance_km: store.distance_km
+                    }));
+                    if (onStores) {
+                        onStores(stores, triggerLocation, data.next_cursor);
+                    }
+                } else if (event === 'token') {
+                    text += data.text;
+                    if (onToken && !triggerLocation) {
+                        onToken(text);
+                    }
+                }
+            }
         }
 
         return {
-            text: data.reply,
-            map_data: {
-                user_marker: userLocation,
-                store_markers: stores
-            },
-            trigger_location: data.trigger_location
+            text: text,
+            trigger_location: triggerLocation
         };
 
     } catch (error) {
         console.error("Error fetching AI response:", error);
         return {
             text: "Xin lỗi, tôi không thể kết nối với máy chủ lúc này. Vui lòng thử lại sau.",
-            map_data: null
+            failed: true,
+            status: error.status
         };
     }
 }
@@ -185,6 +245,80 @@ function appendMessage(sender, text) {
     messageElement.innerHTML = `<div class="message-bubble">${content}</div>`;
     chatMessages.appendChild(messageElement);
     chatMessages.scrollTop = chatMessages.scrollHeight; // Auto-scroll to bottom
+    return messageElement.querySelector('.message-bubble');
+}
+
+function storeCard(store) {
+    const card = document.createElement('div');
+    card.className = 'store-card';
+    // Add click event to focus map
+    card.onclick = () => focusOnStore(store.lat, store.lng, store.name);
+    card.style.cursor = 'pointer'; // Show pointer to indicate clickable
+
+    card.innerHTML = `
+        <div class="store-name">${store.name}</div>
+        <div class="store-address">${store.description}</div>
+        <div class="store-distance">📍 Cách bạn khoảng ${store.distance_km.toFixed(1)} km</div>
+    `;
+    return card;
+}
+
+// Store cards and map markers for one search. Later pages from the "Xem thêm" button are added
+// to the same list and map. Returns the list element.
+function renderStores(userMessage, userLocation, stores, nextCursor) {
+    const storeList = document.createElement('div');
+    storeList.className = 'store-list';
+    chatMessages.appendChild(storeList);
+    const shown = [];
+
+    function addPage(pageStores, pageCursor) {
+        pageStores.forEach(store => storeList.appendChild(storeCard(store)));
+        shown.push(...pageStores);
+        updateMap(
+            userLocation ? userLocation.lat : null,
+            userLocation ? userLocation.lng : null,
+            shown
+        );
+
+        if (pageCursor) {
+            const moreButton = document.createElement('button');
+            moreButton.className = 'load-more';
+            moreButton.textContent = 'Xem thêm cửa hàng';
+            moreButton.onclick = async () => {
+                moreButton.disabled = true;
+                let nextPage = null;
+                const page = await fetchAIResponse(userMessage, userLocation, null, (moreStores, _, moreCursor) => {
+                    nextPage = { stores: moreStores, cursor: moreCursor };
+                }, pageCursor);
+                if (page.status === 410) {
+                    // The store data changed since this search; its cursor is gone
+                    moreButton.replaceWith(Object.assign(document.createElement('div'), {
+                        className: 'store-address',
+                        textContent: 'Dữ liệu cửa hàng vừa được cập nhật, vui lòng hỏi lại để xem thêm.'
+                    }));
+                    return;
+                }
+                if (page.failed || !nextPage) {
+                    moreButton.disabled = false;
+                    return;
+                }
+                moreButton.remove();
+                addPage(nextPage.stores, nextPage.cursor);
+            };
+            storeList.appendChild(moreButton);
+        }
+        chatMessages.scrollTop = chatMessages.scrollHeight;
+    }
+
+    addPage(stores, nextCursor);
+    return storeList;
+}
+
+function removeTypingIndicator() {
+    const typingIndicator = chatMessages.querySelector('.typing-indicator');
+    if (typingIndicator) {
+        typingIndicator.parentNode.remove();
+    }
 }
 
 async function sendMessage() {
@@ -198,45 +332,44 @@ async function sendMessage() {
 
     const location = await getUserLocation(); // Get latest location before sending
 
-    const aiResponse = await fetchAIResponse(userMessage, location);
+    // Store cards and markers appear as soon as the search is done, before the reply starts
+    let storeList = null;
+    const showStores = (stores, triggerLocation, nextCursor) => {
+        if (!triggerLocation && stores.length > 0) {
+            storeList = renderStores(userMessage, location, stores, nextCursor);
+        }
+    };
+
+    // The reply bubble goes above the store cards that arrived before it
+    const appendReply = (text) => {
+        const bubble = appendMessage('ai', text);
+        if (storeList) {
+            chatMessages.insertBefore(bubble.parentNode, storeList);
+        }
+        return bubble;
+    };
+
+    // Render the reply as it streams in, replacing the typing indicator on the first token
+    let aiBubble = null;
+    const aiResponse = await fetchAIResponse(userMessage, location, (partialText) => {
+        if (!aiBubble) {
+            removeTypingIndicator();
+            aiBubble = appendReply(partialText);
+        } else {
+            aiBubble.innerHTML = marked.parse(partialText);
+            chatMessages.scrollTop = chatMessages.scrollHeight;
+        }
+    }, showStores);
 
     // Remove typing indicator
-    const typingIndicator = chatMessages.querySelector('.typing-indicator');
-    if (typingIndicator) {
-        typingIndicator.parentNode.remove();
-    }
+    removeTypingIndicator();
 
     if (!aiResponse.trigger_location) {
-        appendMessage('ai', aiResponse.text);
-    }
-
-    // Render Store Cards
-    if (aiResponse.map_data && aiResponse.map_data.store_markers && aiResponse.map_data.store_markers.length > 0) {
-        const storeListHtml = document.createElement('div');
-        storeListHtml.className = 'store-list';
-
-        aiResponse.map_data.store_markers.forEach(store => {
-            const card = document.createElement('div');
-            card.className = 'store-card';
-            // Add click event to focus map
-            card.onclick = () => focusOnStore(store.lat, store.lng, store.name);
-            card.style.cursor = 'pointer'; // Show pointer to indicate clickable
-
-            card.innerHTML = `
-                <div class="store-name">${store.name}</div>
-                <div class="store-address">${store.description}</div>
-                <div class="store-distance">📍 Cách bạn khoảng cách gần</div>
-            `;
-            storeListHtml.appendChild(card);
-        });
-        chatMessages.appendChild(storeListHtml);
-        chatMessages.scrollTop = chatMessages.scrollHeight;
-
-        updateMap(
-            aiResponse.map_data.user_marker ? aiResponse.map_data.user_marker.lat : null,
-            aiResponse.map_data.user_marker ? aiResponse.map_data.user_marker.lng : null,
-            aiResponse.map_data.store_markers
-        );
+        if (aiBubble) {
+            aiBubble.innerHTML = marked.parse(aiResponse.text);
+        } else {
+            appendReply(aiResponse.text);
+        }
     }
 
     // Auto-trigger location if backend requested it
@@ -276,10 +409,7 @@ async function handleLocationCheck(isAutoTriggered = false) {
     appendMessage('ai', '<div class="typing-indicator">Đang lấy vị trí...</div>');
     const location = await getUserLocation();
 
-    const typingIndicator = chatMessages.querySelector('.typing-indicator');
-    if (typingIndicator) {
-        typingIndicator.parentNode.remove();
-    }
+    removeTypingIndicator();
 
     if (location) {
         appendMessage('ai', `Đã xác định được vị trí của bạn: Lat ${location.lat}, Lng ${location.lng}. Tôi có thể giúp bạn tìm gì gần đây?`);